@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Benchmark summarizePerformanceRst.py and summarizeJointcal.py on synthetic
+reportPerformance files for increasing numbers of tracts.
+
+Each script's main() is run in a fresh process for each size, with its
+stages timed by wrapping the functions it calls:
+
+    ingest  read_tables (parsing every .rst file)
+    pandas  long_frame (stacking the tables into one pandas frame)
+    join    the rest of merge_sources (the pivot and the astropy table)
+    stats   design_exceedances and source_exceedances
+    plot    render_plots (only with --plot)
+    other   everything else, e.g. printing
+
+and the peak resident memory of the process after each stage. The results
+are written as JSON, so that runs before and after a change can be compared.
+"""
+import contextlib
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from lsst.jointcal_compare.synthetic import write_reports
+
+bindir = os.path.dirname(os.path.abspath(__file__))
+
+# The script, report file layout and sources of each benchmark.
+BENCHMARKS = {
+    "performance": ("summarizePerformanceRst.py", "{tract}-{source}.rst", ("single", "mosaic", "jointcal")),
+    "jointcal": ("summarizeJointcal.py", "{source}/performance/{tract}-jointcal.rst",
+                 ("DM-15617", "DM-15713")),
+}
+
+# The stage each wrapped function's time is counted in, by module.
+STAGES = {"tables": {"read_tables": "ingest"},
+          "merge": {"long_frame": "pandas", "merge_sources": "join"},
+          "analysis": {"design_exceedances": "stats", "source_exceedances": "stats"},
+          "plotting": {"render_plots": "plot"}}
+
+
+def _maxrss_mb():
+    """Return the peak resident memory of this process so far, in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+
+def run_script(script, path, reader, plot):
+    """Run one summary script's main() on ``path`` in this process, timing each stage.
+
+    Returns
+    -------
+    result : `dict`
+        The ``seconds`` and ``maxrss_mb`` after each stage, and in total.
+    """
+    seconds = {}
+    maxrss = {}
+
+    def timed(stage, func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds[stage] = seconds.get(stage, 0.0) + time.perf_counter() - start
+                maxrss[stage] = _maxrss_mb()
+        return wrapper
+
+    # Wrap the functions where they are defined, before the script imports them.
+    for modname, functions in STAGES.items():
+        module = importlib.import_module("lsst.jointcal_compare." + modname)
+        for name, stage in functions.items():
+            setattr(module, name, timed(stage, getattr(module, name)))
+    spec = importlib.util.spec_from_file_location("benchmarked", os.path.join(bindir, script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    args = [path, "--reader", reader] + (["--plot"] if plot else [])
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        module.main(args)
+    total = time.perf_counter() - start
+    # long_frame is called from inside merge_sources.
+    seconds["join"] -= seconds.get("pandas", 0.0)
+    seconds["other"] = total - sum(seconds.values())
+    return dict(seconds=seconds, total=total, maxrss_mb=maxrss, peak_maxrss_mb=_maxrss_mb())
+
+
+def benchmark(name, ntracts, workdir, reader, plot):
+    """Write the synthetic reports for one benchmark and size, and time the
+    script on them in a new process."""
+    script, pattern, sources = BENCHMARKS[name]
+    datadir = os.path.join(workdir, "{}-{}".format(name, ntracts))
+    start = time.perf_counter()
+    if not os.path.exists(datadir):
+        write_reports(datadir, ntracts, sources, pattern=pattern)
+    generate = time.perf_counter() - start
+
+    # Plots are written to the current directory.
+    plotdir = os.path.join(datadir, "plots")
+    os.makedirs(plotdir, exist_ok=True)
+    process = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-one", script, datadir,
+                              "--reader", reader] + (["--plot"] if plot else []),
+                             cwd=plotdir, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    result = json.loads(process.stdout.splitlines()[-1])
+    result.update(benchmark=name, script=script, ntracts=ntracts, nfiles=ntracts*len(sources),
+                  generate_seconds=generate)
+    return result
+
+
+def print_result(result):
+    """Print one benchmark result as a line of a table."""
+    stages = ("ingest", "pandas", "join", "stats", "plot", "other")
+    print("%-12s %6d" % (result['benchmark'], result['ntracts']),
+          *("%8.2f" % result['seconds'].get(stage, 0) for stage in stages),
+          "%8.2f %8.0f" % (result['total'], result['peak_maxrss_mb']), flush=True)
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracts", type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help="Numbers of tracts to benchmark (default=%(default)s).")
+    parser.add_argument("--benchmarks", nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS),
+                        help="Which scripts to benchmark (default=%(default)s).")
+    parser.add_argument("--reader", default="fast",
+                        help="The --reader to pass to the scripts (default=%(default)s).")
+    parser.add_argument("-p", "--plot", action="store_true",
+                        help="Include the plotting stage.")
+    parser.add_argument("-o", "--output", default="benchmark-summarize.json",
+                        help="File to write the results to, as JSON (default=%(default)s).")
+    parser.add_argument("--workdir",
+                        help="Directory to write the synthetic reports to, and keep them in; by default"
+                        " they are written to a temporary directory and removed afterwards.")
+    parser.add_argument("--run-one", nargs=2, metavar=("SCRIPT", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args(args)
+
+    if args.run_one is not None:
+        print(json.dumps(run_script(*args.run_one, reader=args.reader, plot=args.plot)))
+        return
+
+    workdir = args.workdir if args.workdir is not None else tempfile.mkdtemp(prefix="benchmark-summarize-")
+    results = []
+    print("%-12s %6s" % ("benchmark", "tracts"),
+          *("%8s" % name for name in ("ingest", "pandas", "join", "stats", "plot", "other", "total", "MB")))
+    try:
+        for ntracts in args.tracts:
+            for name in args.benchmarks:
+                results.append(benchmark(name, ntracts, workdir, args.reader, args.plot))
+                print_result(results[-1])
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir)
+
+    with open(args.output, 'w') as outfile:
+        json.dump(dict(date=datetime.datetime.now().isoformat(), python=platform.python_version(),
+                       machine=platform.node(), reader=args.reader, plot=args.plot, results=results),
+                  outfile, indent=2)
+    print("Wrote results to", args.output)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
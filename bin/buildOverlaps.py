@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Build or update a tract-visit overlap database (e.g.
+tract-visit/overlaps_SSPUDEEP_w15.sqlite3) from tract and calexp polygons.
+
+The tracts file has one line per tract: the tract number and the RA and Dec
+of each of its vertices, in degrees. The footprints file has one line per
+calexp: its visit, ccd and filter, and the RA and Dec of each corner.
+Running this again with more visits in the footprints file only tests the
+new visits (and any new tracts), and adds them to the database.
+
+With --synthetic, first write a made-up field of tracts and dithered visits
+to a directory and build from those, to try this out offline.
+"""
+import os
+import time
+
+import numpy as np
+
+from lsst.jointcal_compare.overlaps import read_footprints, read_tracts, update_overlaps
+
+
+def _sky(ra0, dec0, x, y):
+    """Return the RA/Dec of tangent-plane offsets (degrees) about (ra0, dec0)."""
+    ra0, dec0 = np.radians(ra0), np.radians(dec0)
+    x, y = np.radians(x), np.radians(y)
+    rho = np.hypot(x, y)
+    c = np.arctan(rho)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dec = np.arcsin(np.cos(c)*np.sin(dec0) + np.where(rho > 0, y*np.sin(c)*np.cos(dec0)/rho, 0))
+    ra = ra0 + np.arctan2(x*np.sin(c), rho*np.cos(dec0)*np.cos(c) - y*np.sin(dec0)*np.sin(c))
+    return np.degrees(ra) % 360, np.degrees(dec)
+
+
+def write_synthetic(directory, nvisits=200, ra0=150.0, dec0=2.0, ntracts=4, seed=12345):
+    """Write a tracts file with an ``ntracts x ntracts`` grid of overlapping
+    1.7 degree tracts about (ra0, dec0), and a footprints file of visits
+    dithered over the grid, each with a 1.5 degree circle of ccds.
+
+    Returns
+    -------
+    tracts, footprints : `str`
+        The files written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.RandomState(seed)
+    tracts = os.path.join(directory, "tracts.txt")
+    with open(tracts, 'w') as outfile:
+        outfile.write("# tract ra1 dec1 ra2 dec2 ra3 dec3 ra4 dec4\n")
+        for i in range(ntracts):
+            for j in range(ntracts):
+                x0, y0 = 1.6*(i - (ntracts - 1)/2), 1.6*(j - (ntracts - 1)/2)
+                ra, dec = _sky(ra0, dec0, x0 + np.array([-0.85, 0.85, 0.85, -0.85]),
+                               y0 + np.array([-0.85, -0.85, 0.85, 0.85]))
+                outfile.write("%d %s\n" % (9000 + i*ntracts + j,
+                                           ' '.join("%.6f %.6f" % pair for pair in zip(ra, dec))))
+
+    # A roughly circular focal plane of ccds, each 0.2 x 0.1 degrees.
+    ccds = [(x, y) for y in np.arange(-0.7, 0.71, 0.1) for x in np.arange(-0.7, 0.71, 0.2)
+            if np.hypot(x, y) < 0.75]
+    corners = np.array([[-0.1, -0.05], [0.1, -0.05], [0.1, 0.05], [-0.1, 0.05]])
+    footprints = os.path.join(directory, "footprints.txt")
+    half = 0.8*ntracts
+    with open(footprints, 'w') as outfile:
+        outfile.write("# visit ccd filter ra1 dec1 ra2 dec2 ra3 dec3 ra4 dec4\n")
+        for n in range(nvisits):
+            visit, filt = 1000 + 2*n, "HSC-" + "GRIZY"[n % 5]
+            dx, dy = rng.uniform(-half, half, size=2)
+            angle = rng.uniform(0, 2*np.pi)
+            rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+            for ccd, center in enumerate(ccds):
+                x, y = ((center + corners) @ rotation.T).T
+                ra, dec = _sky(ra0, dec0, dx + x, dy + y)
+                outfile.write("%d %d %s %s\n" % (visit, ccd, filt,
+                                                 ' '.join("%.6f %.6f" % pair for pair in zip(ra, dec))))
+    return tracts, footprints
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db",
+                        help="The overlaps database to build or update.")
+    parser.add_argument("--tracts",
+                        help="File of tract polygons.")
+    parser.add_argument("--footprints",
+                        help="File of calexp polygons.")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Number of visits to insert in each transaction (default=%(default)s).")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Print progress after each batch of visits.")
+    parser.add_argument("--synthetic", metavar="DIR",
+                        help="Write a synthetic field of tracts and visits to DIR, and build from those.")
+    args = parser.parse_args(args)
+
+    if args.synthetic:
+        args.tracts, args.footprints = write_synthetic(args.synthetic)
+    if args.tracts is None or args.footprints is None:
+        parser.error("--tracts and --footprints are required.")
+
+    start = time.perf_counter()
+    tracts = read_tracts(args.tracts)
+    footprints = read_footprints(args.footprints)
+    read = time.perf_counter() - start
+    nvisits, ntracts, nrows = update_overlaps(args.db, tracts, footprints, batch_size=args.batch_size,
+                                              verbose=args.verbose)
+    print("Added %d new visits and %d new tracts (%d calexp overlaps) to %s in %.1fs (%.1fs reading)" %
+          (nvisits, ntracts, nrows, args.db, time.perf_counter() - start, read))
+
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1:])
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+Convert all the reportPerformance .rst files in a directory to HTML, and
+write an index page linking every tract's reports and the summary plots.
+
+The results go into <directory>/html/, as with the old rst2html-all.sh, but
+the files are converted in one pool of processes that each load docutils
+once, and only the reports whose HTML is missing or older than the .rst are
+converted again. Reports in subdirectories, e.g. one per rerun, are written to
+the same subdirectories of html/. Open <directory>/html/index.html to browse
+the site.
+"""
+import os.path
+import time
+
+from lsst.jointcal_compare.reportsite import build_site
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory",
+                        help="Directory to search for .rst files.")
+    parser.add_argument("--outdir", default=None,
+                        help="Directory to write the HTML to (default=<directory>/html).")
+    parser.add_argument("--plots", default=None, metavar="DIR",
+                        help="Directory containing the summary plots (*.png) from summarizePerformanceRst.py"
+                        " or summarizeJointcal.py, to show on the index page.")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of processes to convert the files with (default=%(default)s).")
+    parser.add_argument("--force", action="store_true",
+                        help="Convert every file, even those whose HTML is up to date.")
+    parser.add_argument("--pattern", default="*.rst",
+                        help="File name pattern of the reports (default=%(default)s).")
+    args = parser.parse_args(args)
+    if args.plots is not None and not os.path.isdir(args.plots):
+        parser.error("--plots directory %s does not exist." % args.plots)
+
+    start = time.perf_counter()
+    try:
+        nconverted, nreports, index = build_site(args.directory, outdir=args.outdir, plotdir=args.plots,
+                                                 jobs=args.jobs, force=args.force, pattern=args.pattern)
+    except RuntimeError as e:
+        print(e)
+        return 1
+    print("Converted %d of %d reports in %.1fs; wrote %s" %
+          (nconverted, nreports, time.perf_counter() - start, index))
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
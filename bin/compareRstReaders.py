@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Check that the fast reportPerformance .rst reader produces the same tables as
+astropy's generic rst reader, and compare how long each takes.
+
+Exits with a nonzero status if any file is read differently.
+"""
+import time
+
+import numpy as np
+
+from lsst.jointcal_compare.tables import read_one_table
+
+
+def compare_tables(expect, actual):
+    """Return a list of the differences between two tables (empty if identical)."""
+    if expect.colnames != actual.colnames:
+        return ["columns differ: %s != %s" % (expect.colnames, actual.colnames)]
+    differences = []
+    for name in expect.colnames:
+        col1, col2 = expect[name], actual[name]
+        if col1.dtype != col2.dtype:
+            differences.append("%s: dtype %s != %s" % (name, col1.dtype, col2.dtype))
+        elif not np.array_equal(np.ma.getmaskarray(col1), np.ma.getmaskarray(col2)):
+            differences.append("%s: masks differ" % name)
+        elif not np.array_equal(np.ma.getdata(col1), np.ma.getdata(col2)):
+            differences.append("%s: values differ" % name)
+    return differences
+
+
+def time_reader(files, reader, repeat):
+    """Return the best total time over ``repeat`` reads of all ``files``."""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for infile in files:
+            read_one_table(infile, 'check', reader=reader)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", metavar="files", nargs='+',
+                        help="reportPerformance .rst files to read.")
+    parser.add_argument("-n", "--repeat", type=int, default=3,
+                        help="Number of times to time each reader; the best is reported"
+                        " (default=%(default)s).")
+    args = parser.parse_args(args)
+
+    readable = []
+    failed = 0
+    for infile in args.files:
+        try:
+            differences = compare_tables(read_one_table(infile, 'check', reader='astropy'),
+                                         read_one_table(infile, 'check', reader='fast'))
+        except Exception as e:
+            differences = ["could not be read: %s: %s" % (type(e).__name__, e)]
+        else:
+            readable.append(infile)
+        if differences:
+            failed += 1
+            print(infile, *differences, sep='\n    ')
+    print("%d of %d files read identically" % (len(args.files) - failed, len(args.files)))
+    if not readable:
+        return 1
+
+    astropy_time = time_reader(readable, 'astropy', args.repeat)
+    fast_time = time_reader(readable, 'fast', args.repeat)
+    print("astropy: %.3fs   fast: %.3fs   speedup: %.1fx" %
+          (astropy_time, fast_time, astropy_time / fast_time))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
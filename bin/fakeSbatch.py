@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""
+Stand-in for slurm's sbatch, for testing script generation and submission
+without a cluster.
+
+Each submission is given the next job id and recorded as one JSON line in
+`<state>/jobs.jsonl`, with the script's #SBATCH options merged with those on
+the command line. With --run, the script is also executed immediately with
+bash, once per array task, with the SLURM_* environment variables a real job
+would see; each task's output goes to `<state>/<jobid>_<task>.out`. A job with
+--dependency=afterok:<ids> is only run if those jobs completed; otherwise it is
+recorded as CANCELLED, as slurm does with --kill-on-invalid-dep. Jobs that are
+not run are left for fakeSlurmQuery.py to simulate, as squeue and sacct.
+
+The state directory is $FAKE_SBATCH_DIR, or `fake-slurm` in the current
+directory.
+"""
+import json
+import os
+import re
+import subprocess
+import time
+
+
+def state_dir():
+    """Return the directory the fake scheduler keeps its state in, creating it."""
+    path = os.environ.get("FAKE_SBATCH_DIR", "fake-slurm")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def next_jobid(state):
+    """Return the next unused job id, and record it as used."""
+    path = os.path.join(state, "jobid")
+    try:
+        with open(path) as infile:
+            jobid = int(infile.read()) + 1
+    except (OSError, ValueError):
+        jobid = 1000
+    with open(path, 'w') as outfile:
+        outfile.write(str(jobid))
+    return jobid
+
+
+def script_options(filename):
+    """Return the `#SBATCH` options in a script, as a list of arguments."""
+    options = []
+    with open(filename) as infile:
+        for line in infile:
+            if line.startswith("#SBATCH"):
+                options.extend(line.split()[1:])
+    return options
+
+
+def script_steps(filename):
+    """Return the names given to the `srun` steps of a script with --job-name or -J."""
+    steps = []
+    with open(filename) as infile:
+        for line in infile:
+            match = re.search(r"\bsrun\b.*?(?:--job-name=|-J\s*)(\S+)", line)
+            if match:
+                steps.append(match.group(1))
+    return steps
+
+
+def parse_options(options):
+    """Return a dict of the long options we care about, from a list of sbatch arguments."""
+    short = {"-J": "job-name", "-N": "nodes", "-n": "ntasks", "-p": "partition", "-d": "dependency"}
+    parsed = {}
+    i = 0
+    while i < len(options):
+        option = options[i]
+        if option.startswith("--"):
+            key, _, value = option[2:].partition('=')
+        elif option in short and i + 1 < len(options):
+            key, value = short[option], options[i + 1]
+            i += 1
+        else:
+            key, value = option.lstrip('-'), ''
+        parsed[key] = value
+        i += 1
+    return parsed
+
+
+def array_tasks(spec):
+    """Return the task ids of an ``--array`` specification such as ``0-9%4`` or ``1,3,5``."""
+    tasks = []
+    for part in spec.split('%')[0].split(','):
+        match = re.fullmatch(r"(\d+)(?:-(\d+))?(?::(\d+))?", part)
+        if match is None:
+            raise ValueError("Cannot parse --array={}".format(spec))
+        start = int(match.group(1))
+        stop = int(match.group(2)) if match.group(2) else start
+        step = int(match.group(3)) if match.group(3) else 1
+        tasks.extend(range(start, stop + 1, step))
+    return tasks
+
+
+def load_jobs(state):
+    """Return the recorded jobs, keyed on job id."""
+    jobs = {}
+    try:
+        with open(os.path.join(state, "jobs.jsonl")) as infile:
+            for line in infile:
+                record = json.loads(line)
+                jobs[record["jobid"]] = record
+    except OSError:
+        pass
+    return jobs
+
+
+def dependencies_met(state, dependency):
+    """Return whether every job in an ``afterok:<id>[:<id>...]`` dependency completed."""
+    kind, _, jobids = dependency.partition(':')
+    if kind != "afterok":
+        raise ValueError("Only afterok dependencies are supported, not --dependency={}".format(dependency))
+    jobs = load_jobs(state)
+    return all(jobs.get(int(jobid), {}).get("state") == "COMPLETED" for jobid in jobids.split(':'))
+
+
+def run_script(state, jobid, filename, tasks):
+    """Run a script once per array task (or once, if not an array); return the exit codes."""
+    returncodes = {}
+    for task in tasks if tasks is not None else [None]:
+        env = dict(os.environ, SLURM_JOB_ID=str(jobid))
+        outname = "{}.out".format(jobid)
+        if task is not None:
+            env.update(SLURM_ARRAY_JOB_ID=str(jobid), SLURM_ARRAY_TASK_ID=str(task))
+            outname = "{}_{}.out".format(jobid, task)
+        with open(os.path.join(state, outname), 'w') as outfile:
+            process = subprocess.run(["bash", filename], env=env, stdout=outfile, stderr=subprocess.STDOUT)
+        returncodes[str(task) if task is not None else "0"] = process.returncode
+    return returncodes
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--run", action="store_true",
+                        help="Execute the script now, once per array task.")
+    parser.add_argument("script", help="The slurm script to submit.")
+    args, options = parser.parse_known_args(args)
+
+    options = parse_options(script_options(args.script) + options)
+    state = state_dir()
+    jobid = next_jobid(state)
+    tasks = array_tasks(options["array"]) if "array" in options else None
+    record = dict(jobid=jobid, name=options.get("job-name", os.path.basename(args.script)),
+                  script=os.path.abspath(args.script), options=options, tasks=tasks,
+                  steps=script_steps(args.script), submitted=time.time(), state="PENDING")
+    if args.run and "dependency" in options and not dependencies_met(state, options["dependency"]):
+        record["state"] = "CANCELLED"
+    elif args.run:
+        record["returncodes"] = run_script(state, jobid, args.script, tasks)
+        failed = any(code != 0 for code in record["returncodes"].values())
+        record["state"] = "FAILED" if failed else "COMPLETED"
+    with open(os.path.join(state, "jobs.jsonl"), 'a') as outfile:
+        outfile.write(json.dumps(record) + '\n')
+
+    print("Submitted batch job {}".format(jobid))
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
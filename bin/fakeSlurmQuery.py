@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+"""
+Stand-in for slurm's squeue and sacct, reporting on the jobs submitted with
+fakeSbatch.py, for testing trackJobs.py without a cluster:
+
+    fakeSlurmQuery.py squeue -h -r -o '%i|%T|%M' -j 1000,1001
+    fakeSlurmQuery.py sacct -n -P -o JobID,JobName,State,Elapsed,MaxRSS,ExitCode -j 1000,1001
+
+Jobs that fakeSbatch.py ran with --run (or cancelled) are reported as it
+recorded them. Every other job is simulated from the time it was submitted:
+each array task, or the job with all of its named srun steps, waits in the
+queue and then runs for around $FAKE_SLURM_SECONDS seconds (default 5), with
+one in ten taking five times as long. A fraction $FAKE_SLURM_FAILURES
+(default 0.1) of the tasks and steps fail or run out of memory. The outcome
+of each job depends only on its id.
+
+The state directory is the same as fakeSbatch.py's: $FAKE_SBATCH_DIR, or
+`fake-slurm` in the current directory.
+"""
+import json
+import os
+import random
+import time
+
+QUEUED_STATES = ("PENDING", "RUNNING")
+
+
+def load_jobs():
+    """Return the jobs recorded by fakeSbatch.py, keyed on job id."""
+    jobs = {}
+    path = os.path.join(os.environ.get("FAKE_SBATCH_DIR", "fake-slurm"), "jobs.jsonl")
+    try:
+        with open(path) as infile:
+            for line in infile:
+                record = json.loads(line)
+                jobs[record["jobid"]] = record
+    except OSError:
+        pass
+    return jobs
+
+
+def simulate_unit(jobid, index, seconds, failures):
+    """Return the queue wait, run time, final state, exit code and MaxRSS (in
+    KB) of one array task or srun step."""
+    rng = random.Random(jobid*100003 + index)
+    wait = rng.uniform(0, seconds)
+    run = rng.uniform(0.5, 1.5)*seconds
+    if rng.random() < 0.1:
+        run *= 5
+    roll = rng.random()
+    if roll < failures*2/3:
+        state, exitcode = "FAILED", "1:0"
+    elif roll < failures:
+        state, exitcode = "OUT_OF_MEMORY", "0:125"
+    else:
+        state, exitcode = "COMPLETED", "0:0"
+    return wait, run, state, exitcode, int(rng.uniform(1, 8)*1024**2)
+
+
+def progress(age, wait, run, state):
+    """Return the state and elapsed seconds, ``age`` seconds after submission."""
+    if age < wait:
+        return "PENDING", 0
+    if age < wait + run:
+        return "RUNNING", age - wait
+    return state, run
+
+
+def row(jobid, name, state, elapsed, maxrss="", exitcode="0:0"):
+    """Return one line of output, as a dict of sacct fields."""
+    return dict(JobID=str(jobid), JobName=name, State=state, Elapsed=elapsed, MaxRSS=maxrss,
+                ExitCode=exitcode)
+
+
+def job_rows(record, now, seconds, failures):
+    """Return the rows for the job, its array tasks and its steps."""
+    jobid, name = record["jobid"], record["name"]
+    tasks, steps = record.get("tasks"), record.get("steps") or []
+    if record["state"] != "PENDING":
+        # Run (or cancelled) by fakeSbatch.py; report what it recorded.
+        codes = record.get("returncodes", {})
+        if tasks is None:
+            return [row(jobid, name, record["state"], 0, exitcode="%d:0" % codes.get("0", 0))]
+        rows = []
+        for task in tasks:
+            code = codes.get(str(task), 0)
+            state = record["state"] if not codes else "COMPLETED" if code == 0 else "FAILED"
+            rows.append(row("{}_{}".format(jobid, task), name, state, 0, exitcode="%d:0" % code))
+        return rows
+
+    age = now - record.get("submitted", now)
+    rows = []
+    if tasks is not None:
+        for task in tasks:
+            wait, run, final, exitcode, rss = simulate_unit(jobid, task, seconds, failures)
+            state, elapsed = progress(age, wait, run, final)
+            taskid = "{}_{}".format(jobid, task)
+            done = state == final
+            rows.append(row(taskid, name, state, elapsed, exitcode=exitcode if done else "0:0"))
+            if state != "PENDING":
+                rows.append(row(taskid + ".batch", "batch", state, elapsed, "%dK" % rss if done else "",
+                                exitcode if done else "0:0"))
+        return rows
+
+    units = [simulate_unit(jobid, i, seconds, failures) for i in range(max(len(steps), 1))]
+    wait = units[0][0]
+    end = max(run for _, run, _, _, _ in units)
+    final = "COMPLETED" if all(unit[2] == "COMPLETED" for unit in units) else "FAILED"
+    state, elapsed = progress(age, wait, end, final)
+    done = state == final
+    rows.append(row(jobid, name, state, elapsed, exitcode=("0:0" if final == "COMPLETED" else "1:0")
+                    if done else "0:0"))
+    if state == "PENDING":
+        return rows
+    rows.append(row("{}.batch".format(jobid), "batch", state, elapsed, exitcode=rows[0]["ExitCode"]))
+    if not steps:
+        rows[-1]["MaxRSS"] = "%dK" % units[0][4] if done else ""
+    for i, (step, (_, run, final, exitcode, rss)) in enumerate(zip(steps, units)):
+        state, elapsed = progress(age, wait, run, final)
+        done = state == final
+        rows.append(row("{}.{}".format(jobid, i), step, state, elapsed, "%dK" % rss if done else "",
+                        exitcode if done else "0:0"))
+    return rows
+
+
+def squeue_time(seconds):
+    """Format elapsed seconds as squeue does, e.g. ``1:05`` or ``2:01:05``."""
+    seconds = int(seconds)
+    hours, minutes, seconds = seconds // 3600, seconds // 60 % 60, seconds % 60
+    return "%d:%02d:%02d" % (hours, minutes, seconds) if hours else "%d:%02d" % (minutes, seconds)
+
+
+def squeue_line(fmt, jobid, name, state, elapsed):
+    """Fill in the %i, %j, %T and %M fields of an squeue format string."""
+    return fmt.replace("%i", jobid).replace("%j", name).replace("%T", state).replace("%M", elapsed)
+
+
+def sacct_time(seconds):
+    """Format elapsed seconds as sacct does, e.g. ``00:01:05``."""
+    seconds = int(seconds)
+    return "%02d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, add_help=False,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("squeue", "sacct"),
+                        help="Which slurm command to stand in for.")
+    parser.add_argument("-j", "--jobs", default=None,
+                        help="Comma-separated job ids to report on (default: all).")
+    parser.add_argument("-o", "--format", default=None,
+                        help="squeue format string, or comma-separated sacct fields.")
+    parser.add_argument("-h", "-n", "--noheader", action="store_true",
+                        help="Do not print a header line.")
+    parser.add_argument("-r", "-P", "--array", "--parsable2", action="store_true",
+                        help="Accepted for compatibility; tasks are always listed one per line,"
+                        " separated by |.")
+    parser.add_argument("--help", action="help",
+                        help="Show this help message and exit.")
+    args, _ = parser.parse_known_args(args)
+
+    seconds = float(os.environ.get("FAKE_SLURM_SECONDS", 5))
+    failures = float(os.environ.get("FAKE_SLURM_FAILURES", 0.1))
+    jobs = load_jobs()
+    wanted = sorted(jobs) if args.jobs is None else [int(jobid) for jobid in args.jobs.split(',') if jobid]
+    now = time.time()
+    rows = []
+    for jobid in wanted:
+        if jobid in jobs:
+            rows.extend(job_rows(jobs[jobid], now, seconds, failures))
+
+    if args.command == "squeue":
+        fmt = args.format or "%i|%j|%T|%M"
+        if not args.noheader:
+            print(squeue_line(fmt, "JOBID", "NAME", "STATE", "TIME"))
+        for x in rows:
+            # squeue only lists jobs and array tasks that are still queued.
+            if '.' in x["JobID"] or x["State"] not in QUEUED_STATES:
+                continue
+            print(squeue_line(fmt, x["JobID"], x["JobName"], x["State"], squeue_time(x["Elapsed"])))
+    else:
+        fields = (args.format or "JobID,JobName,State,Elapsed,MaxRSS,ExitCode").split(',')
+        if not args.noheader:
+            print('|'.join(fields))
+        for x in rows:
+            x = dict(x, Elapsed=sacct_time(x["Elapsed"]))
+            print('|'.join(str(x.get(field, "")) for field in fields))
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
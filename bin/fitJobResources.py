@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Fit the walltime and memory of past jointcal jobs, to size future slurm
+requests with e.g. `jointcal-process.py --resources`.
+
+The walltime of each job comes from the database written by
+ingestJointcalLogs.py, its peak memory from a sacct dump made with e.g.:
+
+    sacct --parsable2 --format=JobID,Elapsed,MaxRSS,State -S 2018-09-01 > sacct.txt
+
+and its number of visits from the tract-visit overlap databases. Give the
+jointcal config each rerun used with --config, so that the fit can account for
+the model orders.
+
+With --synthetic, first write a fixture of made-up jobs (following a known
+scaling, with noise) to a directory and fit that, to try this out offline.
+"""
+import os
+import sqlite3
+
+import numpy as np
+
+from lsst.jointcal_compare.longlog import open_db
+from lsst.jointcal_compare.resources import (FEATURE_NAMES, FittedCostModel, config_orders, load_sacct,
+                                             training_rows)
+from lsst.jointcal_compare.visits import load_visits
+
+
+def write_synthetic(directory, njobs=300, seed=12345):
+    """Write a log database, sacct dump, overlaps database and two configs
+    describing made-up jobs whose walltime and memory scale as ``nvisits**1.3``
+    and ``nvisits``, and increase with the astrometry visit order.
+
+    Returns
+    -------
+    logdb, sacct, overlaps, configs : `str`, `str`, `str`, `dict` [`str`, `str`]
+        The files written; ``configs`` maps each rerun to its config.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.RandomState(seed)
+    configs = {}
+    for rerun, order in (("synthetic-order5", 5), ("synthetic-order7", 7)):
+        configs[rerun] = os.path.join(directory, rerun + "Config.py")
+        with open(configs[rerun], 'w') as outfile:
+            outfile.write("config.astrometryVisitOrder = %d\n" % order)
+
+    overlaps = os.path.join(directory, "overlaps_synthetic.sqlite3")
+    logdb = os.path.join(directory, "jointcal-logs.sqlite3")
+    sacct = os.path.join(directory, "sacct.txt")
+    for path in (overlaps, logdb):
+        if os.path.exists(path):
+            os.remove(path)
+    calexps = []
+    jobs = []
+    sacct_lines = ["JobID|Elapsed|MaxRSS|State"]
+    for i in range(njobs):
+        tract, filt = 10000 + i//5, "HSC-" + "GRIZY"[i % 5]
+        rerun = sorted(configs)[i % 2]
+        nvisits = int(rng.randint(2, 400))
+        calexps.extend((tract, filt, visit) for visit in range(nvisits))
+        order = 5 if rerun.endswith("5") else 7
+        minutes = 5*(nvisits/10)**1.3*(1 + 0.1*(order - 5))*rng.lognormal(0, 0.15)
+        memory = (1500 + 60*nvisits)*rng.lognormal(0, 0.1)
+        jobid = "%d.%d" % (500000 + i//5, i % 5)
+        jobs.append(("synthetic-%d" % i, rerun, "jointcal", "WIDE", tract, filt, jobid, "completed", 0.0,
+                     minutes*60))
+        sacct_lines.append("%s|%02d:%02d:00|%dK|COMPLETED" % (jobid, minutes//60, minutes % 60, memory*1024))
+
+    conn = sqlite3.connect(overlaps)
+    with conn:
+        conn.execute("create table calexp (tract integer, filter text, visit integer)")
+        conn.executemany("insert into calexp values (?,?,?)", calexps)
+    conn.close()
+    conn = open_db(logdb)
+    with conn:
+        conn.executemany("insert into jobs (logfile, rerun, stage, field, tract, filter, jobid, status,"
+                         " start, duration) values (?,?,?,?,?,?,?,?,?,?)", jobs)
+    conn.close()
+    with open(sacct, 'w') as outfile:
+        outfile.write('\n'.join(sacct_lines) + '\n')
+    return logdb, sacct, overlaps, configs
+
+
+def print_fit(model, X, minutes, memory):
+    """Print the fitted coefficients, and how many training jobs fit in what
+    the model would request for them."""
+    print("%-22s %10s %10s" % ("feature", "log(min)", "log(MB)"))
+    for name, time_coeff, memory_coeff in zip(FEATURE_NAMES, model.time_coeffs, model.memory_coeffs):
+        print("%-22s %10.3f %10.3f" % (name, time_coeff, memory_coeff))
+    print("%-22s %10.3f %10.3f" % ("residual quantile", model.time_offset, model.memory_offset))
+    time_pred = np.exp(X @ model.time_coeffs + model.time_offset)
+    memory_pred = np.exp(X @ model.memory_coeffs + model.memory_offset)
+    good = np.isfinite(memory)
+    print("%d of %d jobs fit in their predicted walltime; %d of %d in their predicted memory." %
+          ((minutes <= time_pred).sum(), len(minutes), (memory[good] <= memory_pred[good]).sum(), good.sum()))
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="jointcal-logs.sqlite3",
+                        help="Log database written by ingestJointcalLogs.py (default=%(default)s).")
+    parser.add_argument("--sacct", help="sacct --parsable2 dump with JobID, Elapsed, MaxRSS and State.")
+    parser.add_argument("--overlaps", nargs='+', default=[],
+                        help="Tract-visit overlap databases covering the jobs' tracts.")
+    parser.add_argument("--config", action="append", default=[], metavar="RERUN=CONFIG",
+                        help="The jointcal config a rerun used; jobs of reruns without one are not fit.")
+    parser.add_argument("--quantile", type=float, default=0.95,
+                        help="Raise predictions by this quantile of the fit residuals (default=%(default)s).")
+    parser.add_argument("-o", "--output", default="jointcal-resources.json",
+                        help="File to write the fitted model to (default=%(default)s).")
+    parser.add_argument("--synthetic", metavar="DIR",
+                        help="Write a synthetic set of past jobs to DIR, and fit those instead.")
+    args = parser.parse_args(args)
+
+    if args.synthetic:
+        args.db, args.sacct, overlaps, configs = write_synthetic(args.synthetic)
+        args.overlaps = [overlaps]
+        args.config = ["%s=%s" % item for item in configs.items()]
+    if args.sacct is None:
+        parser.error("--sacct is required, to know the jobs' memory use.")
+
+    visits = {}
+    for path in args.overlaps:
+        visits.update(load_visits(path))
+    orders = {}
+    for item in args.config:
+        rerun, _, path = item.partition('=')
+        orders[rerun] = config_orders(path)
+    X, minutes, memory = training_rows(args.db, load_sacct(args.sacct), visits, orders)
+    if len(minutes) == 0:
+        print("No completed jobs with known visits and config in %s; nothing to fit." % args.db)
+        return 1
+
+    model = FittedCostModel.fit(X, minutes, memory, quantile=args.quantile)
+    print_fit(model, X, minutes, memory)
+    model.save(args.output)
+    print("Wrote model to", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Ingest jointcal --longlog output into a sqlite database of per-job timing,
+chi2/ndof per fit iteration, star and ccdImage counts, and final status.
+
+Files that are unchanged since they were last ingested with the same --rerun
+are skipped, so this can be rerun on a growing log directory; ingesting them
+with another --rerun moves them to that rerun. Query the database with sqlite3,
+e.g. the slowest astrometry fits of a rerun:
+
+    select tract, filter, duration from steps join jobs using (logfile)
+    where rerun = 'DM-15713' and step = 'astrometry' order by duration desc;
+"""
+import fnmatch
+import os
+
+from lsst.jointcal_compare.longlog import ingest, open_db
+
+
+def find_logs(paths, pattern):
+    """Return the log files in ``paths``, searching directories for ``pattern``."""
+    logs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for entry in os.scandir(path):
+                if entry.is_file() and fnmatch.fnmatch(entry.name, pattern):
+                    logs.append(entry.path)
+        else:
+            logs.append(path)
+    return sorted(logs)
+
+
+def print_summary(dbpath, rerun):
+    """Print the job status counts and mean step durations of one rerun."""
+    conn = open_db(dbpath)
+    try:
+        print("Status of %s jobs:" % rerun)
+        for status, count in conn.execute("select status, count(*) from jobs where rerun = ?"
+                                          " group by status order by status", (rerun,)):
+            print("    %-10s %d" % (status, count))
+        print("Mean duration of each step (minutes):")
+        for field, step, njobs, mean, longest in conn.execute(
+                "select field, step, count(*), avg(steps.duration), max(steps.duration)"
+                " from steps join jobs using (logfile) where rerun = ?"
+                " group by field, step order by field, min(steps.start)", (rerun,)):
+            if mean is None:
+                continue
+            print("    %-6s %-12s %5d jobs  mean %8.1f  max %8.1f" %
+                  (field, step, njobs, mean/60, longest/60))
+    finally:
+        conn.close()
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs='+',
+                        help="Log files, or directories to search for them.")
+    parser.add_argument("--rerun", required=True,
+                        help="Rerun these logs belong to, e.g. DM-15713.")
+    parser.add_argument("--db", default="jointcal-logs.sqlite3",
+                        help="Database to write to (default=%(default)s).")
+    parser.add_argument("--pattern", default="jointcal-*.log",
+                        help="File name pattern to search directories for (default=%(default)s).")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of processes to parse the logs with (default=%(default)s).")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-parse every log, even those that have not changed.")
+    parser.add_argument("-s", "--summary", action="store_true",
+                        help="Print a summary of the rerun's jobs after ingesting.")
+    args = parser.parse_args(args)
+
+    logs = find_logs(args.paths, args.pattern)
+    nparsed = ingest(args.db, logs, args.rerun, jobs=args.jobs, force=args.force)
+    print("Parsed %d of %d log files into %s" % (nparsed, len(logs), args.db))
+    if args.summary:
+        print_summary(args.db, args.rerun)
+
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1:])
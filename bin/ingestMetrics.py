@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Add one rerun's reportPerformance tables to a metric store, so that the
+summary scripts can read them with --store and metricHistory.py can compare
+them with every other rerun.
+
+Files that are unchanged since they were last ingested are skipped, so this
+can be rerun as a rerun's tracts land. For example, to add the jointcal and
+meas_mosaic results of DM-11783:
+
+    ingestMetrics.py --rerun DM-11783 --source jointcal /project/parejkoj/DM-11783/performance
+    ingestMetrics.py --rerun DM-11783 --source mosaic /project/parejkoj/DM-11783/performance
+"""
+import fnmatch
+import os
+
+from lsst.jointcal_compare.tables import add_reader_arguments
+from lsst.jointcal_compare.warehouse import ingest
+
+
+def find_inputs(paths, pattern):
+    """Return the files in ``paths``, searching directories for entries
+    (files, or tract directories for the json reader) matching ``pattern``."""
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path) and not fnmatch.fnmatch(os.path.basename(os.path.normpath(path)), pattern):
+            inputs.extend(entry.path for entry in os.scandir(path) if fnmatch.fnmatch(entry.name, pattern))
+        else:
+            inputs.append(path)
+    return sorted(inputs)
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs='+',
+                        help="Report files, or directories to search for them.")
+    parser.add_argument("--rerun", required=True,
+                        help="Rerun these reports belong to, e.g. DM-15713.")
+    parser.add_argument("--source", required=True,
+                        help="Calibration source the reports measure, e.g. jointcal, mosaic or single.")
+    parser.add_argument("--store", default="metrics.sqlite3",
+                        help="Database to write to (default=%(default)s).")
+    parser.add_argument("--pattern", default=None,
+                        help="File name pattern to search directories for (default=<tract>-<source>.rst,"
+                        " or the tract directories with --reader json).")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-read every file, even those that have not changed.")
+    add_reader_arguments(parser, cache=False)
+    args = parser.parse_args(args)
+
+    if args.pattern is None:
+        args.pattern = "[0-9]*" if args.reader == "json" else "[0-9]*-{}.rst".format(args.source)
+    inputs = find_inputs(args.paths, args.pattern)
+    nread = ingest(args.store, inputs, args.rerun, args.source, reader=args.reader, jobs=args.jobs,
+                   force=args.force)
+    print("Read %d of %d %s reports of %s into %s" %
+          (nread, len(inputs), args.source, args.rerun, args.store))
+
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1:])
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Print how one metric has changed across the reruns in a metric store written
+by ingestMetrics.py: its number of tracts, mean, standard deviation, minimum
+and maximum over tracts, for each rerun, source and filter.
+"""
+import time
+
+from lsst.jointcal_compare.warehouse import metric_history
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("metric",
+                        help="Metric to show, e.g. AM1.")
+    parser.add_argument("--store", default="metrics.sqlite3",
+                        help="Database to read (default=%(default)s).")
+    parser.add_argument("--source",
+                        help="Only show this calibration source, e.g. jointcal.")
+    parser.add_argument("--filter",
+                        help="Only show this filter, e.g. HSC-I.")
+    parser.add_argument("-n", "--last", type=int, default=None,
+                        help="Only show the last N reruns ingested (default: all).")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Print how long the query took.")
+    args = parser.parse_args(args)
+
+    start = time.perf_counter()
+    history = metric_history(args.store, args.metric, source=args.source, filt=args.filter, last=args.last)
+    if args.verbose:
+        print("Query took %.1f ms" % ((time.perf_counter() - start)*1000))
+    if not history:
+        print("No measurements of %s in %s" % (args.metric, args.store))
+        return 1
+
+    print("%-12s %-10s %-8s %6s %9s %9s %9s %9s" %
+          ("rerun", "source", "filter", "tracts", "mean", "std", "min", "max"))
+    for row in history:
+        if row.ntracts == 0:
+            print("%-12s %-10s %-8s %6d" % (row.rerun, row.source, row.filter, row.ntracts))
+            continue
+        print("%-12s %-10s %-8s %6d %9.3f %9.3f %9.3f %9.3f" % row)
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
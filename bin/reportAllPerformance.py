@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Summarize validate_drp performance per-tract, by running reportPerformance.py
+on every tract directory of one calibration source, with a bounded number of
+tracts processed at once.
+
+Each tract's output is written to `<outdir>/<tract>-<task>.rst`. Exits with a
+nonzero status if reportPerformance failed for any tract, or if there are no
+tract directories to process.
+"""
+import glob
+import os
+import shlex
+
+from lsst.jointcal_compare.runner import print_result, run_all
+
+
+def tract_commands(command, validate, outdir, task):
+    """Return the reportPerformance command line for each tract directory.
+
+    Parameters
+    ----------
+    command : `list` of `str`
+        The reportPerformance command, without its arguments.
+    validate : `str`
+        The ``validate-<task>`` directory containing one directory per tract.
+    outdir : `str`
+        Directory to write the .rst files to.
+    task : `str`
+        The calibration source: ``jointcal``, ``single`` or ``mosaic``.
+
+    Returns
+    -------
+    commands : `dict` [`str`, `list` of `str`]
+        The command line for each tract, keyed on tract name.
+    """
+    commands = {}
+    for path in sorted(glob.glob(os.path.join(validate, '*'))):
+        if not os.path.isdir(path):
+            print("-", path, "is not a directory.")
+            continue
+        tract = os.path.basename(path)
+        outpath = os.path.join(outdir, "{}-{}.rst".format(tract, task))
+        jsonfiles = sorted(glob.glob(os.path.join(path, '*.json')))
+        commands[tract] = command + ["--output_file={}".format(outpath)] + jsonfiles
+    return commands
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("task", choices=["jointcal", "single", "mosaic"],
+                        help="Calibration source to report on.")
+    parser.add_argument("--root", default="/project/parejkoj/DM-11783",
+                        help="Directory containing validate-<task>/ (default=%(default)s).")
+    parser.add_argument("--outdir", default=None,
+                        help="Directory to write the .rst files to (default=<root>/performance).")
+    parser.add_argument("-j", "--max-jobs", type=int, default=8,
+                        help="Maximum number of tracts to process at once (default=%(default)s).")
+    parser.add_argument("--command", default="reportPerformance.py",
+                        help="Command to run for each tract; it is passed --output_file=<path> and the"
+                        " tract's JSON files (default=%(default)s).")
+    args = parser.parse_args(args)
+
+    validate = os.path.join(args.root, "validate-{}".format(args.task))
+    outdir = args.outdir if args.outdir is not None else os.path.join(args.root, "performance")
+    commands = tract_commands(shlex.split(args.command), validate, outdir, args.task)
+    if not commands:
+        print("No tract directories found in", validate)
+        return 1
+    os.makedirs(outdir, exist_ok=True)
+    print("Processing %d tracts from %s, %d at a time" % (len(commands), validate, args.max_jobs),
+          flush=True)
+    results = run_all(commands, args.max_jobs, callback=print_result)
+
+    failed = [result.name for result in results if result.returncode != 0]
+    total = sum(result.duration for result in results)
+    print("%d of %d tracts succeeded (%.1fs of processing)" %
+          (len(results) - len(failed), len(results), total))
+    if failed:
+        print("Failed tracts:", ' '.join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
@@ -1,19 +1,9 @@
 #!/bin/bash
 # Summarize validate_drp performance per-tract.
-
-function do_one_tract()
-{
-  if [ -d "$1" ]; then
-    TRACT=$(basename $1)
-    OUTPATH=$OUTDIR/$TRACT-$TASK.rst
-    echo "executing: reportPerformance.py --output_file=$OUTPATH "$1"/*.json &"
-    reportPerformance.py --output_file=$OUTPATH "$1"/*.json &
-    pids+=($!)  # Save PID of this background process
-    echo "Processing $TRACT to write $OUTPATH with pid: ${pids[-1]}"
-  else
-    echo "-" "$1" "is not a directory."
-  fi
-}
+#
+# This sets up the stack and runs reportAllPerformance.py, which runs
+# reportPerformance.py on each tract with a bounded number at once
+# (set MAX_JOBS to change it), and exits nonzero if any tract failed.
 
 if [[ $* =~ ^(jointcal|single|mosaic)$ ]]; then
   TASK=$*
@@ -26,17 +16,5 @@ source /software/lsstsw/stack/loadLSST.bash
 setup validate_drp
 
 ROOT=/project/parejkoj/DM-11783
-VALIDATE=$ROOT/validate-$TASK
-OUTDIR=$ROOT/performance
-
-pids=()
-
-for dir in $VALIDATE/*; do
-    do_one_tract "$dir"
-done
 
-for pid in ${pids[*]};
-do
-    echo "Waiting: $pid"
-    wait $pid  # Wait on all PIDs, this returns 0 if ANY process fails
-done
+exec reportAllPerformance.py --root=$ROOT --max-jobs=${MAX_JOBS:-8} $TASK
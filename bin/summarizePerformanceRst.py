@@ -7,243 +7,193 @@ Plots are saved to the current working directory.
 
 Run `reportPerformance.py` from this jointcal_compare/bin/ first, to generate
 the necessary files.
+
+With --watch, keep polling for new or changed .rst files while a rerun is in
+progress: each time a tract finishes, only that tract is read and merged, its
+exceedances are printed, and only its filters' plots are redrawn. Press
+Ctrl-C to stop and print the summary of every tract.
 """
-import glob
 import os.path
+import time
 
-import matplotlib
-matplotlib.use('Agg')  # noqa: E402
-import matplotlib.pyplot as plt
+from lsst.jointcal_compare.plotting import (add_plot_arguments, plot_metric_scatter, render_plots,
+                                            scatter_calls)
+from lsst.jointcal_compare.tables import add_reader_arguments, read_sources
+from lsst.jointcal_compare.warehouse import add_store_arguments, load_frame
 
-import numpy as np
-import astropy.io.ascii
-import astropy.table
-import pandas as pd
+NAMES = ['single', 'mosaic', 'jointcal']
+# not including "PA1" metric here, since it's always above the spec
+DESIGN_METRICS = ("AM1", "AF1", "AM2", "AF2")
+RMS_METRICS = ("AM1", "AF1", "AM2", "AF2", "PA1", "PF1")
+NSIGMA = (1, 2, 3)
+EXCLUDE_TRACTS = (9813,)
 
 
-def read_tables(name, inglob):
-    """Ingest the .rst files with astropy and return a dict of astropy.tables
+def print_y_is_less2(x, name, verbose=False):
+    """Print a green `>` if the value is less than reference+N*sigma, otherwise a red `<`.
 
-    Parameters
-    ----------
-    name : `str`
-        Metric name to read in.
-    inglob : `str`
-        glob pattern to use to search for files with (modified by `inglob.format(name)`)
-    """
-    tables = {}
-    files = glob.glob(inglob.format(name))
-    if files == []:
-        raise RuntimeError("No files found for glob: %s"%inglob.format(name))
-    for infile in files:
-        tract = int(os.path.basename(infile).split('-')[0])
-        temp = astropy.io.ascii.read(infile, format='rst',
-                                     exclude_names=("Comments", "Release Target: FY17"),
-                                     fill_values=[('--', '0'), ('**', '0')])
-        temp.rename_column('SRD Requirement: design', 'Design')
-        temp.rename_column('Value', 'Value_{}'.format(name))
-        tables[tract] = temp
-    return tables
-
-
-def plotMetricScatter(data, df, name1, name2, band, descriptions,
-                      fromSingle=False, toMosaic=False, xmin=None, ymin=None):
-    """
-    Plot two metrics against each other, e.g. jointcal vs. mosaic linked by lines.
-
-    Parameters
-    ----------
-    data : `astropy.table`
-        Astropy table containing the merged data.
-    df : `pandas.Dataframe`
-        Dataframe containing the data.
-    name1 : `str`
-        Name of x-axis metric.
-    name2 : `str`
-        Name of y-axis metric.
-    band : `str`
-        Filter band to plot.
-    descriptions : `dict` of `str`
-        name: descriptions, used to label the plot axes.
-    fromSingle : `bool`
-        Plot the line from singleFrame to jointcal, instead of from mosaic.
-    toMosaic : `bool`
-        Plot the line to meas_mosaic, instead of to jointcal.
+    ``x`` is one row from `source_exceedances`.
     """
+    from lsst.jointcal_compare.analysis import format_value
 
-    limit1 = data[data['Metric'] == name1]['Design'][0]
-    limit2 = data[data['Metric'] == name2]['Design'][0]
-
-    t1 = df.loc[name1].loc[band]
-    t2 = df.loc[name2].loc[band]
-    title = "%s vs. %s: %s" % (name1, name2, band)
-    plt.figure(title, figsize=(8, 6))
-    assert np.all(t1.tract == t2.tract)
-    plt.title(title)
-    plt.axvline(limit1, color='grey', ls='--')
-    plt.axhline(limit2, color='grey', ls='--')
-
-    # draw lines from single->jointcal or mosaic->jointcal
-    if fromSingle:
-        value2 = 'Value_mosaic' if toMosaic else 'Value_jointcal'
-        plt.scatter(t1.Value_single, t2.Value_single, label="single", color="orange")
-        plt.plot(np.concatenate([[s, j, None] for s, j in zip(t1.Value_single,
-                                                              t1[value2])]),
-                 np.concatenate([[s, j, None] for s, j in zip(t2.Value_single,
-                                                              t2[value2])]),
-                 'k', alpha=0.1, label="same tract")
-        prefix = 'single'
-    else:
-        plt.scatter(t1.Value_mosaic, t2.Value_mosaic, label="mosaic", color="purple")
-        plt.plot(np.concatenate([[s, j, None] for s, j in zip(t1.Value_mosaic,
-                                                              t1.Value_jointcal)]),
-                 np.concatenate([[s, j, None] for s, j in zip(t2.Value_mosaic,
-                                                              t2.Value_jointcal)]),
-                 'k', alpha=0.1, label="same tract")
-        prefix = 'mosaic'
-
-    if toMosaic:
-        plt.scatter(t1.Value_mosaic, t2.Value_mosaic, label="mosaic", color="purple")
-        suffix = 'mosaic'
-    else:
-        plt.scatter(t1.Value_jointcal, t2.Value_jointcal, label="jointcal", color="green")
-        suffix = 'jointcal'
-
-    plt.xlabel("%s: %s" % (name1, descriptions[name1]))
-    plt.ylabel("%s: %s" % (name2, descriptions[name2]))
-    if xmin is not None:
-        plt.xlim(xmin=xmin)
-    if ymin is not None:
-        plt.ylim(ymin=ymin)
-    plt.legend()
-    filename = "%s-%sv%s_%s-%s.png" % (prefix, name1, name2, band, suffix)
-    plt.savefig(filename)
-    plt.close()
-    print("Wrote plot to:", filename)
-
+    if (verbose or x.exceeds):
+        sign = ">" if x.threshold > x.value else "<"
+        less = f"\033[92m{sign}\033[0m" if x.threshold > x.value else f"\033[91m{sign}\033[0m"
+        print("%s : (%s + %s*%.3f = %.3f) %s %s"%(name, format_value(x.reference), x.N, x.sigma,
+                                                  x.threshold, less, format_value(x.value)))
+        return True
+    return False
 
-def main(args):
-    import argparse
-    parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("path", metavar="path", nargs='?', type=str, default='.',
-                        help="Path containing the .rst files to process (default=%(default)s).")
-    parser.add_argument("-p", "--plot", action="store_true",
-                        help="Generate metric comparison plots.")
-    parser.add_argument("-v", "--verbose", action="store_true",
-                        help="Be more verbose when reading and computing statistics.")
-    parser.add_argument("-i", "--interactive", action="store_true",
-                        help="Open an ipdb console before exiting.")
-    args = parser.parse_args(args)
 
-    inglob = os.path.join(args.path, "*-{}.rst")
-    jointcal = read_tables('jointcal', inglob)
-    mosaic = read_tables('mosaic', inglob)
-    single = read_tables('single', inglob)
-
-    tracts = list(single.keys())
-
-    join_keys = ('Metric', 'Filter', 'Operator', 'Design')
-
-    if args.verbose:
-        print('counts per tract (should be identical): single, mosaic, jointcal')
-    per_tract = {}
-    for tract in tracts:
-        temp = astropy.table.join(single[tract], mosaic[tract], keys=join_keys, join_type='outer')
-        temp = astropy.table.join(temp, jointcal[tract], keys=join_keys, join_type='outer')
-        if args.verbose:
-            print(tract, len(single[tract]), len(mosaic[tract]), len(jointcal[tract]))
-        temp['tract'] = tract  # for group_by()
-        # The single Unit column (Unit_1) is going to have values for all fields,
-        # others may not (i.e. if it wasn't measured).
-        temp.remove_columns(['Unit', 'Unit_2'])
-        temp.rename_column('Unit_1', 'Unit')
-        per_tract[tract] = temp
-
-    data = astropy.table.vstack(list(per_tract.values()))
-
-    filters = set(data['Filter'])
-
-    df = data.to_pandas()
-    df.set_index(pd.MultiIndex.from_arrays([df.Metric, df.Filter]), inplace=True)
-
-    descriptions = {
-        "AM1": "repeatability (marcsec) for pairs at 5 arcmin",
-        "AM2": "repeatability (marcsec) for pairs at 20 arcmin",
-        "AF1": "outlier fraction (%) for pairs at 5 min",
-        "AF2": "outlier fraction (%) for pairs at 20 min",
-        "PA1": "repeatability (mmag) of PSF source magnitudes",
-        "PF1": "outlier fraction (%) deviating by more than PA2"
-    }
-
-    if args.plot:
-        for filt in filters:
-            plotMetricScatter(data, df, "AM1", "AF1", filt, descriptions, xmin=0, ymin=0)
-            plotMetricScatter(data, df, "AM2", "AF2", filt, descriptions, xmin=0, ymin=0)
-            plotMetricScatter(data, df, "PA1", "PF1", filt, descriptions)
-            plotMetricScatter(data, df, "AM1", "AF1", filt, descriptions, fromSingle=True, xmin=0, ymin=0)
-            plotMetricScatter(data, df, "AM2", "AF2", filt, descriptions, fromSingle=True, xmin=0, ymin=0)
-            plotMetricScatter(data, df, "PA1", "PF1", filt, descriptions, fromSingle=True)
-            plotMetricScatter(data, df, "AM1", "AF1", filt, descriptions,
-                              fromSingle=True, toMosaic=True, xmin=0, ymin=0)
-            plotMetricScatter(data, df, "AM2", "AF2", filt, descriptions,
-                              fromSingle=True, toMosaic=True, xmin=0, ymin=0)
-            plotMetricScatter(data, df, "PA1", "PF1", filt, descriptions, fromSingle=True, toMosaic=True)
+def print_design_report(df):
+    """Print the jointcal measurements in ``df`` that exceed the design requirements."""
+    from lsst.jointcal_compare.analysis import design_exceedances
 
     print()
     print("jointcal calibrations that exceed metrics for a given filter+tract")
     print("------------------------------------------------------------------")
 
-    # not including "PA1" metric here, since it's always above the spec
-    for metric in ("AM1", "AF1", "AM2", "AF2"):
+    exceed = design_exceedances(df, DESIGN_METRICS, 'jointcal')
+    for metric in DESIGN_METRICS:
         print("Metric:", metric)
         print("-----------")
-        test = data['Metric'] == metric
-        limit = data[test]['Design']
-        exceed = data[test]['Value_jointcal'] >= limit
-        for x in data[test][exceed]:
-            print("{} {} : {} > {}".format(x['Filter'], x['tract'], x['Value_jointcal'], x['Design']))
+        for x in exceed[exceed.Metric == metric].itertuples():
+            print("{} {} : {} > {}".format(x.Filter, x.tract, x.Value, x.Design))
         print()
 
-    def rms(x):
-        """Compute the root mean squared of a distribution."""
-        return np.sqrt(np.mean(x**2))
-
-    def print_y_is_less(x, y, name, verbose=False):
-        """Print a green `>` if y is less than x, otherwise a red `<`."""
-        if (verbose or x < y):
-            print(name, x, "\033[92m>\033[0m" if x > y else "\033[91m<\033[0m", y)
-
-    def print_y_is_less2(x, N, sigma, y, name, verbose=False):
-        """Print a green `>` if y is less than x+N*sigma, otherwise a red `<`."""
-        threshold = x + N*sigma
-        if (verbose or threshold < y):
-            sign = ">" if threshold > y else "<"
-            less = f"\033[92m{sign}\033[0m" if threshold > y else f"\033[91m{sign}\033[0m"
-            print("%s : (%s + %s*%.3f = %.3f) %s %s"%(name, x, N, sigma, threshold, less, y))
-            return True
-        return False
+
+def print_rms_report(df, verbose=False, sigma=None):
+    """Print the jointcal measurements in ``df`` that exceed mosaic by more
+    than N times mosaic's RMS; ``sigma`` is passed to `source_exceedances`."""
+    from lsst.jointcal_compare.analysis import source_exceedances
 
     # compute final summary statistics
     print("mosaic vs. jointcal metric RMSs")
     print("-------------------------------")
-    for metric in ("AM1", "AF1", "AM2", "AF2", "PA1", "PF1"):
+    comparisons = source_exceedances(df, RMS_METRICS, 'mosaic', 'jointcal', nsigma=NSIGMA,
+                                     exclude_tracts=EXCLUDE_TRACTS, sigma=sigma)
+    for metric in RMS_METRICS:
         print("jointcal tracts that exceed mosaic metric for", metric)
-        test = (data['Metric'] == metric) & (data['tract'] != 9813)
-        mosaic = data[test]['Value_mosaic']
-        jointcal = data[test]['Value_jointcal']
-        mosaic_rms = rms(mosaic)
-        # jointcal_rms = rms(jointcal)
-        name = metric + ' rms: '
-        for x in data[test]:
-            name = "{} {}".format(x['Filter'], x['tract'])
-            printed = print_y_is_less2(x['Value_mosaic'], 1, mosaic_rms, x['Value_jointcal'], name,
-                                       verbose=args.verbose)
-            print_y_is_less2(x['Value_mosaic'], 2, mosaic_rms, x['Value_jointcal'], name,
-                             verbose=args.verbose)
-            print_y_is_less2(x['Value_mosaic'], 3, mosaic_rms, x['Value_jointcal'], name,
-                             verbose=args.verbose)
-            if printed:
+        for x in comparisons[comparisons.Metric == metric].itertuples():
+            name = "{} {}".format(x.Filter, x.tract)
+            shown = print_y_is_less2(x, name, verbose=verbose)
+            # separate each tract that exceeds at 1 sigma from the next
+            if x.N == NSIGMA[0]:
+                printed = shown
+            if x.N == NSIGMA[-1] and printed:
+                print()
+        print()
+
+
+def plot_filters(data, df, filters, jobs=1):
+    """Draw every comparison plot of each of ``filters``."""
+    calls = scatter_calls(filters, (('mosaic', 'jointcal'), ('single', 'jointcal'), ('single', 'mosaic')),
+                          colors={'single': 'orange', 'mosaic': 'purple', 'jointcal': 'green'})
+    render_plots(plot_metric_scatter, (data, df), calls, jobs=jobs)
+
+
+def watch(args, inglob):
+    """Poll for new or changed files until interrupted, printing the
+    exceedances of each tract that changed (and redrawing its filters' plots).
+
+    Returns
+    -------
+    data, df
+        The merged tables of every tract, as returned by `merge_sources`.
+    """
+    from lsst.jointcal_compare.watch import RunningRms, TractWatcher
+
+    watcher = TractWatcher(NAMES, inglob, reader=args.reader, cache=args.cache, jobs=args.jobs)
+    rms = RunningRms('mosaic', RMS_METRICS, exclude_tracts=EXCLUDE_TRACTS)
+    print("Watching %s every %gs; press Ctrl-C to stop." % (inglob.format('*'), args.interval), flush=True)
+    try:
+        while True:
+            start = time.perf_counter()
+            tracts, part, failures = watcher.update()
+            for failure in failures:
+                print("Could not read, will retry:", failure)
+            if tracts:
+                rms.update(tracts, part)
+                read = time.perf_counter() - start
                 print()
+                print("=== %s: updated %d tract%s%s (read and merged in %.1f ms) ===" %
+                      (time.strftime("%H:%M:%S"), len(tracts), "" if len(tracts) == 1 else "s",
+                       ": " + " ".join(str(tract) for tract in tracts) if len(tracts) <= 10 else "",
+                       read*1000))
+                print_design_report(part)
+                print_rms_report(part, verbose=args.verbose, sigma=rms.sigma())
+                print("Summary updated in %.1f ms" % ((time.perf_counter() - start)*1000), flush=True)
+                if args.plot and len(part) > 0:
+                    plot_filters(*watcher.merged(), set(part['Filter']), jobs=args.plot_jobs)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print()
+    return watcher.merged()
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", metavar="path", nargs='?', type=str, default='.',
+                        help="Path containing the .rst files to process, or the validate-<source>"
+                        " directories with --reader json (default=%(default)s).")
+    add_plot_arguments(parser)
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Be more verbose when reading and computing statistics.")
+    parser.add_argument("-b", "--bootstrap", action="store_true",
+                        help="Print bootstrap confidence intervals and permutation p-values for the"
+                        " mean difference of each metric between mosaic and jointcal.")
+    parser.add_argument("--resamples", type=int, default=10000,
+                        help="Number of bootstrap resamples and permutations (default=%(default)s).")
+    parser.add_argument("-i", "--interactive", action="store_true",
+                        help="Open an ipdb console before exiting.")
+    parser.add_argument("-w", "--watch", action="store_true",
+                        help="Keep watching for new or changed files, updating the summary of each tract"
+                        " as it finishes; Ctrl-C prints the summary of every tract and exits.")
+    parser.add_argument("--interval", type=float, default=2.0,
+                        help="Seconds between checks for changed files with --watch (default=%(default)s).")
+    add_reader_arguments(parser)
+    add_store_arguments(parser, rerun=True)
+    args = parser.parse_args(args)
+    if args.store is not None and args.rerun is None:
+        parser.error("--rerun is required with --store.")
+    if args.store is not None and args.watch:
+        parser.error("--watch reads the .rst files, so cannot be used with --store.")
+
+    # pandas and astropy are only needed once the arguments have been parsed.
+    from lsst.jointcal_compare.analysis import bootstrap_significance, print_significance
+    from lsst.jointcal_compare.merge import merge_frame, merge_sources
+
+    if args.reader == "json":
+        inglob = os.path.join(args.path, "validate-{}", "[0-9]*")
+    else:
+        inglob = os.path.join(args.path, "*-{}.rst")
+    if args.watch:
+        data, df = watch(args, inglob)
+        if len(df) == 0:
+            print("No files matching %s were found." % inglob.format('*'))
+            return 1
+        print("Summary of all %d tracts" % len(set(df['tract'])))
+    elif args.store is not None:
+        frame = load_frame(args.store, {name: (args.rerun, name) for name in NAMES})
+        data, df = merge_frame(frame, NAMES)
+    else:
+        sources = read_sources(NAMES, inglob, jobs=args.jobs, cache=args.cache, verbose=args.verbose,
+                               reader=args.reader)
+        data, df = merge_sources(sources)
+
+    if args.plot and not args.watch:
+        plot_filters(data, df, set(data['Filter']), jobs=args.plot_jobs)
+
+    print_design_report(df)
+    print_rms_report(df, verbose=args.verbose)
+
+    if args.bootstrap:
+        print("mosaic vs. jointcal mean metric differences")
+        print("-------------------------------------------")
+        significance = bootstrap_significance(df, RMS_METRICS, 'mosaic', 'jointcal', nresample=args.resamples,
+                                              exclude_tracts=EXCLUDE_TRACTS)
+        print_significance(significance, 'mosaic', 'jointcal')
         print()
 
     if args.interactive:
@@ -253,4 +203,4 @@ def main(args):
 
 if __name__ == "__main__":
     import sys
-    main(sys.argv[1:])
+    sys.exit(main(sys.argv[1:]))
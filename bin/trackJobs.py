@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Follow the slurm jobs submitted by the generators in slurm/, per tract/filter,
+until they have all finished.
+
+Every poll asks squeue and sacct about all the unfinished jobs at once, prints
+each tract/filter that fails and each one that is taking much longer than
+the others as soon as it is seen, and rewrites a table of every tract/filter's
+state, elapsed time and MaxRSS (with --table). For example, to follow the
+jobs submitted with `jointcal-process.py --call`:
+
+    trackJobs.py /project/parejkoj/DM-11783/slurm-logs/jobs.txt --table jobs-status.txt
+
+To try it without a cluster, submit with fakeSbatch.py and poll
+fakeSlurmQuery.py instead:
+
+    trackJobs.py jobs.txt --squeue "fakeSlurmQuery.py squeue" --sacct "fakeSlurmQuery.py sacct"
+
+Exits with status 1 if any tract/filter failed.
+"""
+import asyncio
+import os
+import time
+
+from lsst.jointcal_compare.tracker import FAILED_STATES, JobTracker, load_jobs, track
+
+
+def write_table(filename, tracker):
+    """Write the tracker's table to ``filename``, replacing it atomically."""
+    tmpname = filename + ".tmp"
+    with open(tmpname, 'w') as outfile:
+        outfile.write("# %s: %s\n" % (time.strftime("%Y-%m-%d %H:%M:%S"), tracker.counts()))
+        outfile.write('\n'.join(tracker.table()) + '\n')
+    os.replace(tmpname, filename)
+
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("jobs",
+                        help="Job registry written by the generators, e.g. <root>/slurm-logs/jobs.txt.")
+    parser.add_argument("--squeue", default="squeue",
+                        help="Command to list queued jobs with (default=%(default)s).")
+    parser.add_argument("--sacct", default="sacct",
+                        help="Command to read job accounting with (default=%(default)s).")
+    parser.add_argument("--interval", type=float, default=60,
+                        help="Seconds between polls (default=%(default)s).")
+    parser.add_argument("--batch-size", type=int, default=200,
+                        help="Maximum number of job ids to ask squeue and sacct about at once"
+                        " (default=%(default)s).")
+    parser.add_argument("--straggler", type=float, default=3.0,
+                        help="Report tract/filters running for more than this many times the median"
+                        " completed elapsed time (default=%(default)s).")
+    parser.add_argument("--table", metavar="FILE",
+                        help="Rewrite the table of every tract/filter's status to FILE after each poll.")
+    parser.add_argument("--once", action="store_true",
+                        help="Poll once and print the table, instead of waiting for the jobs to finish.")
+    args = parser.parse_args(args)
+
+    units = load_jobs(args.jobs)
+    if not units:
+        print("No jobs recorded in", args.jobs)
+        return 0
+    tracker = JobTracker(units, straggler_factor=args.straggler)
+    print("Following %d tract/filters in %d jobs" % (len(units), len(tracker.active_jobs())), flush=True)
+    last = None
+
+    def report(tracker, events):
+        nonlocal last
+        stamp = time.strftime("%H:%M:%S")
+        for event in events:
+            print(stamp, event)
+        counts = tracker.counts()
+        if counts != last:
+            print(stamp, counts, flush=True)
+            last = counts
+        if args.table:
+            write_table(args.table, tracker)
+
+    asyncio.get_event_loop().run_until_complete(track(tracker, squeue=args.squeue, sacct=args.sacct,
+                                                      interval=args.interval, batch_size=args.batch_size,
+                                                      callback=report, once=args.once))
+    print('\n'.join(tracker.table()))
+    failed = [unit for unit in units if tracker.status[unit].state in FAILED_STATES]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1 @@
+"""Helpers shared by the jointcal_compare summary and slurm scripts."""
@@ -0,0 +1,230 @@
+"""
+Vectorized comparisons of the merged metric table against the design
+requirements, and between calibration sources.
+
+Each function computes every comparison for all metrics, filters and tracts
+at once, and returns a tidy `pandas.DataFrame` with one row per comparison,
+so the summary scripts only have to render the rows they want to print.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+__all__ = ["format_value", "design_exceedances", "source_exceedances", "bootstrap_significance",
+           "print_significance"]
+
+# Largest number of random draws (resamples x tracts) to hold in memory at once.
+_MAX_DRAWS = 4000000
+
+
+def format_value(x):
+    """Format a value for printing, showing missing (NaN) values as `--`, as astropy does."""
+    return "--" if np.isnan(x) else str(x)
+
+
+def _order_by_metric(frame, metrics):
+    """Stably reorder ``frame`` so its rows are grouped in the order of ``metrics``."""
+    codes = pd.Categorical(frame['Metric'], categories=metrics).codes
+    return frame.iloc[np.argsort(codes, kind='stable')]
+
+
+def design_exceedances(df, metrics, source):
+    """Find the measurements from one source that do not meet the design requirement.
+
+    Parameters
+    ----------
+    df : `pandas.DataFrame`
+        The merged data from `lsst.jointcal_compare.merge.merge_sources`.
+    metrics : `list` of `str`
+        The metrics to check, in the order to return them.
+    source : `str`
+        The source whose ``Value_{source}`` to compare with ``Design``.
+
+    Returns
+    -------
+    exceed : `pandas.DataFrame`
+        ``Metric``, ``Filter``, ``tract``, ``Value`` and ``Design`` for each
+        measurement with ``Value >= Design``, grouped by metric.
+    """
+    value = 'Value_{}'.format(source)
+    rows = df.loc[df['Metric'].isin(metrics).to_numpy() & (df[value] >= df['Design']).to_numpy()]
+    rows = _order_by_metric(rows, metrics)
+    return pd.DataFrame({'Metric': rows['Metric'].to_numpy(),
+                         'Filter': rows['Filter'].to_numpy(),
+                         'tract': rows['tract'].to_numpy(),
+                         'Value': rows[value].to_numpy(),
+                         'Design': rows['Design'].to_numpy()})
+
+
+def source_exceedances(df, metrics, reference, test, nsigma=(1, 2, 3), exclude_tracts=(), sigma=None):
+    """Compare one source with another, allowing for the spread of the reference.
+
+    For each metric, sigma is the root mean square of the reference source's values over
+    all filters and tracts. Every measurement is then compared with
+    ``reference + N*sigma`` for every N in ``nsigma``, in one broadcast step.
+
+    Parameters
+    ----------
+    df : `pandas.DataFrame`
+        The merged data from `lsst.jointcal_compare.merge.merge_sources`.
+    metrics : `list` of `str`
+        The metrics to compare, in the order to return them.
+    reference : `str`
+        The source to compare against, e.g. ``mosaic``.
+    test : `str`
+        The source being tested, e.g. ``jointcal``.
+    nsigma : `tuple` of `int`, optional
+        The multiples of sigma to compare at.
+    exclude_tracts : `tuple` of `int`, optional
+        Tracts to leave out of both sigma and the comparisons.
+    sigma : `dict` [`str`, `float`], optional
+        The sigma of each metric, e.g. computed over more tracts than are in
+        ``df``; by default it is computed from ``df``.
+
+    Returns
+    -------
+    comparisons : `pandas.DataFrame`
+        One row per measurement and N, with ``Metric``, ``Filter``, ``tract``,
+        ``N``, ``reference``, ``sigma``, ``threshold``, ``value`` and
+        ``exceeds`` (``threshold < value``). Rows are grouped by metric, with
+        the N values for each measurement adjacent and in ``nsigma`` order.
+    """
+    rows = df.loc[df['Metric'].isin(metrics).to_numpy() & ~df['tract'].isin(exclude_tracts).to_numpy()]
+    rows = _order_by_metric(rows, metrics)
+    ref = rows['Value_{}'.format(reference)].to_numpy(dtype=np.float64)
+    value = rows['Value_{}'.format(test)].to_numpy(dtype=np.float64)
+    if sigma is None:
+        # mean() skips NaN, i.e. measurements the reference source does not have.
+        sigma = np.sqrt(pd.Series(ref**2).groupby(rows['Metric'].to_numpy()).transform('mean').to_numpy())
+    else:
+        sigma = rows['Metric'].map(sigma).to_numpy(dtype=np.float64)
+
+    levels = np.asarray(nsigma)
+    threshold = ref[:, np.newaxis] + levels[np.newaxis, :]*sigma[:, np.newaxis]
+    with np.errstate(invalid='ignore'):
+        exceeds = threshold < value[:, np.newaxis]
+
+    def repeat(values):
+        return np.repeat(values, len(levels))
+
+    return pd.DataFrame({'Metric': repeat(rows['Metric'].to_numpy()),
+                         'Filter': repeat(rows['Filter'].to_numpy()),
+                         'tract': repeat(rows['tract'].to_numpy()),
+                         'N': np.tile(levels, len(rows)),
+                         'reference': repeat(ref),
+                         'sigma': repeat(sigma),
+                         'threshold': threshold.ravel(),
+                         'value': repeat(value),
+                         'exceeds': exceeds.ravel()})
+
+
+def _paired_values(df, metrics, reference, test, exclude_tracts=()):
+    """Return the two sources' values as (tract, group) arrays, where each
+    group is one metric and filter; missing measurements are NaN."""
+    rows = df.loc[df['Metric'].isin(metrics).to_numpy() & ~df['tract'].isin(exclude_tracts).to_numpy()]
+    rows = _order_by_metric(rows, metrics)
+    groups, names = pd.factorize(pd.Series(list(zip(rows['Metric'], rows['Filter']))))
+    tracts, _ = pd.factorize(rows['tract'])
+    values = []
+    for source in (reference, test):
+        array = np.full((tracts.max() + 1 if len(tracts) else 0, len(names)), np.nan)
+        array[tracts, groups] = rows['Value_{}'.format(source)].to_numpy(dtype=np.float64)
+        values.append(array)
+    return list(names), values[0], values[1]
+
+
+def bootstrap_significance(df, metrics, reference, test, nresample=10000, confidence=0.95,
+                           exclude_tracts=(), seed=None):
+    """Bootstrap confidence intervals and permutation p-values for the mean
+    difference between two sources, for every metric and filter at once.
+
+    Tracts are the unit of resampling: each bootstrap resample draws tracts
+    with replacement, and each permutation swaps the two sources' values in a
+    random subset of tracts (i.e. flips the sign of their differences). The
+    resamples are drawn once for all tracts as a weight matrix, so the means
+    of every metric and filter come from one matrix product per batch of
+    resamples, and a tract's metrics stay together as in the real data.
+
+    Parameters
+    ----------
+    df : `pandas.DataFrame`
+        The merged data from `lsst.jointcal_compare.merge.merge_sources`.
+    metrics : `list` of `str`
+        The metrics to compare, in the order to return them.
+    reference, test : `str`
+        The sources to compare, e.g. ``mosaic`` and ``jointcal``, or two reruns.
+    nresample : `int`, optional
+        Number of bootstrap resamples, and of permutations.
+    confidence : `float`, optional
+        Confidence level of the percentile interval.
+    exclude_tracts : `tuple` of `int`, optional
+        Tracts to leave out.
+    seed : `int`, optional
+        Random seed, for reproducible results.
+
+    Returns
+    -------
+    significance : `pandas.DataFrame`
+        One row per metric and filter, with ``Metric``, ``Filter``,
+        ``ntracts`` (measured by both sources), ``reference`` and ``test``
+        (their means over those tracts), ``difference`` (``test - reference``),
+        ``low`` and ``high`` (the confidence interval on the difference), and
+        ``p_value`` (two-sided, for no difference). Groups with fewer than two
+        tracts have NaN intervals and p-values.
+    """
+    names, ref, value = _paired_values(df, metrics, reference, test, exclude_tracts)
+    measured = np.isfinite(ref) & np.isfinite(value)
+    diff = np.where(measured, value - ref, 0.0)
+    weight = measured.astype(np.float64)
+    counts = weight.sum(axis=0)
+    ntracts, ngroups = diff.shape
+
+    rng = np.random.RandomState(seed)
+    means = np.empty((nresample, ngroups))
+    extreme = np.zeros(ngroups)
+    batch = max(1, _MAX_DRAWS//max(ntracts, 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        observed = diff.sum(axis=0)/counts
+        for start in range(0, nresample, batch):
+            size = min(batch, nresample - start)
+            # How many times each tract is drawn in each bootstrap resample.
+            draws = rng.randint(0, ntracts, size=(size, ntracts)) + ntracts*np.arange(size)[:, np.newaxis]
+            drawn = np.bincount(draws.ravel(), minlength=size*ntracts).reshape(size, ntracts)
+            drawn = drawn.astype(np.float64)
+            means[start:start + size] = (drawn @ diff)/(drawn @ weight)
+            # With no real difference, each tract's difference is as likely to have either sign.
+            signs = rng.randint(0, 2, size=(size, ntracts))*2.0 - 1.0
+            permuted = (signs @ diff)/counts
+            extreme += (np.abs(permuted) >= np.abs(observed)*(1 - 1e-12)).sum(axis=0)
+
+        alpha = 100*(1 - confidence)/2
+        with warnings.catch_warnings():
+            # Groups that no tract measured have all-NaN means.
+            warnings.simplefilter('ignore', RuntimeWarning)
+            low, high = np.nanpercentile(means, [alpha, 100 - alpha], axis=0)
+        few = counts < 2
+        return pd.DataFrame({'Metric': [name[0] for name in names],
+                             'Filter': [name[1] for name in names],
+                             'ntracts': counts.astype(np.int64),
+                             'reference': np.where(measured, ref, 0.0).sum(axis=0)/counts,
+                             'test': np.where(measured, value, 0.0).sum(axis=0)/counts,
+                             'difference': observed,
+                             'low': np.where(few, np.nan, low),
+                             'high': np.where(few, np.nan, high),
+                             'p_value': np.where(few, np.nan, (extreme + 1)/(nresample + 1))})
+
+
+def print_significance(significance, reference, test, level=0.05):
+    """Print the rows of `bootstrap_significance` as a table, marking the
+    differences that are significant at ``level`` in green (``test`` better)
+    or red (``test`` worse)."""
+    print("%-6s %-8s %6s %9s %9s %9s %20s %8s" % ("Metric", "Filter", "tracts", reference, test,
+                                                  "diff", "interval", "p"))
+    for x in significance.itertuples():
+        interval = "[%8.3f, %8.3f]" % (x.low, x.high)
+        line = "%-6s %-8s %6d %9.3f %9.3f %9.3f %20s %8.4f" % (x.Metric, x.Filter, x.ntracts, x.reference,
+                                                               x.test, x.difference, interval, x.p_value)
+        if x.p_value < level:
+            line = "\033[%dm%s\033[0m" % (92 if x.difference < 0 else 91, line)
+        print(line)
@@ -0,0 +1,105 @@
+"""
+On-disk cache of parsed performance tables, so that repeated runs only have to
+parse the .rst files that are new or have changed.
+
+Each cached table is stored as a ``.npz`` file in a ``.summarize-cache``
+directory next to the file it was read from, keyed on that file's size and
+modification time (or those of every file in a directory read as JSON).
+"""
+import hashlib
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+__all__ = ["CACHE_DIRNAME", "cache_path", "file_key", "load_cached", "save_cached"]
+
+CACHE_DIRNAME = ".summarize-cache"
+
+# Bump this if the layout of the stored arrays changes.
+_CACHE_VERSION = 1
+
+
+def cache_path(infile, name):
+    """Return the path of the cache file for ``infile`` read as ``name``."""
+    dirname, basename = os.path.split(infile)
+    return os.path.join(dirname, CACHE_DIRNAME, "{}.{}.npz".format(basename, name))
+
+
+def file_key(infile):
+    """Return the values that must match for a cached table to be valid.
+
+    For a directory (a validate_drp tract directory, read as JSON) the key is
+    a hash of the name, size and modification time of every file in it, so
+    that adding, removing or rewriting any one of them invalidates it.
+    """
+    if os.path.isdir(infile):
+        stats = sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                       for entry in os.scandir(infile) if entry.is_file())
+        digest = hashlib.sha256(repr(stats).encode()).digest()
+        return np.concatenate([[_CACHE_VERSION], np.frombuffer(digest, dtype=np.int64)])
+    stat = os.stat(infile)
+    return np.array([_CACHE_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def load_cached(infile, name):
+    """Return the cached table for ``infile``, or None if it is missing or stale.
+
+    Parameters
+    ----------
+    infile : `str`
+        Path to the .rst file that was parsed.
+    name : `str`
+        Metric name the table was read in as.
+
+    Returns
+    -------
+    table : `astropy.table.Table` or None
+        The cached table, identical to what `read_one_table` returned when
+        it was stored.
+    """
+    import astropy.table
+
+    path = cache_path(infile, name)
+    try:
+        with np.load(path, allow_pickle=False) as cached:
+            if not np.array_equal(cached['__key__'], file_key(infile)):
+                return None
+            columns = []
+            for colname in cached['__columns__']:
+                data = cached['col:' + colname]
+                if 'mask:' + colname in cached:
+                    columns.append(astropy.table.MaskedColumn(data, name=colname,
+                                                              mask=cached['mask:' + colname]))
+                else:
+                    columns.append(astropy.table.Column(data, name=colname))
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return None
+    return astropy.table.Table(columns)
+
+
+def save_cached(infile, name, table):
+    """Store ``table``, parsed from ``infile`` as ``name``, in the cache.
+
+    The file is written atomically, so a concurrent reader never sees a
+    partially written cache entry.
+    """
+    import astropy.table
+
+    path = cache_path(infile, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = {'__key__': file_key(infile),
+              '__columns__': np.array(table.colnames)}
+    for column in table.itercols():
+        arrays['col:' + column.name] = np.ma.getdata(column)
+        if isinstance(column, astropy.table.MaskedColumn):
+            arrays['mask:' + column.name] = np.ma.getmaskarray(column)
+    fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npz')
+    try:
+        with os.fdopen(fd, 'wb') as outfile:
+            np.savez(outfile, **arrays)
+        os.replace(tmpname, path)
+    except BaseException:
+        os.remove(tmpname)
+        raise
@@ -0,0 +1,328 @@
+"""
+Extract per-job performance information from jointcal's ``--longlog`` output
+and store it in a sqlite database that can be queried across reruns.
+
+Each log line looks like::
+
+    INFO  2018-09-20T19:31:02.123Z jointcal ({...})(jointcal.py:390)- message
+
+Logs are read in large blocks of bytes, and only the lines containing one of
+a few marker strings are decoded and parsed, so multi-GB logs stream through
+quickly without being loaded into memory. From each log we keep:
+
+* the start and duration of each fit step (the lines between successive
+  ``====== Now processing <step>`` markers; anything before the first marker
+  is the ``load`` step),
+* every ``Chi2/ndof`` report, numbered within its step,
+* the last reported number of ccdImages, fitted, measured and reference stars,
+* the final status: ``failed`` if anything was logged at FATAL level or the
+  task reported a failed dataId, ``completed`` if the output WCS/PhotoCalib
+  were written, and ``incomplete`` otherwise (e.g. the job was killed).
+"""
+import collections
+import concurrent.futures
+import datetime
+import os
+import re
+import sqlite3
+import warnings
+
+__all__ = ["JobLog", "parse_filename", "parse_log", "open_db", "ingest"]
+
+JobLog = collections.namedtuple("JobLog", ["path", "status", "start", "duration", "counts", "steps",
+                                           "chi2"])
+JobLog.__doc__ = """What `parse_log` extracted from one log file.
+
+``start`` is a POSIX timestamp and ``duration`` is in seconds (both None for
+an empty log). ``counts`` maps e.g. ``ccdImages`` to the last number reported,
+``steps`` is a list of ``(step, start, duration)`` and ``chi2`` a list of
+``(step, iteration, label, chi2, ndof)``.
+"""
+
+# The log file names written by the generators: {name}_{filt}-{jobid}.log,
+# where name is {stage}-{field}_{tract}.
+FILENAME_RE = re.compile(r"^(?P<stage>.+)-(?P<field>[A-Z]+)_(?P<tract>\d+)_(?P<filt>[A-Z]+-[A-Za-z0-9]+)"
+                         r"-(?P<jobid>.+)\.log$")
+
+STEP_RE = re.compile(r"====== Now processing (\w+)")
+CHI2_RE = re.compile(r"(?P<label>[^:]*?)\s*:?\s*Chi2/ndof\s*:\s*(?P<chi2>[-+.\w]+)/(?P<ndof>\d+)")
+_COUNTED = r"ccdImages?|(?:fitted|measured|ref(?:erence)?)\s*stars"
+COUNT_RE = re.compile(r"(?P<n>\d+)\s+(?P<what>{0})|(?P<what2>{0})[^:\d]*:\s*(?P<n2>\d+)".format(_COUNTED),
+                      re.IGNORECASE)
+
+# Only lines containing one of these are decoded and parsed.
+_MARKERS = (b"======", b"Chi2", b"tars", b"ccdImage", b"FATAL", b"Failed on dataId", b"Updating WCS",
+            b"Updating PhotoCalib")
+_LEVELS = (b"TRACE", b"DEBUG", b"INFO", b"WARN", b"ERROR", b"FATAL")
+_BLOCKSIZE = 16*1024*1024
+
+
+def _count_name(what):
+    """Return the canonical name of a count, e.g. ``fittedStars``."""
+    what = what.lower().replace(' ', '')
+    if what.startswith('ccdimage'):
+        return 'ccdImages'
+    if what.startswith('ref'):
+        return 'refStars'
+    return what[:-len('stars')] + 'Stars'
+
+
+def _timestamp(line):
+    """Return the POSIX timestamp of a longlog line, or None if it has none."""
+    fields = line.split(None, 2)
+    if len(fields) < 2:
+        return None
+    text = fields[1].decode('ascii', 'replace').rstrip('Z')
+    try:
+        return datetime.datetime.strptime(text, "%Y-%m-%dT%H:%M:%S.%f").replace(
+            tzinfo=datetime.timezone.utc).timestamp()
+    except ValueError:
+        try:
+            return datetime.datetime.strptime(text, "%Y-%m-%dT%H:%M:%S").replace(
+                tzinfo=datetime.timezone.utc).timestamp()
+        except ValueError:
+            return None
+
+
+def _message(line):
+    """Return the message part of a decoded longlog line."""
+    _, sep, message = line.partition(")- ")
+    return message if sep else line
+
+
+def parse_filename(path):
+    """Return the stage, field, tract, filter and job id encoded in a log file
+    name, as a dict; the values are None if the name is not in that form."""
+    match = FILENAME_RE.match(os.path.basename(path))
+    if match is None:
+        return dict(stage=None, field=None, tract=None, filt=None, jobid=None)
+    values = match.groupdict()
+    values['tract'] = int(values['tract'])
+    return values
+
+
+def _blocks(infile):
+    """Yield successive blocks of whole lines from a binary file."""
+    remainder = b''
+    while True:
+        data = infile.read(_BLOCKSIZE)
+        if not data:
+            if remainder:
+                yield remainder
+            return
+        data = remainder + data
+        cut = data.rfind(b'\n') + 1
+        if cut == 0:
+            remainder = data
+            continue
+        remainder = data[cut:]
+        yield data[:cut]
+
+
+def _log_lines(block, reverse=False):
+    """Yield the lines of a block that start with a log level (i.e. not the
+    continuation lines of e.g. a traceback), optionally from the end."""
+    lines = block.splitlines()
+    for line in reversed(lines) if reverse else lines:
+        if line.startswith(_LEVELS):
+            yield line
+
+
+def _marked_lines(block):
+    """Return the lines of a block that contain any of `_MARKERS`, in order.
+
+    Each marker is found with `bytes.find`, which scans far faster than
+    testing every line in Python.
+    """
+    starts = set()
+    for marker in _MARKERS:
+        index = block.find(marker)
+        while index >= 0:
+            starts.add(block.rfind(b'\n', 0, index) + 1)
+            end = block.find(b'\n', index)
+            if end < 0:
+                break
+            index = block.find(marker, end)
+    lines = []
+    for start in sorted(starts):
+        end = block.find(b'\n', start)
+        lines.append(block[start:end] if end >= 0 else block[start:])
+    return lines
+
+
+def parse_log(path):
+    """Stream one jointcal longlog file and extract its performance information.
+
+    Parameters
+    ----------
+    path : `str`
+        The log file to read.
+
+    Returns
+    -------
+    log : `JobLog`
+        The status, timing, chi2 and star counts of the job.
+    """
+    first = None
+    last = None
+    steps = []
+    chi2 = []
+    counts = {}
+    failed = False
+    written = False
+    step = 'load'
+    iteration = 0
+    with open(path, 'rb') as infile:
+        for block in _blocks(infile):
+            if first is None:
+                first = next(_log_lines(block), None)
+                if first is not None:
+                    steps.append([step, _timestamp(first)])
+            last = next(_log_lines(block[-65536:], reverse=True), last)
+
+            for line in _marked_lines(block):
+                if not line.startswith(_LEVELS):
+                    continue
+                text = _message(line.decode('utf-8', 'replace').rstrip())
+                if line.startswith(b"FATAL") or "Failed on dataId" in text:
+                    failed = True
+                if "Updating WCS" in text or "Updating PhotoCalib" in text:
+                    written = True
+                match = STEP_RE.search(text)
+                if match is not None:
+                    step = match.group(1)
+                    iteration = 0
+                    steps.append([step, _timestamp(line)])
+                    continue
+                match = CHI2_RE.search(text)
+                if match is not None:
+                    try:
+                        value = float(match.group('chi2'))
+                    except ValueError:
+                        value = float('nan')
+                    chi2.append((step, iteration, match.group('label').strip(), value,
+                                 int(match.group('ndof'))))
+                    iteration += 1
+                    continue
+                for match in COUNT_RE.finditer(text):
+                    what = match.group('what') or match.group('what2')
+                    counts[_count_name(what)] = int(match.group('n') or match.group('n2'))
+
+    if first is None:
+        return JobLog(path, 'incomplete', None, None, counts, [], chi2)
+    start = steps[0][1]
+    end = _timestamp(last)
+    # Each step lasts until the next one starts; the last one until the final line.
+    for this, following in zip(steps, steps[1:] + [[None, end]]):
+        this.append(following[1] - this[1] if following[1] is not None and this[1] is not None else None)
+    status = 'failed' if failed else ('completed' if written else 'incomplete')
+    duration = end - start if end is not None and start is not None else None
+    return JobLog(path, status, start, duration, counts, [tuple(s) for s in steps], chi2)
+
+
+_SCHEMA = """
+create table if not exists jobs (
+    logfile text primary key, size integer, mtime_ns integer,
+    rerun text, stage text, field text, tract integer, filter text, jobid text,
+    status text, start real, duration real,
+    ccdImages integer, fittedStars integer, measuredStars integer, refStars integer);
+create table if not exists steps (
+    logfile text, step text, start real, duration real);
+create table if not exists chi2 (
+    logfile text, step text, iteration integer, label text, chi2 real, ndof integer);
+create index if not exists jobs_rerun_tract_filter on jobs (rerun, tract, filter);
+create index if not exists steps_logfile on steps (logfile);
+create index if not exists chi2_logfile on chi2 (logfile);
+"""
+
+
+def open_db(path):
+    """Open (creating if necessary) a log database.
+
+    Parameters
+    ----------
+    path : `str`
+        The sqlite database file.
+
+    Returns
+    -------
+    conn : `sqlite3.Connection`
+        Connection to the database, with its tables and indexes created.
+    """
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _store(conn, log, rerun, stat):
+    """Replace the rows for one parsed log."""
+    conn.execute("delete from steps where logfile = ?", (log.path,))
+    conn.execute("delete from chi2 where logfile = ?", (log.path,))
+    names = parse_filename(log.path)
+    conn.execute("insert or replace into jobs values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                 (log.path, stat.st_size, stat.st_mtime_ns, rerun, names['stage'], names['field'],
+                  names['tract'], names['filt'], names['jobid'], log.status, log.start, log.duration,
+                  log.counts.get('ccdImages'), log.counts.get('fittedStars'),
+                  log.counts.get('measuredStars'), log.counts.get('refStars')))
+    conn.executemany("insert into steps values (?,?,?,?)", [(log.path,) + step for step in log.steps])
+    conn.executemany("insert into chi2 values (?,?,?,?,?,?)", [(log.path,) + row for row in log.chi2])
+
+
+def ingest(dbpath, paths, rerun, jobs=1, force=False):
+    """Parse log files and store the results, skipping files that have not
+    changed since they were last ingested under the same ``rerun``.
+
+    Each log file belongs to one rerun: ingesting it under another ``rerun``
+    moves it to that rerun, with a warning.
+
+    Parameters
+    ----------
+    dbpath : `str`
+        The sqlite database to write to.
+    paths : `list` of `str`
+        The log files to ingest.
+    rerun : `str`
+        Label for the rerun these logs belong to, so that several reruns can
+        be compared in one database.
+    jobs : `int`, optional
+        Number of processes to parse the logs with.
+    force : `bool`, optional
+        Re-parse every file, even if it is unchanged.
+
+    Returns
+    -------
+    nparsed : `int`
+        The number of files that were parsed.
+    """
+    conn = open_db(dbpath)
+    try:
+        known = {row[0]: row[1:] for row in conn.execute("select logfile, size, mtime_ns, rerun from jobs")}
+        todo = {}
+        relabelled = collections.Counter()
+        for path in (os.path.abspath(path) for path in paths):
+            stat = os.stat(path)
+            size, mtime_ns, previous = known.get(path, (None, None, None))
+            if previous is not None and previous != rerun:
+                relabelled[previous] += 1
+            if force or (size, mtime_ns, previous) != (stat.st_size, stat.st_mtime_ns, rerun):
+                todo[path] = stat
+        for previous, count in sorted(relabelled.items()):
+            warnings.warn("%d log files were ingested as rerun %s; they are now labelled %s." %
+                          (count, previous, rerun))
+
+        def store(log):
+            _store(conn, log, rerun, todo[log.path])
+
+        if jobs > 1 and len(todo) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+                # Write each result as it arrives; sqlite writes stay in this process.
+                with conn:
+                    for log in executor.map(parse_log, todo, chunksize=8):
+                        store(log)
+        else:
+            with conn:
+                for path in todo:
+                    store(parse_log(path))
+    finally:
+        conn.close()
+    return len(todo)
@@ -0,0 +1,108 @@
+"""
+Record which (stage, rerun, tract, filter) units of work have finished, so
+that rerunning a generator only resubmits the units that are missing or
+failed.
+
+The manifest is a tab-separated text file with one
+``stage, rerun, tract, filter, returncode, time`` line per finished unit. Slurm
+jobs append to it from the shell with `RECORD_CMD`, so that recording a unit
+needs nothing beyond bash; if a unit is recorded more than once, the last
+line wins.
+"""
+import os
+import time
+
+__all__ = ["MANIFEST_NAME", "RECORD_CMD", "load_manifest", "record", "completed_units"]
+
+MANIFEST_NAME = "manifest.txt"
+
+# Shell snippet to run straight after a unit's command: appends the unit and
+# that command's exit status to {manifest}, then exits with the same status.
+RECORD_CMD = ("rc=$?; printf '%s\\t%s\\t%s\\t%s\\t%s\\t%s\\n' {stage} {rerun} {tract} {filt} $rc $(date +%s)"
+              " >> {manifest}; exit $rc")
+
+
+def load_manifest(path):
+    """Return the last recorded exit status of each unit in a manifest.
+
+    Parameters
+    ----------
+    path : `str`
+        The manifest file; a missing file is an empty manifest.
+
+    Returns
+    -------
+    returncodes : `dict` [`tuple` [`str`, `str`, `int`, `str`], `int`]
+        The exit status of each ``(stage, rerun, tract, filter)``.
+    """
+    returncodes = {}
+    try:
+        with open(path) as infile:
+            for line in infile:
+                fields = line.rstrip('\n').split('\t')
+                # Skip lines cut short by a job that was killed while writing.
+                if len(fields) != 6:
+                    continue
+                stage, rerun, tract, filt, returncode, _ = fields
+                try:
+                    returncodes[(stage, rerun, int(tract), filt)] = int(returncode)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return returncodes
+
+
+def record(path, stage, rerun, tract, filt, returncode):
+    """Append one finished unit to a manifest.
+
+    Parameters
+    ----------
+    path : `str`
+        The manifest file.
+    stage : `str`
+        The stage the unit belongs to, e.g. ``jointcal``.
+    rerun : `str`
+        The rerun or repository the unit processed.
+    tract : `int`
+        The unit's tract.
+    filt : `str`
+        The unit's filter.
+    returncode : `int`
+        The exit status of the unit's command.
+    """
+    with open(path, 'a') as outfile:
+        outfile.write('\t'.join([stage, rerun, str(tract), filt, str(returncode),
+                                 str(int(time.time()))]) + '\n')
+
+
+def completed_units(path, stage, rerun, units, outputs_exist):
+    """Return the units that succeeded and whose outputs are all present.
+
+    A unit that exited successfully but whose outputs have since gone missing
+    counts as not completed, so that it is run again.
+
+    Parameters
+    ----------
+    path : `str`
+        The manifest file.
+    stage : `str`
+        The stage to check.
+    rerun : `str`
+        The rerun or repository to check.
+    units : `list` of `tuple` [`int`, `str`]
+        The ``(tract, filter)`` units to check.
+    outputs_exist : callable
+        Called with ``(tract, filter)``; returns whether that unit's expected
+        output files exist.
+
+    Returns
+    -------
+    completed : `set` of `tuple` [`int`, `str`]
+        The ``(tract, filter)`` units that do not need to be run again.
+    """
+    if not os.path.exists(path):
+        return set()
+    returncodes = load_manifest(path)
+    return {(tract, filt) for tract, filt in units
+            if returncodes.get((stage, rerun, tract, filt)) == 0 and outputs_exist(tract, filt)}
@@ -0,0 +1,115 @@
+"""
+Merge the per-tract tables from several calibration sources into one table.
+
+Rather than joining each tract's tables one pair at a time, every table is
+stacked into one long frame with a ``source`` column, which is then pivoted
+once on (tract, Metric, Filter, Operator, Design) to give one ``Value_{source}``
+column per source.
+"""
+import numpy as np
+import astropy.table
+import pandas as pd
+
+__all__ = ["JOIN_KEYS", "long_frame", "merge_frame", "merge_sources"]
+
+# The columns that identify the same measurement in each source's table.
+JOIN_KEYS = ('Metric', 'Filter', 'Operator', 'Design')
+
+
+def long_frame(sources):
+    """Stack every source's per-tract tables into one long-format frame.
+
+    Parameters
+    ----------
+    sources : `dict` [`str`, `dict` [`int`, `astropy.table.Table`]]
+        The tables from `read_tables` for each source, keyed on source name;
+        each has a ``Value_{source}`` column.
+
+    Returns
+    -------
+    frame : `pandas.DataFrame`
+        One row per table row, with ``tract``, ``source``, the `JOIN_KEYS`,
+        ``Unit`` and ``Value`` columns; masked values are NaN.
+    """
+    names = ('tract', 'source') + JOIN_KEYS + ('Unit', 'Value')
+    columns = {name: [] for name in names}
+    for source, tables in sources.items():
+        for tract, table in tables.items():
+            columns['tract'].append(np.full(len(table), tract, dtype=np.int64))
+            columns['source'].append(np.full(len(table), source, dtype=object))
+            for key in JOIN_KEYS:
+                columns[key].append(np.ma.getdata(table[key]))
+            unit = table['Unit']
+            columns['Unit'].append(np.ma.filled(unit.astype(object), None)
+                                   if isinstance(unit, np.ma.MaskedArray) else np.asarray(unit, dtype=object))
+            value = table['Value_{}'.format(source)]
+            columns['Value'].append(np.ma.filled(value.astype(np.float64), np.nan))
+    return pd.DataFrame({name: np.concatenate(columns[name]) for name in names})
+
+
+def merge_sources(sources):
+    """Outer-join every source's per-tract tables on the `JOIN_KEYS` and tract.
+
+    This gives the same rows as joining each tract's tables with
+    `astropy.table.join` and stacking the results, in a single pass.
+
+    Parameters
+    ----------
+    sources : `dict` [`str`, `dict` [`int`, `astropy.table.Table`]]
+        The tables from `read_tables` for each source, keyed on source name.
+        The ``Unit`` column is taken from the first source, and tracts are
+        ordered as they first appear.
+
+    Returns
+    -------
+    data : `astropy.table.Table`
+        The merged table, with a ``Value_{source}`` column for each source
+        (masked where that source has no measurement) and a ``tract`` column.
+    df : `pandas.DataFrame`
+        The same data, indexed on (Metric, Filter).
+
+    Raises
+    ------
+    ValueError
+        Raised if any source has more than one row for the same measurement.
+    """
+    return merge_frame(long_frame(sources), list(sources))
+
+
+def merge_frame(frame, names):
+    """Pivot a long-format frame into the tables returned by `merge_sources`.
+
+    Parameters
+    ----------
+    frame : `pandas.DataFrame`
+        One row per measurement, with the columns returned by `long_frame`
+        (e.g. from `lsst.jointcal_compare.warehouse.load_frame`).
+    names : `list` of `str`
+        The sources in ``frame``, in the order of their ``Value_{source}``
+        columns; the ``Unit`` column is taken from the first.
+
+    Returns
+    -------
+    data, df
+        As for `merge_sources`.
+    """
+    first = names[0]
+    index = ['tract'] + list(JOIN_KEYS)
+
+    # Preserve the order tracts were read in, instead of sorting them; the
+    # caller's frame is left as it was.
+    frame = frame.assign(tract=pd.Categorical(frame['tract'], categories=pd.unique(frame['tract'])))
+    wide = frame.pivot(index=index, columns='source', values='Value')
+    wide.columns = ['Value_{}'.format(name) for name in wide.columns]
+    units = frame.loc[frame['source'] == first].set_index(index)['Unit']
+    wide['Unit'] = units.reindex(wide.index)
+    wide = wide.reset_index()
+    wide['tract'] = wide['tract'].astype(np.int64)
+
+    order = ['Metric', 'Filter', 'Value_{}'.format(first), 'Unit', 'Operator', 'Design']
+    order.extend('Value_{}'.format(name) for name in names[1:])
+    wide = wide[order + ['tract']]
+
+    data = astropy.table.Table.from_pandas(wide)
+    df = wide.set_index(pd.MultiIndex.from_arrays([wide.Metric, wide.Filter]))
+    return data, df
@@ -0,0 +1,342 @@
+"""
+Build the tract-visit overlap databases read by `lsst.jointcal_compare.visits`
+from the sky polygons of each tract and of each ccd of each visit.
+
+Each candidate (tract, ccd) pair is found with a bounding-box index (a sqlite
+R*Tree of the tracts' RA/Dec boxes), and only those pairs are tested exactly:
+tract and ccd polygons are projected onto the plane tangent at the tract's
+centre, where the great-circle edges are straight lines, and tested for
+overlap with the separating axis theorem, for every candidate ccd of a tract
+at once.
+
+The database records which visits and tracts it has been built from, so that
+it can be updated as visits are added: only new visits are tested (against
+every tract), and any new tracts are tested against every visit. Results are
+inserted in batches of visits, each in its own transaction, so an interrupted
+build resumes where it stopped.
+"""
+import collections
+import sqlite3
+
+import numpy as np
+
+from .visits import ensure_index
+
+__all__ = ["Tracts", "Footprints", "read_tracts", "read_footprints", "unit_vectors", "bounding_boxes",
+           "BoxIndex", "polygons_overlap", "update_overlaps"]
+
+Tracts = collections.namedtuple("Tracts", ["tract", "ra", "dec"])
+Tracts.__doc__ = """The polygon of each tract: ``tract`` is an array of tract
+numbers, and ``ra`` and ``dec`` are (ntract, nvertex) arrays in degrees."""
+
+Footprints = collections.namedtuple("Footprints", ["visit", "ccd", "filter", "ra", "dec"])
+Footprints.__doc__ = """The polygon of each calexp: ``visit``, ``ccd`` and
+``filter`` are arrays with one entry per calexp, and ``ra`` and ``dec`` are
+(ncalexp, ncorner) arrays in degrees."""
+
+_SCHEMA = """
+create table if not exists calexp (tract integer, filter text, visit integer, ccd integer);
+create table if not exists overlap_visits (visit integer primary key);
+create table if not exists overlap_tracts (tract integer primary key);
+"""
+
+
+def read_tracts(path):
+    """Read tract polygons from a text file.
+
+    Each line is a tract number followed by the RA and Dec (degrees) of each
+    of its vertices, e.g. from a skymap's ``tractInfo.getVertexList()``::
+
+        9813 149.04 1.23 150.96 1.23 150.96 3.14 149.04 3.14
+
+    Blank lines and lines starting with ``#`` are skipped.
+    """
+    values = np.loadtxt(path, ndmin=2)
+    return Tracts(values[:, 0].astype(np.int64), values[:, 1::2], values[:, 2::2])
+
+
+def read_footprints(path):
+    """Read calexp polygons from a text file.
+
+    Each line is a visit, ccd and filter, followed by the RA and Dec
+    (degrees) of each corner of the ccd, e.g. from each calexp's WCS and
+    bounding box::
+
+        1228 49 HSC-I 150.11 2.20 150.29 2.20 150.29 2.29 150.11 2.29
+
+    Blank lines and lines starting with ``#`` are skipped.
+    """
+    visits, ccds, filters, corners = [], [], [], []
+    with open(path) as infile:
+        for line in infile:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            visits.append(int(fields[0]))
+            ccds.append(int(fields[1]))
+            filters.append(fields[2])
+            corners.append([float(x) for x in fields[3:]])
+    corners = np.array(corners).reshape(len(visits), -1)
+    return Footprints(np.array(visits, dtype=np.int64), np.array(ccds, dtype=np.int64),
+                      np.array(filters, dtype=object), corners[:, 0::2], corners[:, 1::2])
+
+
+def unit_vectors(ra, dec):
+    """Return the unit vectors of RA/Dec positions in degrees, with a last axis of 3."""
+    ra = np.radians(ra)
+    dec = np.radians(dec)
+    return np.stack([np.cos(dec)*np.cos(ra), np.cos(dec)*np.sin(ra), np.sin(dec)], axis=-1)
+
+
+def _normalized(v):
+    """Return vectors scaled to unit length (NaN for zero vectors)."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return v/np.linalg.norm(v, axis=-1, keepdims=True)
+
+
+def bounding_boxes(ra, dec):
+    """Return RA/Dec boxes that contain each polygon, edges included.
+
+    The Dec range includes the furthest point of each great-circle edge from
+    the equator, not just of the vertices. Polygons that may contain a pole
+    get the full RA range, and polygons that cross RA=0 get two boxes.
+
+    Parameters
+    ----------
+    ra, dec : `numpy.ndarray`
+        (npolygon, nvertex) arrays of the vertices, in degrees.
+
+    Returns
+    -------
+    index, ramin, ramax, decmin, decmax : `numpy.ndarray`
+        The polygon each box belongs to, and its bounds in degrees.
+    """
+    v = unit_vectors(ra, dec)
+    center = _normalized(v.sum(axis=1))
+    ra_c = np.degrees(np.arctan2(center[:, 1], center[:, 0])) % 360
+    dec_c = np.degrees(np.arcsin(np.clip(center[:, 2], -1, 1)))
+    offset = (ra - ra_c[:, np.newaxis] + 180) % 360 - 180
+    ramin = ra_c + offset.min(axis=1)
+    ramax = ra_c + offset.max(axis=1)
+
+    # The highest and lowest points of each edge's great circle, where they lie on the edge.
+    a, b = v, np.roll(v, -1, axis=1)
+    normal = _normalized(np.cross(a, b))
+    top = _normalized(np.array([0, 0, 1.0]) - normal[..., 2:]*normal)
+
+    def on_edge(point):
+        after_a = (np.cross(a, point)*normal).sum(axis=-1) >= 0
+        before_b = (np.cross(point, b)*normal).sum(axis=-1) >= 0
+        return after_a & before_b
+
+    zmax = np.where(on_edge(top), top[..., 2], -1).max(axis=1)
+    zmin = np.where(on_edge(-top), -top[..., 2], 1).min(axis=1)
+    decmax = np.maximum(dec.max(axis=1), np.degrees(np.arcsin(zmax)))
+    decmin = np.minimum(dec.min(axis=1), np.degrees(np.arcsin(zmin)))
+
+    # A polygon lies within the circle about its centre through its furthest vertex.
+    radius = np.degrees(np.arccos(np.clip((v*center[:, np.newaxis]).sum(axis=-1), -1, 1))).max(axis=1)
+    polar = 90 - np.abs(dec_c) <= radius
+    ramin = np.where(polar, 0.0, ramin)
+    ramax = np.where(polar, 360.0, ramax)
+    decmax = np.where(polar & (dec_c > 0), 90.0, decmax)
+    decmin = np.where(polar & (dec_c < 0), -90.0, decmin)
+
+    index = np.arange(len(ra))
+    low = ramin < 0
+    high = ramax > 360
+    return (np.concatenate([index, index[low], index[high]]),
+            np.concatenate([np.where(low, 0.0, ramin), ramin[low] + 360, np.zeros(high.sum())]),
+            np.concatenate([np.where(high, 360.0, ramax), np.full(low.sum(), 360.0), ramax[high] - 360]),
+            np.concatenate([decmin, decmin[low], decmin[high]]),
+            np.concatenate([decmax, decmax[low], decmax[high]]))
+
+
+class BoxIndex:
+    """An in-memory sqlite R*Tree of RA/Dec boxes, to find which of them
+    intersect other boxes.
+
+    Parameters
+    ----------
+    index, ramin, ramax, decmin, decmax : `numpy.ndarray`
+        The boxes, as returned by `bounding_boxes`.
+    """
+    def __init__(self, index, ramin, ramax, decmin, decmax):
+        self.index = np.asarray(index)
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("create virtual table boxes using rtree(id, ramin, ramax, decmin, decmax)")
+        self.conn.executemany("insert into boxes values (?,?,?,?,?)",
+                              zip(range(len(self.index)), ramin.tolist(), ramax.tolist(), decmin.tolist(),
+                                  decmax.tolist()))
+        self.conn.execute("create table query (item integer, ramin real, ramax real, decmin real,"
+                          " decmax real)")
+
+    def query(self, index, ramin, ramax, decmin, decmax):
+        """Return the pairs of indexed and given boxes that intersect.
+
+        Returns
+        -------
+        indexed, given : `numpy.ndarray`
+            The polygon index of the box in this index and of the given box,
+            for each distinct pair that intersects.
+        """
+        with self.conn:
+            self.conn.execute("delete from query")
+            self.conn.executemany("insert into query values (?,?,?,?,?)",
+                                  zip(np.asarray(index).tolist(), ramin.tolist(), ramax.tolist(),
+                                      decmin.tolist(), decmax.tolist()))
+            pairs = np.array(self.conn.execute(
+                "select boxes.id, query.item from query, boxes where boxes.ramax >= query.ramin"
+                " and boxes.ramin <= query.ramax and boxes.decmax >= query.decmin"
+                " and boxes.decmin <= query.decmax").fetchall(), dtype=np.int64).reshape(-1, 2)
+        pairs[:, 0] = self.index[pairs[:, 0]]
+        pairs = np.unique(pairs, axis=0)
+        return pairs[:, 0], pairs[:, 1]
+
+
+def polygons_overlap(poly_ra, poly_dec, ra, dec):
+    """Return whether each of many convex polygons overlaps one other convex polygon.
+
+    Parameters
+    ----------
+    poly_ra, poly_dec : `numpy.ndarray`
+        The vertices of the one polygon (e.g. a tract), in degrees.
+    ra, dec : `numpy.ndarray`
+        (npolygon, nvertex) arrays of the vertices of the others (e.g. ccds).
+
+    Returns
+    -------
+    overlaps : `numpy.ndarray` [`bool`]
+        True for each polygon that overlaps or touches the first; polygons
+        more than 90 degrees from its centre never do.
+    """
+    center = _normalized(unit_vectors(poly_ra, poly_dec).sum(axis=0))
+    east = np.cross([0, 0, 1.0], center)
+    east = east/np.linalg.norm(east) if np.linalg.norm(east) > 1e-12 else np.array([0, 1.0, 0])
+    north = np.cross(center, east)
+
+    def project(v):
+        w = v @ center
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.stack([(v @ east)/w, (v @ north)/w], axis=-1), w
+
+    A, _ = project(unit_vectors(poly_ra, poly_dec))
+    B, w = project(unit_vectors(ra, dec))
+    ahead = (w > 0).all(axis=1)
+
+    def perpendicular(edges):
+        return np.stack([-edges[..., 1], edges[..., 0]], axis=-1)
+
+    # Separated along an axis normal to one of A's edges...
+    axes = perpendicular(np.roll(A, -1, axis=0) - A)
+    pa = A @ axes.T
+    pb = B @ axes.T
+    separated = ((pb.max(axis=1) < pa.min(axis=0)) | (pb.min(axis=1) > pa.max(axis=0))).any(axis=1)
+    # ...or to one of B's.
+    axes = perpendicular(np.roll(B, -1, axis=1) - B)
+    pa = np.einsum('vd,nad->nva', A, axes)
+    pb = np.einsum('nvd,nad->nva', B, axes)
+    separated |= ((pb.max(axis=1) < pa.min(axis=1)) | (pb.min(axis=1) > pa.max(axis=1))).any(axis=1)
+    return ahead & ~separated
+
+
+def _open(dbpath):
+    """Open an overlaps database for updating, creating its tables.
+
+    A database that already has calexps but no record of what it was built
+    from (e.g. one made elsewhere) is taken to be complete for the visits
+    and tracts it contains.
+    """
+    conn = sqlite3.connect(dbpath)
+    existing = {row[0] for row in conn.execute("select name from sqlite_master where type = 'table'")}
+    conn.executescript(_SCHEMA)
+    if "overlap_visits" not in existing:
+        with conn:
+            conn.execute("insert or ignore into overlap_visits select distinct visit from calexp")
+            conn.execute("insert or ignore into overlap_tracts select distinct tract from calexp")
+    return conn
+
+
+def update_overlaps(dbpath, tracts, footprints, batch_size=1000, verbose=False):
+    """Add the overlaps of new visits and tracts to a database.
+
+    Parameters
+    ----------
+    dbpath : `str`
+        The overlaps database to create or update.
+    tracts : `Tracts`
+        Every tract to consider.
+    footprints : `Footprints`
+        The calexps of every visit to consider; visits already in the
+        database are only tested against tracts that are not.
+    batch_size : `int`, optional
+        Number of visits to test and insert in each transaction.
+    verbose : `bool`, optional
+        Print progress after each batch.
+
+    Returns
+    -------
+    nvisits, ntracts, nrows : `int`
+        The number of new visits and tracts, and of calexp rows inserted.
+    """
+    conn = _open(dbpath)
+    try:
+        columns = [row[1] for row in conn.execute("pragma table_info(calexp)")]
+        done_visits = {row[0] for row in conn.execute("select visit from overlap_visits")}
+        done_tracts = {row[0] for row in conn.execute("select tract from overlap_tracts")}
+        new_tract = ~np.isin(tracts.tract, list(done_tracts))
+        new_tracts = tracts.tract[new_tract].tolist()
+        with conn:
+            # Rows for tracts that are not yet recorded can only be from an interrupted update.
+            conn.executemany("delete from calexp where tract = ?", [(tract,) for tract in new_tracts])
+
+        order = np.argsort(footprints.visit, kind='stable')
+        visits, starts = np.unique(footprints.visit[order], return_index=True)
+        new_visit = ~np.isin(visits, list(done_visits))
+        if not new_tract.any():
+            # Only new visits can add overlaps.
+            keep = np.repeat(new_visit, np.diff(np.append(starts, len(order))))
+            order = order[keep]
+            visits, starts = np.unique(footprints.visit[order], return_index=True)
+            new_visit = np.ones(len(visits), dtype=bool)
+        ends = np.append(starts[1:], len(order))
+
+        tract_index = BoxIndex(*bounding_boxes(tracts.ra, tracts.dec))
+        nrows = 0
+        for first in range(0, len(visits), batch_size):
+            last = min(first + batch_size, len(visits))
+            rows = order[starts[first]:ends[last - 1]]
+            it, ic = tract_index.query(*bounding_boxes(footprints.ra[rows], footprints.dec[rows]))
+            ic = rows[ic]
+            # Visits that are already done only need testing against new tracts.
+            batch_new = visits[first:last][new_visit[first:last]]
+            keep = new_tract[it] | np.isin(footprints.visit[ic], batch_new)
+            pairs = np.argsort(it[keep], kind='stable')
+            it, ic = it[keep][pairs], ic[keep][pairs]
+            candidates, split = np.unique(it, return_index=True)
+            found = []
+            for i, ccds in zip(candidates, np.split(ic, split[1:])):
+                overlap = polygons_overlap(tracts.ra[i], tracts.dec[i], footprints.ra[ccds],
+                                           footprints.dec[ccds])
+                found.extend((int(tracts.tract[i]), footprints.filter[j], int(footprints.visit[j]),
+                              int(footprints.ccd[j])) for j in ccds[overlap])
+            with conn:
+                if "ccd" in columns:
+                    conn.executemany("insert into calexp (tract, filter, visit, ccd) values (?,?,?,?)",
+                                     found)
+                else:
+                    conn.executemany("insert into calexp (tract, filter, visit) values (?,?,?)",
+                                     sorted({row[:3] for row in found}))
+                conn.executemany("insert or ignore into overlap_visits values (?)",
+                                 [(int(visit),) for visit in visits[first:last]])
+            nrows += len(found)
+            if verbose:
+                print("Tested %d of %d visits; %d calexp overlaps so far" % (last, len(visits), nrows),
+                      flush=True)
+        with conn:
+            conn.executemany("insert or ignore into overlap_tracts values (?)",
+                             [(tract,) for tract in new_tracts])
+        ensure_index(conn)
+    finally:
+        conn.close()
+    return int(new_visit.sum()), len(new_tracts), nrows
@@ -0,0 +1,179 @@
+"""
+Run a graph of dependent commands, starting each one as soon as everything
+it depends on has succeeded, either on this machine or as slurm jobs chained
+with ``--dependency=afterok``.
+
+This removes the barrier between stages: e.g. a tract's validation can start
+as soon as that tract's jointcal fits finish, without waiting for every other
+tract.
+"""
+import collections
+import concurrent.futures
+
+from .runner import run_one
+from .slurm import submit
+
+__all__ = ["Task", "topological_order", "run_graph", "submit_graph"]
+
+Task = collections.namedtuple("Task", ["name", "stage", "args", "deps"])
+Task.__doc__ = """One command in a pipeline: its unique name, the stage it belongs to
+(e.g. ``jointcal``), its command line, and the names of the tasks that must
+succeed before it can start."""
+
+
+def topological_order(tasks):
+    """Return the tasks ordered so that every task comes after its dependencies.
+
+    Tasks that do not depend on each other keep their original order.
+
+    Parameters
+    ----------
+    tasks : `list` of `Task`
+        The tasks to order.
+
+    Returns
+    -------
+    ordered : `list` of `Task`
+        The same tasks, in dependency order.
+
+    Raises
+    ------
+    ValueError
+        Raised if a task depends on a task that is not in ``tasks``, or if
+        the dependencies contain a cycle.
+    """
+    byname = collections.OrderedDict((task.name, task) for task in tasks)
+    nwaiting = {}
+    dependents = collections.defaultdict(list)
+    for task in tasks:
+        for dep in task.deps:
+            if dep not in byname:
+                raise ValueError("Task %s depends on unknown task %s." % (task.name, dep))
+            dependents[dep].append(task.name)
+        nwaiting[task.name] = len(task.deps)
+
+    ready = collections.deque(name for name, count in nwaiting.items() if count == 0)
+    ordered = []
+    while ready:
+        name = ready.popleft()
+        ordered.append(byname[name])
+        for dependent in dependents[name]:
+            nwaiting[dependent] -= 1
+            if nwaiting[dependent] == 0:
+                ready.append(dependent)
+    if len(ordered) != len(byname):
+        cycle = sorted(name for name, count in nwaiting.items() if count > 0)
+        raise ValueError("Dependency cycle among tasks: %s" % ', '.join(cycle))
+    return ordered
+
+
+def run_graph(tasks, max_workers, logfiles=None, callback=None):
+    """Run every task on this machine, each one as soon as its dependencies
+    have succeeded, with at most ``max_workers`` running at once.
+
+    Tasks downstream of a failed task are not run.
+
+    Parameters
+    ----------
+    tasks : `list` of `Task`
+        The tasks to run.
+    max_workers : `int`
+        Maximum number of tasks to run concurrently.
+    logfiles : `dict` [`str`, `str`], optional
+        The log file to write each named task's output to.
+    callback : callable, optional
+        Called with each `~lsst.jointcal_compare.runner.Result` as soon as
+        that task finishes.
+
+    Returns
+    -------
+    results : `list` of `~lsst.jointcal_compare.runner.Result`
+        The result of every task that was run, in dependency order.
+    skipped : `list` of `str`
+        The names of the tasks that were not run because a task they depend
+        on failed.
+    """
+    ordered = topological_order(tasks)
+    byname = {task.name: task for task in ordered}
+    logfiles = logfiles if logfiles is not None else {}
+    waiting = {task.name: set(task.deps) for task in ordered}
+    dependents = collections.defaultdict(list)
+    for task in ordered:
+        for dep in task.deps:
+            dependents[dep].append(task.name)
+
+    results = {}
+    skipped = []
+
+    def skip_downstream(name):
+        for dependent in dependents[name]:
+            if dependent in waiting:
+                del waiting[dependent]
+                skipped.append(dependent)
+                skip_downstream(dependent)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        ready = collections.deque(name for name, deps in waiting.items() if not deps)
+        while ready or running:
+            while ready:
+                name = ready.popleft()
+                del waiting[name]
+                task = byname[name]
+                running[executor.submit(run_one, name, task.args, logfiles.get(name))] = name
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                result = future.result()
+                results[name] = result
+                if callback is not None:
+                    callback(result)
+                if result.returncode != 0:
+                    skip_downstream(name)
+                    continue
+                for dependent in dependents[name]:
+                    if dependent in waiting:
+                        waiting[dependent].discard(name)
+                        if not waiting[dependent]:
+                            ready.append(dependent)
+    return [results[task.name] for task in ordered if task.name in results], skipped
+
+
+def submit_graph(tasks, scripts, logfiles, sbatch="sbatch"):
+    """Submit one slurm job per task, each depending on its tasks' jobs with
+    ``--dependency=afterok``, so that slurm starts it as soon as they succeed.
+
+    Parameters
+    ----------
+    tasks : `list` of `Task`
+        The tasks to submit.
+    scripts : `dict` [`str`, `str`]
+        The slurm script to submit for each named task.
+    logfiles : `dict` [`str`, `str`]
+        The file to write sbatch's output to for each named task.
+    sbatch : `str`, optional
+        The sbatch command to submit with.
+
+    Returns
+    -------
+    jobids : `dict` [`str`, `str`]
+        The slurm job id of each named task.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if sbatch does not report a job id, since the tasks that
+        depend on that job could not then be submitted.
+    """
+    jobids = {}
+    for task in topological_order(tasks):
+        options = []
+        if task.deps:
+            options = ["--dependency=afterok:" + ':'.join(jobids[dep] for dep in task.deps),
+                       "--kill-on-invalid-dep=yes"]
+        jobid = submit(scripts[task.name], logfiles[task.name], sbatch=sbatch, options=options)
+        if jobid is None:
+            raise RuntimeError("sbatch did not report a job id for %s; see %s" %
+                               (task.name, logfiles[task.name]))
+        jobids[task.name] = jobid
+    return jobids
@@ -0,0 +1,231 @@
+"""
+Helpers for drawing the metric comparison plots, and for rendering many of
+them across worker processes.
+
+matplotlib is only imported (with the non-interactive Agg backend) when a
+plot is actually drawn, so that the summary scripts start quickly when not
+plotting.
+"""
+import numpy as np
+
+__all__ = ["METRIC_DESCRIPTIONS", "SCATTER_PAIRS", "tract_segments", "add_tract_links",
+           "plot_metric_scatter", "scatter_calls", "render_plots", "add_plot_arguments"]
+
+# Axis labels of the metrics.
+METRIC_DESCRIPTIONS = {
+    "AM1": "repeatability (marcsec) for pairs at 5 arcmin",
+    "AM2": "repeatability (marcsec) for pairs at 20 arcmin",
+    "AF1": "outlier fraction (%) for pairs at 5 min",
+    "AF2": "outlier fraction (%) for pairs at 20 min",
+    "PA1": "repeatability (mmag) of PSF source magnitudes",
+    "PF1": "outlier fraction (%) deviating by more than PA2"
+}
+
+# The metrics plotted against each other, with the axis limits of each plot.
+SCATTER_PAIRS = (("AM1", "AF1", dict(xmin=0, ymin=0)),
+                 ("AM2", "AF2", dict(xmin=0, ymin=0)),
+                 ("PA1", "PF1", dict()))
+
+
+def _pyplot():
+    """Return `matplotlib.pyplot`, importing it with the Agg backend."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot
+    return matplotlib.pyplot
+
+
+def tract_segments(x0, y0, x1, y1):
+    """Return the line segments from (x0, y0) to (x1, y1) for each tract.
+
+    Parameters
+    ----------
+    x0, y0, x1, y1 : array-like
+        Start and end coordinates, one entry per tract.
+
+    Returns
+    -------
+    segments : `numpy.ndarray`, (N, 2, 2)
+        The segments, suitable for `matplotlib.collections.LineCollection`.
+        Segments with a missing (NaN) end are not drawn.
+    """
+    start = np.column_stack([np.asarray(x0, dtype=np.float64), np.asarray(y0, dtype=np.float64)])
+    end = np.column_stack([np.asarray(x1, dtype=np.float64), np.asarray(y1, dtype=np.float64)])
+    return np.stack([start, end], axis=1)
+
+
+def add_tract_links(ax, x0, y0, x1, y1, label="same tract", **kwargs):
+    """Draw a line linking each tract's two points, as a single LineCollection.
+
+    Parameters
+    ----------
+    ax : `matplotlib.axes.Axes`
+        Axes to draw on.
+    x0, y0, x1, y1 : array-like
+        Start and end coordinates, one entry per tract.
+    label : `str`, optional
+        Legend label for the lines.
+    **kwargs
+        Passed to `matplotlib.collections.LineCollection`; defaults to faint
+        black lines.
+
+    Returns
+    -------
+    lines : `matplotlib.collections.LineCollection`
+        The collection that was added to ``ax``.
+    """
+    import matplotlib.collections
+
+    kwargs.setdefault('colors', 'k')
+    kwargs.setdefault('alpha', 0.1)
+    lines = matplotlib.collections.LineCollection(tract_segments(x0, y0, x1, y1), label=label, **kwargs)
+    ax.add_collection(lines)
+    return lines
+
+
+def plot_metric_scatter(data, df, name1, name2, band, start, end, labels=None, colors=None,
+                        filename="{start}-{name1}v{name2}_{band}-{end}.png", descriptions=METRIC_DESCRIPTIONS,
+                        xmin=None, ymin=None):
+    """
+    Plot two metrics against each other for two sources, e.g. mosaic and
+    jointcal, with a line from each tract's ``start`` point to its ``end`` point.
+
+    Parameters
+    ----------
+    data : `astropy.table`
+        Astropy table containing the merged data.
+    df : `pandas.Dataframe`
+        Dataframe containing the data.
+    name1 : `str`
+        Name of x-axis metric.
+    name2 : `str`
+        Name of y-axis metric.
+    band : `str`
+        Filter band to plot.
+    start, end : `str`
+        The sources to plot, and link each tract from and to.
+    labels : `dict` [`str`, `str`], optional
+        Legend label of each source; by default its name.
+    colors : `dict` [`str`, `str`], optional
+        Marker color of each source; by default matplotlib's.
+    filename : `str`, optional
+        File to save the plot to, formatted with the other arguments.
+    descriptions : `dict` of `str`
+        name: descriptions, used to label the plot axes.
+    xmin, ymin : `float`, optional
+        Lower axis limits.
+    """
+    plt = _pyplot()
+    labels = labels or {}
+    colors = colors or {}
+
+    limit1 = data[data['Metric'] == name1]['Design'][0]
+    limit2 = data[data['Metric'] == name2]['Design'][0]
+
+    t1 = df.loc[name1].loc[band]
+    t2 = df.loc[name2].loc[band]
+    title = "%s vs. %s: %s" % (name1, name2, band)
+    plt.figure(title, figsize=(8, 6))
+    assert np.all(t1.tract == t2.tract)
+    plt.title(title)
+    plt.axvline(limit1, color='grey', ls='--')
+    plt.axhline(limit2, color='grey', ls='--')
+
+    x0, y0 = t1['Value_' + start], t2['Value_' + start]
+    x1, y1 = t1['Value_' + end], t2['Value_' + end]
+    plt.scatter(x0, y0, label=labels.get(start, start), color=colors.get(start))
+    add_tract_links(plt.gca(), x0, y0, x1, y1)
+    plt.scatter(x1, y1, label=labels.get(end, end), color=colors.get(end))
+
+    plt.xlabel("%s: %s" % (name1, descriptions[name1]))
+    plt.ylabel("%s: %s" % (name2, descriptions[name2]))
+    if xmin is not None:
+        plt.xlim(xmin=xmin)
+    if ymin is not None:
+        plt.ylim(ymin=ymin)
+    plt.legend()
+    filename = filename.format(start=start, end=end, name1=name1, name2=name2, band=band)
+    plt.savefig(filename)
+    plt.close()
+    print("Wrote plot to:", filename, flush=True)
+
+
+def scatter_calls(filters, links, **kwargs):
+    """Return the `plot_metric_scatter` keyword arguments for every one of
+    `SCATTER_PAIRS` in every filter, for each ``(start, end)`` in ``links``.
+
+    ``kwargs`` are added to every call, e.g. ``labels`` or ``filename``.
+    """
+    calls = []
+    for filt in filters:
+        for start, end in links:
+            for name1, name2, limits in SCATTER_PAIRS:
+                calls.append(dict(name1=name1, name2=name2, band=filt, start=start, end=end, **limits,
+                                  **kwargs))
+    return calls
+
+
+# The arguments shared by every plot, set once in each worker process.
+_shared = ()
+
+
+def _set_shared(args):
+    global _shared
+    _shared = args
+
+
+def _render(plot, kwargs):
+    return plot(*_shared, **kwargs)
+
+
+def render_plots(plot, shared, calls, jobs=1):
+    """Call ``plot(*shared, **kwargs)`` for each ``kwargs`` in ``calls``.
+
+    Parameters
+    ----------
+    plot : callable
+        Function that draws and saves one figure; it must be importable by
+        name so that it can be sent to worker processes.
+    shared : `tuple`
+        Positional arguments passed to every call, e.g. the merged data.
+        With ``jobs > 1`` these are sent to each worker only once.
+    calls : `list` of `dict`
+        Keyword arguments for each figure.
+    jobs : `int`, optional
+        Number of worker processes to render the figures with; ``1`` renders
+        them serially in this process.
+
+    Raises
+    ------
+    Exception
+        Whatever the first failing call raised, once every figure has been
+        attempted.
+    """
+    errors = []
+    if jobs <= 1 or len(calls) <= 1:
+        for kwargs in calls:
+            try:
+                plot(*shared, **kwargs)
+            except Exception as e:
+                errors.append(e)
+    else:
+        # multiprocessing.Pool, because ProcessPoolExecutor only takes an
+        # initializer from python 3.7.
+        import multiprocessing
+        with multiprocessing.Pool(jobs, initializer=_set_shared, initargs=(shared,)) as pool:
+            results = [pool.apply_async(_render, (plot, kwargs)) for kwargs in calls]
+            for result in results:
+                try:
+                    result.get()
+                except Exception as e:
+                    errors.append(e)
+    if errors:
+        raise errors[0]
+
+
+def add_plot_arguments(parser):
+    """Add the options controlling plotting to an `argparse.ArgumentParser`."""
+    parser.add_argument("-p", "--plot", action="store_true",
+                        help="Generate metric comparison plots.")
+    parser.add_argument("--plot-jobs", type=int, default=1,
+                        help="Number of processes to render the plots with (default=%(default)s).")
@@ -0,0 +1,218 @@
+"""
+Convert the reportPerformance .rst files to HTML, and write an index page
+linking every tract's reports and the summary plots.
+
+All files are converted in one pool of processes, each of which imports
+docutils once, instead of starting ``rst2html.py`` for every file. Files
+whose HTML is newer than their .rst are not converted again, so rebuilding
+the site after a few tracts change only converts those tracts.
+"""
+import concurrent.futures
+import fnmatch
+import html
+import os
+
+from .tables import tract_from_filename
+
+__all__ = ["find_reports", "html_path", "is_stale", "convert_one", "convert_all", "index_html",
+           "build_site"]
+
+
+def find_reports(directory, pattern="*.rst"):
+    """Return every file matching ``pattern`` below ``directory``, sorted,
+    skipping the ``html`` output directory."""
+    reports = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = sorted(name for name in dirnames if name != "html")
+        reports.extend(os.path.join(dirpath, name) for name in fnmatch.filter(filenames, pattern))
+    return sorted(reports)
+
+
+def html_path(rstfile, directory, outdir):
+    """Return the HTML file that ``rstfile``, found below ``directory``, is
+    converted to in ``outdir``.
+
+    The HTML has the same path relative to ``outdir`` as the report has to
+    ``directory``, so that reports with the same name in different reruns,
+    e.g. ``DM-15617/9000-jointcal.rst`` and ``DM-15713/9000-jointcal.rst``,
+    are not written to the same file.
+    """
+    return os.path.join(outdir, os.path.splitext(os.path.relpath(rstfile, directory))[0] + ".html")
+
+
+def is_stale(source, target):
+    """Return True if ``target`` is missing or older than ``source``."""
+    try:
+        return os.stat(target).st_mtime < os.stat(source).st_mtime
+    except FileNotFoundError:
+        return True
+
+
+def convert_one(source, target):
+    """Convert one .rst file to HTML with docutils, as ``rst2html.py`` would.
+
+    A partly written ``target`` is removed if the conversion fails, so that
+    it is not taken to be up to date next time.
+    """
+    import docutils.core
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        docutils.core.publish_file(source_path=source, destination_path=target, writer="html")
+    except BaseException:
+        if os.path.exists(target):
+            os.remove(target)
+        raise
+    return target
+
+
+def convert_all(pairs, jobs=1):
+    """Convert each ``(source, target)`` pair, in ``jobs`` worker processes.
+
+    Returns
+    -------
+    failures : `list` of `str`
+        A message for each file that could not be converted.
+    """
+    failures = []
+    if jobs > 1 and len(pairs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(convert_one, *pair): pair for pair in pairs}
+            for future in concurrent.futures.as_completed(futures):
+                error = future.exception()
+                if error is not None:
+                    failures.append("%s: %s: %s" % (futures[future][0], type(error).__name__, error))
+    else:
+        for source, target in pairs:
+            try:
+                convert_one(source, target)
+            except Exception as error:
+                failures.append("%s: %s: %s" % (source, type(error).__name__, error))
+    return sorted(failures)
+
+
+def _split_report(rstfile):
+    """Return the (tract, source) of a ``<tract>-<source>.rst`` file, or None."""
+    try:
+        tract = tract_from_filename(rstfile)
+    except ValueError:
+        return None
+    source = os.path.splitext(os.path.basename(rstfile))[0].partition('-')[2]
+    return tract, source
+
+
+def index_html(reports, plots, directory, outdir, title="jointcal_compare performance reports"):
+    """Return an HTML page linking each report's HTML and showing each plot.
+
+    Parameters
+    ----------
+    reports : `list` of `str`
+        The .rst files; ``<tract>-<source>.rst`` files are laid out as a
+        table of tracts by source, one row per folder and tract, and any
+        others are listed after it.
+    plots : `list` of `str`
+        Image files to show, below the reports.
+    directory : `str`
+        Directory the reports were found in; folders are shown relative to it.
+    outdir : `str`
+        Directory the page and the report HTML are written to; links are
+        relative to it.
+    title : `str`, optional
+        Title of the page.
+    """
+    table = {}
+    others = []
+    for rstfile in reports:
+        key = _split_report(rstfile)
+        if key is None:
+            others.append(rstfile)
+        else:
+            folder = os.path.dirname(os.path.relpath(rstfile, directory))
+            table.setdefault((folder, key[0]), {})[key[1]] = rstfile
+    sources = sorted({source for row in table.values() for source in row})
+    # Only show the folders if there is more than one.
+    folders = len({folder for folder, _ in table}) > 1
+
+    def link(rstfile, text):
+        href = os.path.relpath(html_path(rstfile, directory, outdir), outdir)
+        return '<a href="%s">%s</a>' % (html.escape(href), html.escape(text))
+
+    lines = ['<!DOCTYPE html>', '<html>', '<head>', '<meta charset="utf-8">',
+             '<title>%s</title>' % html.escape(title),
+             '<style>td, th {padding: 0 0.5em;} img {max-width: 32%;}</style>',
+             '</head>', '<body>', '<h1>%s</h1>' % html.escape(title)]
+    if table:
+        lines.append('<h2>Reports by tract</h2>')
+        lines.append('<table>')
+        header = ''.join('<th>%s</th>' % html.escape(source) for source in sources)
+        lines.append('<tr>%s<th>tract</th>%s</tr>' % ('<th>folder</th>' if folders else '', header))
+        for folder, tract in sorted(table):
+            row = table[(folder, tract)]
+            cells = ['<td>%s</td>' % html.escape(folder)] if folders else []
+            cells.append('<td>%d</td>' % tract)
+            cells.extend('<td>%s</td>' % (link(row[source], source) if source in row else '')
+                         for source in sources)
+            lines.append('<tr>%s</tr>' % ''.join(cells))
+        lines.append('</table>')
+    if others:
+        lines.append('<h2>Other reports</h2>')
+        lines.append('<ul>')
+        lines.extend('<li>%s</li>' % link(rstfile, os.path.relpath(rstfile, directory)) for rstfile in others)
+        lines.append('</ul>')
+    if plots:
+        lines.append('<h2>Summary plots</h2>')
+        for plot in plots:
+            href = html.escape(os.path.relpath(plot, outdir))
+            lines.append('<a href="%s"><img src="%s" alt="%s"></a>' %
+                         (href, href, html.escape(os.path.basename(plot))))
+    lines.extend(['</body>', '</html>'])
+    return '\n'.join(lines) + '\n'
+
+
+def build_site(directory, outdir=None, plotdir=None, jobs=1, force=False, pattern="*.rst"):
+    """Convert the stale .rst files below ``directory`` and write the index.
+
+    Parameters
+    ----------
+    directory : `str`
+        Directory to search for .rst files.
+    outdir : `str`, optional
+        Directory to write the HTML to (default ``<directory>/html``).
+    plotdir : `str`, optional
+        Directory containing the summary plots (``*.png``) to show on the index.
+    jobs : `int`, optional
+        Number of processes to convert the files with.
+    force : `bool`, optional
+        Convert every file, even those whose HTML is up to date.
+    pattern : `str`, optional
+        File name pattern of the reports.
+
+    Returns
+    -------
+    nconverted, nreports : `int`
+        How many reports were converted, out of how many found.
+    index : `str`
+        The index page written.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if any file could not be converted; the message lists every
+        file that failed and why. The index is written first regardless.
+    """
+    outdir = outdir if outdir is not None else os.path.join(directory, "html")
+    os.makedirs(outdir, exist_ok=True)
+    reports = find_reports(directory, pattern)
+    pairs = [(rstfile, html_path(rstfile, directory, outdir)) for rstfile in reports]
+    pairs = [pair for pair in pairs if force or is_stale(*pair)]
+    failures = convert_all(pairs, jobs=jobs)
+
+    plots = []
+    if plotdir is not None:
+        plots = sorted(os.path.join(plotdir, name) for name in fnmatch.filter(os.listdir(plotdir), "*.png"))
+    index = os.path.join(outdir, "index.html")
+    with open(index, 'w') as outfile:
+        outfile.write(index_html(reports, plots, directory, outdir))
+    if failures:
+        raise RuntimeError("Failed to convert %d of %d files:\n%s" %
+                           (len(failures), len(pairs), '\n'.join(failures)))
+    return len(pairs), len(reports), index
@@ -0,0 +1,264 @@
+"""
+Predict the walltime and memory of a jointcal job from past jobs, so that the
+generated slurm scripts can request what each job needs instead of a whole
+node for a day.
+
+The model is a least-squares fit of ``log(minutes)`` and ``log(memory)``
+against the log of the number of visits, and the astrometry and photometry
+model orders from the jointcal config. Every job processes the same ccds, so
+the number of ccds is not a feature: it would have no effect on the fit.
+Predictions are raised by the given quantile of the fit residuals, so that
+e.g. 95% of the training jobs would have fit in what is requested for them.
+
+Training data comes from the job database written by `ingestJointcalLogs.py`
+(per-job walltime, keyed on the slurm job step id in each log's name) and
+``sacct`` output (the MaxRSS of each job step), joined on the job id.
+"""
+import json
+import math
+import re
+import sqlite3
+
+import numpy as np
+
+from .scheduling import Job
+from .slurm import parse_elapsed, parse_memory
+
+__all__ = ["ORDER_DEFAULTS", "FEATURE_NAMES", "config_orders", "features", "load_sacct", "training_rows",
+           "FittedCostModel", "add_resource_arguments", "model_from_args"]
+
+# jointcal's defaults for the model orders, used when a config does not set them.
+ORDER_DEFAULTS = {"astrometryVisitOrder": 5, "astrometryChipOrder": 1, "photometryVisitOrder": 7}
+
+# The names of the elements of each `features` vector, as saved with a model.
+FEATURE_NAMES = ("const", "log_nvisits") + tuple(ORDER_DEFAULTS)
+
+_ORDER_RE = re.compile(r"^\s*config\.(astrometryVisitOrder|astrometryChipOrder|photometryVisitOrder)"
+                       r"\s*=\s*(\d+)", re.MULTILINE)
+
+
+def config_orders(path):
+    """Return the astrometry and photometry model orders set in a jointcal config file.
+
+    The config is read as text rather than executed, since that would need
+    the stack; orders that are not set (or are commented out) get the
+    jointcal defaults.
+
+    Parameters
+    ----------
+    path : `str`
+        The config override file.
+
+    Returns
+    -------
+    orders : `dict` [`str`, `int`]
+        The value of each of `ORDER_DEFAULTS`' fields.
+    """
+    orders = dict(ORDER_DEFAULTS)
+    with open(path) as infile:
+        for name, value in _ORDER_RE.findall(infile.read()):
+            orders[name] = int(value)
+    return orders
+
+
+def features(nvisits, orders):
+    """Return the model's feature vector for one job; see `FEATURE_NAMES`."""
+    return [1.0, math.log(max(nvisits, 1))] + [orders[key] for key in ORDER_DEFAULTS]
+
+
+def load_sacct(path):
+    """Read ``sacct --parsable2 --format=JobID,Elapsed,MaxRSS,State`` output.
+
+    Parameters
+    ----------
+    path : `str`
+        File containing sacct's output, with its header line.
+
+    Returns
+    -------
+    jobs : `dict` [`str`, `tuple`]
+        The ``(minutes, memory_MB, state)`` of each job or step id; minutes
+        and memory are None where sacct left them empty.
+    """
+    jobs = {}
+    with open(path) as infile:
+        header = infile.readline().rstrip('\n').split('|')
+        columns = {name: i for i, name in enumerate(header)}
+        for line in infile:
+            values = line.rstrip('\n').split('|')
+            if len(values) != len(header):
+                continue
+            seconds = parse_elapsed(values[columns['Elapsed']])
+            jobs[values[columns['JobID']]] = (seconds/60 if seconds is not None else None,
+                                              parse_memory(values[columns['MaxRSS']]),
+                                              values[columns['State']])
+    return jobs
+
+
+def training_rows(logdb, sacct, visits, orders):
+    """Return the features, walltime and memory of every completed past job
+    that we know the visits of.
+
+    Parameters
+    ----------
+    logdb : `str`
+        Job database written by ``ingestJointcalLogs.py``.
+    sacct : `dict` [`str`, `tuple`]
+        Output of `load_sacct`; jobs without a MaxRSS in it are used for
+        the walltime fit only.
+    visits : `dict` [`tuple` [`int`, `str`], `list` of `int`]
+        The visits in each (tract, filter), from
+        `lsst.jointcal_compare.visits.load_visits`.
+    orders : `dict` [`str`, `dict`]
+        The model orders (from `config_orders`) used by each rerun; jobs from
+        other reruns are skipped.
+
+    Returns
+    -------
+    X : `numpy.ndarray`
+        One row of `features` per job.
+    minutes : `numpy.ndarray`
+        The walltime of each job.
+    memory : `numpy.ndarray`
+        The peak memory (MB) of each job, NaN if unknown.
+    """
+    conn = sqlite3.connect(logdb)
+    try:
+        rows = conn.execute("select rerun, tract, filter, jobid, duration from jobs"
+                            " where status = 'completed' and duration is not null").fetchall()
+    finally:
+        conn.close()
+    X = []
+    minutes = []
+    memory = []
+    for rerun, tract, filt, jobid, duration in rows:
+        nvisits = len(visits.get((tract, filt), []))
+        if rerun not in orders or nvisits == 0:
+            continue
+        X.append(features(nvisits, orders[rerun]))
+        minutes.append(duration/60)
+        mem = sacct.get(jobid, (None, None, None))[1]
+        memory.append(mem if mem is not None else np.nan)
+    return np.array(X).reshape(-1, len(FEATURE_NAMES)), np.array(minutes), np.array(memory)
+
+
+class FittedCostModel:
+    """Walltime and memory of jointcal jobs, predicted from a fit to past jobs.
+
+    This has the same `job` method as `lsst.jointcal_compare.scheduling.CostModel`,
+    so it can be used to pack jobs onto nodes.
+
+    Parameters
+    ----------
+    time_coeffs, memory_coeffs : `list` of `float`
+        Least-squares coefficients of `features` for log(minutes) and
+        log(memory in MB).
+    time_offset, memory_offset : `float`
+        Residual quantile added to each prediction, in log units.
+    orders : `dict` [`str`, `int`], optional
+        Model orders of the config the predicted jobs will use.
+    """
+    def __init__(self, time_coeffs, memory_coeffs, time_offset=0.0, memory_offset=0.0, orders=None):
+        self.time_coeffs = np.asarray(time_coeffs, dtype=float)
+        self.memory_coeffs = np.asarray(memory_coeffs, dtype=float)
+        self.time_offset = time_offset
+        self.memory_offset = memory_offset
+        self.orders = dict(ORDER_DEFAULTS) if orders is None else orders
+
+    @classmethod
+    def fit(cls, X, minutes, memory, quantile=0.95, **kwargs):
+        """Fit the model to past jobs.
+
+        Parameters
+        ----------
+        X : `numpy.ndarray`
+            One row of `features` per job.
+        minutes : `numpy.ndarray`
+            The walltime of each job.
+        memory : `numpy.ndarray`
+            The peak memory (MB) of each job; NaN entries are ignored.
+        quantile : `float`, optional
+            Raise predictions by this quantile of the residuals.
+        **kwargs
+            Passed on to the constructor.
+
+        Raises
+        ------
+        ValueError
+            Raised if there are no jobs with a known memory to fit.
+        """
+        time_coeffs, time_offset = _fit_log(X, minutes, quantile)
+        good = np.isfinite(memory)
+        if not good.any():
+            raise ValueError("No past jobs with a known memory use to fit.")
+        memory_coeffs, memory_offset = _fit_log(X[good], memory[good], quantile)
+        return cls(time_coeffs, memory_coeffs, time_offset, memory_offset, **kwargs)
+
+    def predict(self, nvisits):
+        """Return the walltime (minutes) and memory (MB) to request for a job."""
+        x = np.array(features(nvisits, self.orders))
+        return (math.exp(x @ self.time_coeffs + self.time_offset),
+                math.exp(x @ self.memory_coeffs + self.memory_offset))
+
+    def job(self, field, tract, filt, nvisits):
+        """Return the `~lsst.jointcal_compare.scheduling.Job` for this tract and
+        filter, with its predicted cost."""
+        minutes, memory = self.predict(nvisits)
+        return Job(field, tract, filt, nvisits, minutes, memory)
+
+    def save(self, path):
+        """Write the fitted coefficients to a JSON file."""
+        with open(path, 'w') as outfile:
+            json.dump(dict(time_coeffs=list(self.time_coeffs), memory_coeffs=list(self.memory_coeffs),
+                           time_offset=self.time_offset, memory_offset=self.memory_offset,
+                           features=list(FEATURE_NAMES)),
+                      outfile, indent=2)
+
+    @classmethod
+    def load(cls, path, orders=None):
+        """Read coefficients written by `save`, to predict jobs with these orders.
+
+        Coefficients of features that are no longer used (``log_nccd``, which
+        was always fit as zero) are dropped.
+        """
+        with open(path) as infile:
+            values = json.load(infile)
+        keep = [values['features'].index(name) for name in FEATURE_NAMES]
+        return cls([values['time_coeffs'][i] for i in keep], [values['memory_coeffs'][i] for i in keep],
+                   values['time_offset'], values['memory_offset'], orders=orders)
+
+
+def add_resource_arguments(parser):
+    """Add the option to size jobs with a fitted model to an `argparse.ArgumentParser`."""
+    parser.add_argument("--resources", metavar="MODEL",
+                        help="Request each job's walltime and memory as predicted by this model, written by"
+                        " fitJobResources.py, instead of a whole node for a day.")
+
+
+def model_from_args(args, config):
+    """Return the `FittedCostModel` requested by the parsed arguments, or None.
+
+    Parameters
+    ----------
+    args : `argparse.Namespace`
+        The parsed arguments.
+    config : `str`
+        The jointcal config override file the jobs will use.
+    """
+    if args.resources is None:
+        return None
+    return FittedCostModel.load(args.resources, orders=config_orders(config))
+
+
+def _fit_log(X, y, quantile):
+    """Least-squares fit of log(y); return the coefficients and residual quantile."""
+    logy = np.log(np.maximum(y, 1e-3))
+    # Features that never vary across the training jobs (e.g. the orders, if
+    # every job used one config) cannot be fit: leave them out of the fit
+    # with a zero coefficient, so that they do not affect predictions.
+    varying = np.ptp(X, axis=0) > 0
+    varying[0] = True
+    coeffs = np.zeros(X.shape[1])
+    coeffs[varying] = np.linalg.lstsq(X[:, varying], logy, rcond=None)[0]
+    residuals = logy - X @ coeffs
+    return coeffs, float(max(np.quantile(residuals, quantile), 0.0))
@@ -0,0 +1,110 @@
+"""
+A fast reader for the ReStructured Text tables written by validate_drp's
+reportPerformance.py.
+
+`astropy.io.ascii` handles every variant of the rst simple-table format, and
+pays for that generality on every file. reportPerformance always writes one
+header line between ``=`` border lines, so the columns can be sliced directly
+out of each line at the border positions, and converted to typed numpy arrays
+in one call per column. Columns are converted the way astropy does it (int,
+then float, then str), and the ``--`` and ``**`` sentinels are masked and
+filled with ``0``, to give the same tables as
+``astropy.io.ascii.read(format='rst', fill_values=[('--', '0'), ('**', '0')])``.
+"""
+import re
+
+import numpy as np
+
+__all__ = ["MISSING_VALUES", "EXCLUDE_NAMES", "parse_rst", "read_rst"]
+
+# reportPerformance writes these for metrics that were not measured or have no spec.
+MISSING_VALUES = ('--', '**')
+# Columns that the summary scripts do not use.
+EXCLUDE_NAMES = ("Comments", "Release Target: FY17")
+
+_border = re.compile(r'=+')
+
+
+def _convert(values):
+    """Convert a list of strings to the first of int, float, str that fits."""
+    for dtype in (np.int64, np.float64):
+        try:
+            return np.array(values, dtype=dtype)
+        except (ValueError, OverflowError):
+            pass
+    return np.array(values, dtype=str)
+
+
+def parse_rst(text, exclude_names=EXCLUDE_NAMES, missing_values=MISSING_VALUES):
+    """Parse the text of a reportPerformance rst table into typed columns.
+
+    Parameters
+    ----------
+    text : `str`
+        Contents of the .rst file.
+    exclude_names : `tuple` of `str`, optional
+        Names of columns to skip.
+    missing_values : `tuple` of `str`, optional
+        Values to mask, replacing them with ``0`` before type conversion.
+
+    Returns
+    -------
+    columns : `dict` [`str`, `numpy.ndarray` or `numpy.ma.MaskedArray`]
+        The columns in file order; those containing any missing values are
+        masked arrays.
+
+    Raises
+    ------
+    ValueError
+        Raised if the text is not a simple rst table with a single header line.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) < 4 or not all(_border.fullmatch(lines[i].replace(' ', ''))
+                                 for i in (0, 2, -1)):
+        raise ValueError("Not a single-header rst simple table.")
+    spans = [[match.start(), match.end()] for match in _border.finditer(lines[0])]
+    # The last column extends to the end of the line.
+    spans[-1][1] = None
+    rows = lines[3:-1]
+
+    columns = {}
+    for start, end in spans:
+        name = lines[1][start:end].strip()
+        if name in exclude_names:
+            continue
+        values = [row[start:end].strip() for row in rows]
+        mask = np.array([value in missing_values for value in values], dtype=bool)
+        if mask.any():
+            values = ['0' if masked else value for value, masked in zip(values, mask)]
+            columns[name] = np.ma.MaskedArray(_convert(values), mask=mask)
+        else:
+            columns[name] = _convert(values)
+    return columns
+
+
+def read_rst(infile, exclude_names=EXCLUDE_NAMES, missing_values=MISSING_VALUES):
+    """Read a reportPerformance .rst file into an astropy table.
+
+    Parameters
+    ----------
+    infile : `str`
+        Path to the .rst file to read.
+    exclude_names : `tuple` of `str`, optional
+        Names of columns to skip.
+    missing_values : `tuple` of `str`, optional
+        Values to mask, replacing them with ``0`` before type conversion.
+
+    Returns
+    -------
+    table : `astropy.table.Table`
+        The table, with the same columns, types and masks that
+        `astropy.io.ascii.read` would give.
+    """
+    import astropy.table
+
+    with open(infile) as f:
+        columns = parse_rst(f.read(), exclude_names=exclude_names, missing_values=missing_values)
+    return astropy.table.Table([astropy.table.MaskedColumn(data, name=name, mask=data.mask)
+                                if isinstance(data, np.ma.MaskedArray)
+                                else astropy.table.Column(data, name=name)
+                                for name, data in columns.items()])
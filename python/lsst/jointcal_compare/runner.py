@@ -0,0 +1,114 @@
+"""
+Run many independent command lines with a bounded number at once, recording
+the exit status, output and duration of each.
+"""
+import collections
+import concurrent.futures
+import subprocess
+import time
+
+__all__ = ["Result", "run_one", "run_all", "print_result", "write_results"]
+
+Result = collections.namedtuple("Result", ["name", "args", "returncode", "stdout", "stderr", "duration"])
+Result.__doc__ = """The outcome of running one command.
+
+``returncode`` is negative if the command was killed by a signal, and ``127``
+if it could not be started at all (``stderr`` then says why). If the output
+went to a log file, ``stdout`` and ``stderr`` are empty.
+"""
+
+
+def run_one(name, args, logfile=None):
+    """Run one command to completion, capturing its output.
+
+    Parameters
+    ----------
+    name : `str`
+        Label for this command, e.g. the tract it processes.
+    args : `list` of `str`
+        The command line to execute.
+    logfile : `str`, optional
+        Write the command's stdout and stderr to this file, instead of
+        capturing them.
+
+    Returns
+    -------
+    result : `Result`
+        The exit status, stdout, stderr and wall-clock duration.
+    """
+    start = time.perf_counter()
+    try:
+        if logfile is None:
+            process = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     universal_newlines=True)
+        else:
+            with open(logfile, 'w') as outlog:
+                process = subprocess.run(args, stdout=outlog, stderr=subprocess.STDOUT)
+    except OSError as e:
+        return Result(name, args, 127, '', str(e), time.perf_counter() - start)
+    return Result(name, args, process.returncode, process.stdout or '', process.stderr or '',
+                  time.perf_counter() - start)
+
+
+def run_all(commands, max_workers, callback=None, logfiles=None):
+    """Run every command, with at most ``max_workers`` running at once.
+
+    Parameters
+    ----------
+    commands : `dict` [`str`, `list` of `str`]
+        The command line to run for each name.
+    max_workers : `int`
+        Maximum number of commands to run concurrently.
+    callback : callable, optional
+        Called with each `Result` as soon as that command finishes.
+    logfiles : `dict` [`str`, `str`], optional
+        The log file to write each named command's output to; commands not
+        in it have their output captured in their `Result`.
+
+    Returns
+    -------
+    results : `list` of `Result`
+        One result per command, in the order of ``commands``.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        logfiles = logfiles if logfiles is not None else {}
+        futures = [executor.submit(run_one, name, args, logfiles.get(name))
+                   for name, args in commands.items()]
+        results = {}
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            results[result.name] = result
+            if callback is not None:
+                callback(result)
+    return [results[name] for name in commands]
+
+
+def print_result(result):
+    """Print one line for a finished command, followed by its stderr if it failed."""
+    if result.returncode == 0:
+        print("OK      %s (%.1fs)" % (result.name, result.duration), flush=True)
+    else:
+        print("FAILED  %s (exit status %d, %.1fs)" % (result.name, result.returncode, result.duration))
+        for line in result.stderr.splitlines():
+            print("        " + line)
+        print(end='', flush=True)
+
+
+def write_results(filename, results, logfiles=None):
+    """Write the exit status and runtime of each command to a text table.
+
+    Parameters
+    ----------
+    filename : `str`
+        File to write the table to.
+    results : `list` of `Result`
+        The results to record.
+    logfiles : `dict` [`str`, `str`], optional
+        The log file of each named command, to record alongside it.
+    """
+    logfiles = logfiles if logfiles is not None else {}
+    with open(filename, 'w') as outfile:
+        outfile.write("# name returncode duration logfile\n")
+        for result in results:
+            outfile.write("%s %d %.3f %s\n" % (result.name, result.returncode, result.duration,
+                                               logfiles.get(result.name, '-')))
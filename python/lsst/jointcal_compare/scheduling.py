@@ -0,0 +1,156 @@
+"""
+Pack tract/filter jobs onto slurm nodes according to their estimated cost.
+
+Every job on a node runs concurrently (one ``srun`` per job, in the
+background), so a node is busy for as long as its most expensive job. Packing
+the jobs longest-first onto the first node with room for them groups jobs of
+similar length together, which keeps the per-node walltime requests tight and
+the number of nodes small.
+"""
+import collections
+import math
+import warnings
+
+__all__ = ["Job", "Packing", "CostModel", "VALIDATE_COST_MODEL", "pack_jobs", "node_minutes",
+           "add_packing_arguments", "packing_from_args"]
+
+Job = collections.namedtuple("Job", ["field", "tract", "filt", "nvisits", "minutes", "memory"])
+Job.__doc__ = """One tract/filter job, with its estimated runtime (minutes) and memory (MB)."""
+
+Packing = collections.namedtuple("Packing", ["model", "node_cores", "node_memory", "margin"])
+Packing.__doc__ = """How to pack jobs onto nodes: a `CostModel`, the cores and memory (MB) of
+each node, and the safety factor on the requested walltime."""
+
+
+class CostModel:
+    """Estimate the runtime and memory of a tract/filter job from its visit count.
+
+    Runtime is ``base_minutes + minutes_per_visit * nvisits**exponent`` and
+    memory is ``base_memory + memory_per_visit * nvisits``.
+
+    The defaults are for jointcal. They are rough estimates picked by hand,
+    not fit to measured jobs, and err on the large side so that packed jobs
+    are not killed: a 100-visit tract/filter gets about 2.3 hours and 7 GB,
+    a 300-visit one about 8 hours and 17 GB. To size jobs from a fit to past
+    jobs instead, use `lsst.jointcal_compare.resources.FittedCostModel`
+    (``jointcal-process.py --resources``).
+
+    Parameters
+    ----------
+    base_minutes : `float`
+        Fixed startup and I/O cost of a job, in minutes.
+    minutes_per_visit : `float`
+        Runtime per visit (to the power ``exponent``), in minutes.
+    exponent : `float`
+        How runtime scales with the number of visits; the fit cost grows
+        faster than linearly for deep tracts.
+    base_memory : `float`
+        Fixed memory of a job, in MB.
+    memory_per_visit : `float`
+        Memory per visit, in MB.
+    """
+    def __init__(self, base_minutes=10, minutes_per_visit=0.5, exponent=1.2,
+                 base_memory=2000, memory_per_visit=50):
+        self.base_minutes = base_minutes
+        self.minutes_per_visit = minutes_per_visit
+        self.exponent = exponent
+        self.base_memory = base_memory
+        self.memory_per_visit = memory_per_visit
+
+    def job(self, field, tract, filt, nvisits):
+        """Return the `Job` for this tract and filter, with its estimated cost."""
+        minutes = self.base_minutes + self.minutes_per_visit*nvisits**self.exponent
+        memory = self.base_memory + self.memory_per_visit*nvisits
+        return Job(field, tract, filt, nvisits, minutes, memory)
+
+
+# validate_drp matches sources across visits, so its runtime grows linearly with
+# the visits, and it holds every visit's catalog at once. Like the jointcal
+# defaults these are generous hand-picked estimates, not a fit: a 100-visit
+# tract/filter gets about 40 minutes and 12 GB.
+VALIDATE_COST_MODEL = CostModel(base_minutes=10, minutes_per_visit=0.3, exponent=1.0,
+                                base_memory=2000, memory_per_visit=100)
+
+
+def pack_jobs(jobs, cores_per_node, memory_per_node, cores_per_job=1):
+    """Assign jobs to as few nodes as possible, longest first.
+
+    Parameters
+    ----------
+    jobs : `list` of `Job`
+        The jobs to pack.
+    cores_per_node : `int`
+        Number of cores available on each node.
+    memory_per_node : `float`
+        Memory available on each node, in MB.
+    cores_per_job : `int`, optional
+        Number of cores each job uses.
+
+    Returns
+    -------
+    nodes : `list` of `list` of `Job`
+        The jobs to run on each node, longest-running node first.
+    """
+    nodes = []
+    used = []
+    for job in sorted(jobs, key=lambda job: job.minutes, reverse=True):
+        for i, (cores, memory) in enumerate(used):
+            if cores + cores_per_job <= cores_per_node and memory + job.memory <= memory_per_node:
+                nodes[i].append(job)
+                used[i] = (cores + cores_per_job, memory + job.memory)
+                break
+        else:
+            if job.memory > memory_per_node:
+                warnings.warn("Job for tract %s %s needs an estimated %.0f MB, more than a whole node"
+                              " has; giving it a node of its own." % (job.tract, job.filt, job.memory))
+            nodes.append([job])
+            used.append((cores_per_job, job.memory))
+    return nodes
+
+
+def node_minutes(node, margin=1.5, minimum=30):
+    """Return the walltime to request for a node, in whole minutes.
+
+    Parameters
+    ----------
+    node : `list` of `Job`
+        The jobs that will run concurrently on the node.
+    margin : `float`, optional
+        Safety factor to multiply the longest estimated runtime by.
+    minimum : `int`, optional
+        Never request less than this many minutes.
+    """
+    return max(minimum, int(math.ceil(margin*max(job.minutes for job in node))))
+
+
+def add_packing_arguments(parser, group=None):
+    """Add the options controlling job packing to an `argparse.ArgumentParser`.
+
+    ``--pack`` is added to ``group`` if given, e.g. a mutually exclusive group
+    of the ways to lay out the jobs.
+    """
+    if group is None:
+        group = parser
+    group.add_argument("--pack", action="store_true",
+                       help="Pack tract/filter jobs onto nodes by their estimated cost, instead of"
+                       " submitting one node per tract.")
+    parser.add_argument("--node-cores", type=int, default=24,
+                        help="Cores per node, when packing (default=%(default)s).")
+    parser.add_argument("--node-memory", type=float, default=128000,
+                        help="Memory per node in MB, when packing (default=%(default)s).")
+    parser.add_argument("--margin", type=float, default=1.5,
+                        help="Factor to multiply each node's estimated walltime by, when packing or"
+                        " predicting resources (default=%(default)s).")
+
+
+def packing_from_args(args, model=None):
+    """Return the `Packing` requested by the parsed arguments, or None if not packing.
+
+    Jobs are costed with ``model`` if given (e.g. a fit to past jobs, or
+    `VALIDATE_COST_MODEL`), and with the default, jointcal, `CostModel`
+    otherwise.
+    """
+    if not args.pack:
+        return None
+    return Packing(model if model is not None else CostModel(), args.node_cores, args.node_memory,
+                   args.margin)
@@ -0,0 +1,151 @@
+"""
+Write and submit slurm batch scripts, including job arrays that run one
+tract/filter per array task.
+
+A job array is described by a task table: a tab-separated text file with one
+``field, tract, filter, visits`` row per array task, in array-index order. The
+array script reads its own row with `TASK_READER`, so hundreds of tract/filter
+jobs need only one script and one ``sbatch`` call.
+"""
+import math
+import re
+import shlex
+import subprocess
+
+__all__ = ["TASK_FIELDS", "TASK_READER", "array_range", "write_task_table", "read_task_table",
+           "memory_directive", "parse_elapsed", "parse_memory", "submit", "add_submit_arguments"]
+
+TASK_FIELDS = ("field", "tract", "filt", "visit")
+
+# Shell snippet that sets $field, $tract, $filt and $visit from this array task's row of {table}.
+TASK_READER = ("IFS=$'\\t' read -r field tract filt visit"
+               " < <(sed -n \"$((SLURM_ARRAY_TASK_ID + 1))p\" {table})")
+
+
+def array_range(ntasks, throttle=None):
+    """Return the ``--array`` specification for ``ntasks`` tasks.
+
+    Parameters
+    ----------
+    ntasks : `int`
+        Number of array tasks; they are numbered from zero.
+    throttle : `int`, optional
+        Maximum number of array tasks slurm may run at once (the ``%N``
+        suffix); by default there is no limit.
+    """
+    spec = "0-{}".format(ntasks - 1)
+    if throttle is not None:
+        spec += "%{}".format(throttle)
+    return spec
+
+
+def memory_directive(memory):
+    """Return an ``#SBATCH --mem`` line (preceded by a newline) requesting
+    ``memory`` MB, or an empty string if ``memory`` is None.
+
+    Appended to a script's ``--time`` line, so that scripts without a memory
+    estimate keep the partition's default.
+    """
+    if memory is None:
+        return ""
+    return "\n#SBATCH --mem={}M".format(int(math.ceil(memory)))
+
+
+def parse_elapsed(text):
+    """Return the seconds in a slurm duration such as ``1-02:03:04``,
+    ``02:03:04`` or ``03:04.567``, or None if it is empty or invalid."""
+    days, _, clock = text.strip().rpartition('-')
+    try:
+        seconds = 0.0
+        for part in clock.split(':'):
+            seconds = 60*seconds + float(part)
+        return seconds + 86400*int(days or 0)
+    except ValueError:
+        return None
+
+
+def parse_memory(text):
+    """Return the MB in a slurm memory size such as ``123456K`` or ``1.5G``
+    (bytes if it has no suffix), or None if it is empty or invalid."""
+    text = text.strip()
+    scale = {'K': 1/1024, 'M': 1, 'G': 1024, 'T': 1024**2}
+    try:
+        if text and text[-1].upper() in scale:
+            return float(text[:-1])*scale[text[-1].upper()]
+        return float(text)/1024**2
+    except ValueError:
+        return None
+
+
+def write_task_table(filename, tasks):
+    """Write a task table, one row per array task.
+
+    Parameters
+    ----------
+    filename : `str`
+        File to write the table to.
+    tasks : `list` of `tuple`
+        The ``(field, tract, filter, visits)`` of each task, in array order;
+        ``visits`` is a `^`-separated dataId string.
+    """
+    with open(filename, 'w') as outfile:
+        for task in tasks:
+            outfile.write('\t'.join(str(value) for value in task) + '\n')
+
+
+def read_task_table(filename):
+    """Return the ``(field, tract, filter, visits)`` rows of a task table, as strings."""
+    with open(filename) as infile:
+        return [tuple(line.rstrip('\n').split('\t')) for line in infile]
+
+
+def submit(filename, logfile, sbatch="sbatch", options=()):
+    """Submit a script with sbatch, writing sbatch's output to ``logfile``.
+
+    Parameters
+    ----------
+    filename : `str`
+        The slurm script to submit.
+    logfile : `str`
+        File to write sbatch's stdout and stderr to.
+    sbatch : `str`, optional
+        The sbatch command to run; may include arguments, and may be a
+        stand-in such as ``fakeSbatch.py`` for testing.
+    options : `list` of `str`, optional
+        Extra options to pass to sbatch before the script name.
+
+    Returns
+    -------
+    jobid : `str` or None
+        The id of the submitted job, if sbatch reported it.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        Raised if sbatch fails.
+    """
+    cmd = shlex.split(sbatch) + list(options) + [filename]
+    with open(logfile, 'w') as outlog:
+        subprocess.check_call(cmd, stdout=outlog, stderr=subprocess.STDOUT)
+    print('Launched job:', ' '.join(cmd))
+    with open(logfile) as outlog:
+        match = re.search(r"Submitted batch job (\d+)", outlog.read())
+    return match.group(1) if match else None
+
+
+def add_submit_arguments(parser, group=None):
+    """Add the options controlling slurm submission to an `argparse.ArgumentParser`.
+
+    ``--array`` is added to ``group`` if given, e.g. a mutually exclusive
+    group of the ways to lay out the jobs.
+    """
+    if group is None:
+        group = parser
+    group.add_argument("--array", action="store_true",
+                       help="Write a single job-array script and task table covering every tract/filter,"
+                       " instead of one script per tract.")
+    parser.add_argument("--throttle", type=int, default=None,
+                        help="Maximum number of array tasks to run at once (default: no limit).")
+    parser.add_argument("--sbatch", default="sbatch",
+                        help="Command to submit scripts with, e.g. fakeSbatch.py for testing"
+                        " (default=%(default)s).")
@@ -0,0 +1,105 @@
+"""
+Write synthetic reportPerformance-style .rst files, for benchmarking and
+trying out the summary scripts at sizes the real reruns do not reach.
+
+Each file is laid out exactly as reportPerformance.py writes it: an rst
+simple table of every metric in every filter, right-aligned in columns
+separated by single spaces, with ``--`` for values that were not measured and
+``**`` for values that could not be computed. Values are drawn per tract and
+then scaled per source, so that the sources differ the way real calibrations
+do (single-frame worst, jointcal and meas_mosaic similar).
+"""
+import os
+
+import numpy as np
+
+__all__ = ["METRICS", "FILTERS", "HEADER", "report_text", "write_reports"]
+
+# (name, unit, operator, design, FY17 target, typical value) of each metric.
+METRICS = (("AM1", "marcsec", "<=", 10.0, 15.0, 8.0),
+           ("AF1", "%", "<=", 20.0, 20.0, 10.0),
+           ("AM2", "marcsec", "<=", 10.0, 15.0, 7.0),
+           ("AF2", "%", "<=", 20.0, 20.0, 9.0),
+           ("PA1", "mmag", "<=", 5.0, 8.0, 12.0),
+           ("PF1", "%", "<=", 10.0, 20.0, 4.0))
+FILTERS = ("HSC-G", "HSC-R", "HSC-I", "HSC-Z", "HSC-Y")
+HEADER = ("Metric", "Filter", "Value", "Unit", "Operator", "SRD Requirement: design",
+          "Release Target: FY17", "Comments")
+
+# How much worse (or better) each source's metrics are than the tract's baseline.
+_SOURCE_SCALE = {"single": 1.6, "mosaic": 1.0, "jointcal": 0.95}
+
+
+def report_text(rows):
+    """Return the rst simple table reportPerformance would write for these rows.
+
+    Parameters
+    ----------
+    rows : `list` of `tuple` of `str`
+        One tuple per metric and filter, with a value for each of `HEADER`.
+    """
+    widths = [max(len(name), *(len(row[i]) for row in rows)) for i, name in enumerate(HEADER)]
+    border = ' '.join('=' * width for width in widths)
+    lines = [border, ' '.join(name.rjust(width) for name, width in zip(HEADER, widths)), border]
+    lines.extend(' '.join(value.rjust(width) for value, width in zip(row, widths)) for row in rows)
+    lines.append(border)
+    return '\n'.join(lines) + '\n'
+
+
+def _rows(values, missing, filters):
+    """Return the table rows for one tract and source."""
+    rows = []
+    for i, filt in enumerate(filters):
+        for j, (name, unit, operator, design, target, _) in enumerate(METRICS):
+            value = missing[i, j] or "%.2f" % values[i, j]
+            rows.append((name, filt, value, unit, operator, "%.1f" % design, "%.1f" % target, ""))
+    return rows
+
+
+def write_reports(outdir, ntracts, sources, pattern="{tract}-{source}.rst", filters=FILTERS,
+                  missing_fraction=0.02, first_tract=9000, seed=0):
+    """Write one synthetic report per tract and source.
+
+    Parameters
+    ----------
+    outdir : `str`
+        Directory to write to; ``pattern`` may add subdirectories.
+    ntracts : `int`
+        Number of tracts to write.
+    sources : `list` of `str`
+        The sources, e.g. ``single``, ``mosaic``, ``jointcal``, or rerun
+        names. Sources not in ``single/mosaic/jointcal`` are scaled
+        alternately better and worse than the baseline.
+    pattern : `str`, optional
+        Filename of each report relative to ``outdir``, formatted with
+        ``tract`` and ``source``.
+    filters : `list` of `str`, optional
+        The filters in each report.
+    missing_fraction : `float`, optional
+        Fraction of values written as ``--`` or ``**``.
+    first_tract : `int`, optional
+        Number of the first tract; tracts are numbered consecutively.
+    seed : `int`, optional
+        Random seed, so that the same arguments always give the same files.
+
+    Returns
+    -------
+    filenames : `list` of `str`
+        The files written.
+    """
+    rng = np.random.RandomState(seed)
+    typical = np.array([metric[5] for metric in METRICS])
+    filenames = []
+    for tract in range(first_tract, first_tract + ntracts):
+        baseline = typical*rng.lognormal(0, 0.3, size=(len(filters), len(METRICS)))
+        for k, source in enumerate(sources):
+            scale = _SOURCE_SCALE.get(source, 1.05 if k % 2 else 0.95)
+            values = baseline*scale*rng.lognormal(0, 0.1, size=baseline.shape)
+            missing = np.where(rng.uniform(size=values.shape) < missing_fraction,
+                               rng.choice(["--", "**"], size=values.shape), "")
+            filename = os.path.join(outdir, pattern.format(tract=tract, source=source))
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(filename, 'w') as outfile:
+                outfile.write(report_text(_rows(values, missing, filters)))
+            filenames.append(filename)
+    return filenames
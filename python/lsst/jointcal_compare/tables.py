@@ -0,0 +1,199 @@
+"""
+Read the ReStructured Text tables written by validate_drp's reportPerformance.py.
+
+astropy is only imported by the functions that build tables (and
+`astropy.io.ascii` only for the ``astropy`` reader), so that the summary
+scripts can import this module and parse their arguments quickly.
+"""
+import concurrent.futures
+import glob
+import os.path
+import time
+
+from .cache import load_cached, save_cached
+from .rst import EXCLUDE_NAMES, MISSING_VALUES, read_rst
+from .verify_json import read_tract_dir
+
+__all__ = ["READERS", "read_tables", "read_sources", "read_one_table", "tract_from_filename",
+           "add_reader_arguments"]
+
+# Names of the available readers: astropy's generic .rst parser, our own
+# .rst parser, and the validate_drp JSON that the .rst files are made from.
+READERS = ("astropy", "fast", "json")
+
+
+def tract_from_filename(infile):
+    """Return the tract number encoded in a `<tract>-<source>.rst` filename or `<tract>` directory."""
+    return int(os.path.basename(infile).split('-')[0])
+
+
+def read_one_table(infile, name, reader="astropy"):
+    """Ingest one .rst file, renaming columns to prepare for joining.
+
+    Parameters
+    ----------
+    infile : `str`
+        Path to the .rst file to read, or to the validate_drp tract directory
+        for the ``json`` reader.
+    name : `str`
+        Metric name to read in; used to rename the ``Value`` column.
+    reader : `str`, optional
+        Which parser to use, one of `READERS`: ``astropy`` for
+        `astropy.io.ascii.read`, ``fast`` for `lsst.jointcal_compare.rst.read_rst`,
+        ``json`` for `lsst.jointcal_compare.verify_json.read_tract_dir`.
+
+    Returns
+    -------
+    table : `astropy.table.Table`
+        The table, with ``Design`` and ``Value_{name}`` columns.
+    """
+    if reader == "json":
+        return read_tract_dir(infile, name)
+    elif reader == "fast":
+        temp = read_rst(infile)
+    elif reader == "astropy":
+        import astropy.io.ascii
+        temp = astropy.io.ascii.read(infile, format='rst', exclude_names=EXCLUDE_NAMES,
+                                     fill_values=[(x, '0') for x in MISSING_VALUES])
+    else:
+        raise ValueError("Unknown reader %r; must be one of %s" % (reader, READERS))
+    temp.rename_column('SRD Requirement: design', 'Design')
+    temp.rename_column('Value', 'Value_{}'.format(name))
+    return temp
+
+
+def _run_inline(func, *args):
+    """Call ``func(*args)`` now, returning a completed Future holding the outcome."""
+    future = concurrent.futures.Future()
+    try:
+        future.set_result(func(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def read_tables(name, inglob, jobs=1, cache=False, verbose=False, reader="astropy"):
+    """Ingest the .rst files with astropy and return a dict of astropy.tables
+
+    Parameters
+    ----------
+    name : `str`
+        Metric name to read in.
+    inglob : `str`
+        glob pattern to use to search for files with (modified by `inglob.format(name)`);
+        for the ``json`` reader it should match the validate_drp tract directories.
+    jobs : `int`, optional
+        Number of worker processes to parse the files with; ``1`` reads them
+        serially in this process. The result is identical either way.
+    cache : `bool`, optional
+        Reuse tables cached by a previous run for files whose size and
+        modification time are unchanged, and cache the ones that had to be
+        parsed; see `lsst.jointcal_compare.cache`.
+    verbose : `bool`, optional
+        Print how many files were parsed or taken from the cache, and how
+        long that took.
+    reader : `str`, optional
+        Which reader to use; see `read_one_table`.
+
+    Returns
+    -------
+    tables : `dict` [`int`, `astropy.table.Table`]
+        The table for each tract, in the order the files were found.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if no files match, or if any file could not be read; the
+        message lists every file that failed and why.
+    """
+    files = glob.glob(inglob.format(name))
+    if files == []:
+        raise RuntimeError("No files found for glob: %s"%inglob.format(name))
+    start = time.perf_counter()
+
+    cached = {}
+    if cache:
+        for infile in files:
+            table = load_cached(infile, name)
+            if table is not None:
+                cached[infile] = table
+    toParse = [infile for infile in files if infile not in cached]
+
+    if jobs > 1 and len(toParse) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(read_one_table, infile, name, reader) for infile in toParse]
+            concurrent.futures.wait(futures)
+    else:
+        futures = [_run_inline(read_one_table, infile, name, reader) for infile in toParse]
+    parsed = dict(zip(toParse, futures))
+
+    tables = {}
+    failures = []
+    for infile in files:
+        if infile in cached:
+            tables[tract_from_filename(infile)] = cached[infile]
+            continue
+        error = parsed[infile].exception()
+        if error is not None:
+            failures.append("%s: %s: %s" % (infile, type(error).__name__, error))
+        else:
+            table = parsed[infile].result()
+            if cache:
+                save_cached(infile, name, table)
+            tables[tract_from_filename(infile)] = table
+    if failures:
+        raise RuntimeError("Failed to read %d of %d files for %s:\n%s" %
+                           (len(failures), len(files), name, '\n'.join(failures)))
+    if verbose:
+        print("Read %d %s tables (%d parsed, %d cached) in %.3fs" %
+              (len(files), name, len(toParse), len(cached), time.perf_counter() - start))
+    return tables
+
+
+def read_sources(names, inglob, jobs=1, cache=False, verbose=False, reader="astropy"):
+    """Read the tables of several sources with `read_tables`.
+
+    Parameters
+    ----------
+    names : `list` of `str`
+        The sources to read, e.g. ``single``, ``mosaic``, ``jointcal``.
+    inglob : `str`
+        glob pattern for each source's files, formatted with its name.
+    jobs, cache, verbose, reader
+        Passed to `read_tables`. With ``verbose``, also print the number of
+        rows each source has in each tract, which should be identical.
+
+    Returns
+    -------
+    sources : `dict` [`str`, `dict` [`int`, `astropy.table.Table`]]
+        The tables of each source, in the order of ``names``.
+    """
+    sources = {name: read_tables(name, inglob, jobs=jobs, cache=cache, verbose=verbose, reader=reader)
+               for name in names}
+    if verbose:
+        print('counts per tract (should be identical):', ', '.join(names))
+        for tract in sources[names[0]]:
+            print(tract, *(len(tables[tract]) if tract in tables else 0 for tables in sources.values()))
+    return sources
+
+
+def add_reader_arguments(parser, cache=True):
+    """Add the options controlling how tables are read to an `argparse.ArgumentParser`.
+
+    Parameters
+    ----------
+    parser : `argparse.ArgumentParser`
+        The parser to add ``--jobs``, ``--reader`` and ``--cache`` to.
+    cache : `bool`, optional
+        Add the ``--cache`` option.
+    """
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of processes to read the .rst files with (default=%(default)s).")
+    parser.add_argument("--reader", choices=READERS, default="astropy",
+                        help="Parser to read the .rst files with; 'fast' only handles the"
+                        " reportPerformance layout, 'json' reads the validate_drp output that the"
+                        " .rst files are made from instead (default=%(default)s).")
+    if cache:
+        parser.add_argument("-c", "--cache", action="store_true",
+                            help="Cache the parsed tables next to the .rst files, and only re-read"
+                            " files that have changed since the last run.")
@@ -0,0 +1,338 @@
+"""
+Follow submitted slurm jobs per tract/filter: their state, elapsed time and
+peak memory, reporting failures and stragglers as they happen.
+
+The generators record which tract/filter every submitted job, array task or
+named ``srun`` step runs in a job registry: a tab-separated text file with
+one ``jobid, task, step, tract, filter`` line per unit, with ``-`` for no
+array task or step. If a unit is recorded more than once, e.g. because it was
+resubmitted, the last line wins.
+
+`track` polls ``squeue`` and ``sacct`` with asyncio, asking about every job
+that still has unfinished units in one call per batch of job ids, rather than
+once per job, and runs the two commands concurrently. ``sacct`` is needed to
+see the state of each ``srun`` step while its job is still running, which is
+how one filter of a per-tract job can be seen to fail while the others run on.
+"""
+import asyncio
+import collections
+import shlex
+import statistics
+
+from .slurm import parse_elapsed, parse_memory
+
+__all__ = ["JOBS_NAME", "JobUnit", "UnitStatus", "TERMINAL_STATES", "FAILED_STATES", "record_jobs",
+           "load_jobs", "format_elapsed", "query", "JobTracker", "track"]
+
+JOBS_NAME = "jobs.txt"
+
+JobUnit = collections.namedtuple("JobUnit", ["jobid", "task", "step", "tract", "filt"])
+JobUnit.__doc__ = """One tract/filter submitted to slurm: the job id, and the array task
+index or ``srun`` step name that runs it within that job (None if it is the
+whole job)."""
+
+UnitStatus = collections.namedtuple("UnitStatus", ["state", "elapsed", "maxrss", "exitcode"])
+UnitStatus.__doc__ = """The slurm state of a `JobUnit`, its elapsed time in seconds, its
+peak resident memory in MB, and its ``ExitCode`` (None where not known yet)."""
+
+# States that a job or step does not leave; all but COMPLETED are failures.
+TERMINAL_STATES = frozenset(["COMPLETED", "FAILED", "CANCELLED", "TIMEOUT", "OUT_OF_MEMORY", "NODE_FAIL",
+                             "PREEMPTED", "BOOT_FAIL", "DEADLINE"])
+FAILED_STATES = TERMINAL_STATES - {"COMPLETED"}
+
+SQUEUE_FORMAT = "%i|%T|%M"
+SACCT_FIELDS = ("JobID", "JobName", "State", "Elapsed", "MaxRSS", "ExitCode")
+
+
+def record_jobs(path, units):
+    """Append submitted units to a job registry.
+
+    Parameters
+    ----------
+    path : `str`
+        The registry file.
+    units : `list` of `JobUnit`
+        The units of the jobs that were submitted.
+    """
+    with open(path, 'a') as outfile:
+        for unit in units:
+            outfile.write('\t'.join('-' if value is None else str(value) for value in unit) + '\n')
+
+
+def load_jobs(path):
+    """Return the units in a job registry, keeping the last submission of each.
+
+    Parameters
+    ----------
+    path : `str`
+        The registry file; a missing file has no units.
+
+    Returns
+    -------
+    units : `list` of `JobUnit`
+        The most recently submitted unit of each (tract, filter), in the
+        order they were submitted.
+    """
+    units = collections.OrderedDict()
+    try:
+        with open(path) as infile:
+            for line in infile:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) != 5:
+                    continue
+                jobid, task, step, tract, filt = (None if value == '-' else value for value in fields)
+                units.pop((tract, filt), None)
+                units[(tract, filt)] = JobUnit(jobid, task, step, tract, filt)
+    except FileNotFoundError:
+        pass
+    return list(units.values())
+
+
+def format_elapsed(seconds):
+    """Return ``seconds`` as ``[D-]HH:MM:SS``, or ``-`` if it is None."""
+    if seconds is None:
+        return "-"
+    days, seconds = divmod(int(seconds), 86400)
+    clock = "%02d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+    return "%d-%s" % (days, clock) if days else clock
+
+
+async def _run(cmd):
+    """Run a command, returning its exit status and output."""
+    process = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE)
+    stdout, stderr = await process.communicate()
+    return process.returncode, stdout.decode(), stderr.decode()
+
+
+async def query(jobids, squeue="squeue", sacct="sacct", batch_size=200):
+    """Ask squeue and sacct about some jobs, a batch of job ids per call.
+
+    Parameters
+    ----------
+    jobids : `list` of `str`
+        The jobs to ask about.
+    squeue, sacct : `str`, optional
+        The commands to run; may include arguments, and may be stand-ins such
+        as ``fakeSlurmQuery.py squeue`` for testing.
+    batch_size : `int`, optional
+        Maximum number of job ids to pass to one command.
+
+    Returns
+    -------
+    queue : `dict` [`str`, `tuple` [`str`, `int`]]
+        The (state, elapsed seconds) of each queued job or array task, by id.
+    accounting : `dict` [`str`, `dict` [`str`, `str`]]
+        The `SACCT_FIELDS` of every job, array task and step, by ``JobID``.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if sacct fails. squeue failing is not an error, since it does
+        so when none of the jobs are still queued.
+    """
+    calls = []
+    for start in range(0, len(jobids), batch_size):
+        ids = ','.join(jobids[start:start + batch_size])
+        calls.append(_run(shlex.split(squeue) + ['-h', '-r', '-o', SQUEUE_FORMAT, '-j', ids]))
+        calls.append(_run(shlex.split(sacct) + ['-n', '-P', '-o', ','.join(SACCT_FIELDS), '-j', ids]))
+    results = await asyncio.gather(*calls)
+
+    queue = {}
+    accounting = {}
+    for i, (returncode, stdout, stderr) in enumerate(results):
+        if i % 2 == 0:
+            if returncode != 0:
+                continue
+            for line in stdout.splitlines():
+                fields = line.strip().split('|')
+                if len(fields) == 3:
+                    queue[fields[0]] = (fields[1], parse_elapsed(fields[2]))
+        else:
+            if returncode != 0:
+                raise RuntimeError("%s failed with exit status %d: %s" % (sacct, returncode, stderr.strip()))
+            for line in stdout.splitlines():
+                fields = line.split('|')
+                if len(fields) == len(SACCT_FIELDS):
+                    accounting[fields[0]] = dict(zip(SACCT_FIELDS, fields))
+    return queue, accounting
+
+
+def _status(row, maxrss=None):
+    """Return the `UnitStatus` of one sacct row; the state is its first word,
+    e.g. ``CANCELLED`` for ``CANCELLED by 1234``."""
+    memory = parse_memory(row['MaxRSS'])
+    if maxrss is not None:
+        memory = maxrss if memory is None else max(memory, maxrss)
+    state = (row['State'].split() or ['UNKNOWN'])[0]
+    return UnitStatus(state, parse_elapsed(row['Elapsed']), memory, row['ExitCode'])
+
+
+class JobTracker:
+    """The latest status of every submitted unit.
+
+    Parameters
+    ----------
+    units : `list` of `JobUnit`
+        The units to follow, e.g. from `load_jobs`.
+    straggler_factor : `float`, optional
+        Report a unit that has been running for more than this many times the
+        median elapsed time of the units that have completed.
+    min_completed : `int`, optional
+        Only report stragglers once this many units have completed.
+    """
+    def __init__(self, units, straggler_factor=3.0, min_completed=3):
+        self.units = list(units)
+        self.straggler_factor = straggler_factor
+        self.min_completed = min_completed
+        self.status = {unit: UnitStatus("SUBMITTED", None, None, None) for unit in self.units}
+        self.stragglers = set()
+
+    def active_jobs(self):
+        """Return the ids of the jobs with units that have not finished."""
+        return sorted({unit.jobid for unit in self.units if self.status[unit].state not in TERMINAL_STATES},
+                      key=lambda jobid: (len(jobid), jobid))
+
+    def finished(self):
+        """Return whether every unit has finished."""
+        return all(status.state in TERMINAL_STATES for status in self.status.values())
+
+    def _resolve(self, unit, queue, accounting, steps, memory):
+        """Return the status of one unit from what squeue and sacct report."""
+        if unit.task is not None:
+            taskid = "{}_{}".format(unit.jobid, unit.task)
+            if taskid in accounting:
+                # The array task's memory is in its batch step.
+                return _status(accounting[taskid], memory.get(taskid))
+            if taskid in queue:
+                return UnitStatus(queue[taskid][0], queue[taskid][1], None, None)
+            return None
+        if unit.step is not None and (unit.jobid, unit.step) in steps:
+            return _status(steps[(unit.jobid, unit.step)])
+        if unit.jobid in accounting:
+            if unit.step is None:
+                return _status(accounting[unit.jobid], memory.get(unit.jobid))
+            # A step that has not started yet is as far along as its job;
+            # one that never started in a finished job takes the job's state.
+            return _status(accounting[unit.jobid])._replace(maxrss=None)
+        if unit.jobid in queue:
+            return UnitStatus(queue[unit.jobid][0], queue[unit.jobid][1], None, None)
+        return None
+
+    def update(self, queue, accounting):
+        """Update every unfinished unit from the output of `query`.
+
+        Returns
+        -------
+        events : `list` of `str`
+            A line for each unit that failed, and each newly found straggler.
+        """
+        steps = {}
+        memory = {}
+        for jobid, row in accounting.items():
+            job, _, step = jobid.partition('.')
+            if step:
+                steps[(job, row['JobName'])] = row
+                rss = parse_memory(row['MaxRSS'])
+                if rss is not None:
+                    memory[job] = max(memory.get(job, rss), rss)
+
+        events = []
+        for unit in self.units:
+            old = self.status[unit]
+            if old.state in TERMINAL_STATES:
+                continue
+            new = self._resolve(unit, queue, accounting, steps, memory)
+            if new is None:
+                continue
+            self.status[unit] = new
+            if new.state in FAILED_STATES:
+                events.append("FAILED %s: %s" % (self.label(unit), self.describe(new)))
+
+        done = [status.elapsed for status in self.status.values()
+                if status.state == "COMPLETED" and status.elapsed is not None]
+        if len(done) >= self.min_completed:
+            limit = self.straggler_factor*statistics.median(done)
+            for unit in self.units:
+                status = self.status[unit]
+                if unit in self.stragglers or status.state != "RUNNING" or status.elapsed is None:
+                    continue
+                if status.elapsed > limit:
+                    self.stragglers.add(unit)
+                    events.append("STRAGGLER %s: running for %s, more than %g times the median %s" %
+                                  (self.label(unit), format_elapsed(status.elapsed), self.straggler_factor,
+                                   format_elapsed(statistics.median(done))))
+        return events
+
+    @staticmethod
+    def label(unit):
+        """Return a short description of a unit, e.g. ``9813 HSC-I (job 1234_5)``."""
+        if unit.task is not None:
+            where = "job {}_{}".format(unit.jobid, unit.task)
+        elif unit.step is not None:
+            where = "job {} step {}".format(unit.jobid, unit.step)
+        else:
+            where = "job {}".format(unit.jobid)
+        return "{} {} ({})".format(unit.tract, unit.filt, where)
+
+    @staticmethod
+    def describe(status):
+        """Return a status's state, elapsed time, memory and exit code as text."""
+        text = "%s after %s" % (status.state, format_elapsed(status.elapsed))
+        if status.maxrss is not None:
+            text += ", MaxRSS %.0f MB" % status.maxrss
+        if status.exitcode is not None:
+            text += ", exit code %s" % status.exitcode
+        return text
+
+    def counts(self):
+        """Return the number of units in each state, as text."""
+        counts = collections.Counter(status.state for status in self.status.values())
+        return ', '.join("%d %s" % (count, state) for state, count in sorted(counts.items()))
+
+    def table(self):
+        """Return one line per unit: tract, filter, job, state, elapsed, MaxRSS."""
+        lines = ["%-8s %-8s %-34s %-14s %12s %10s" % ("tract", "filter", "job", "state", "elapsed", "MaxRSS")]
+        for unit in self.units:
+            status = self.status[unit]
+            job = unit.jobid + ("_" + unit.task if unit.task is not None else "")
+            if unit.step is not None:
+                job += " " + unit.step
+            maxrss = "-" if status.maxrss is None else "%.0fM" % status.maxrss
+            lines.append("%-8s %-8s %-34s %-14s %12s %10s" % (unit.tract, unit.filt, job, status.state,
+                                                              format_elapsed(status.elapsed), maxrss))
+        return lines
+
+
+async def track(tracker, squeue="squeue", sacct="sacct", interval=60, batch_size=200, callback=None,
+                once=False):
+    """Poll slurm until every unit of a `JobTracker` has finished.
+
+    Parameters
+    ----------
+    tracker : `JobTracker`
+        The units to follow; updated in place.
+    squeue, sacct, batch_size
+        Passed to `query`.
+    interval : `float`, optional
+        Seconds between polls.
+    callback : callable, optional
+        Called as ``callback(tracker, events)`` after each poll, with the
+        events returned by `JobTracker.update`.
+    once : `bool`, optional
+        Poll only once.
+    """
+    while not tracker.finished():
+        try:
+            queue, accounting = await query(tracker.active_jobs(), squeue=squeue, sacct=sacct,
+                                            batch_size=batch_size)
+        except (OSError, RuntimeError) as e:
+            # e.g. slurmdbd not answering; try again at the next poll.
+            events = ["Could not poll slurm, will retry: %s" % e]
+        else:
+            events = tracker.update(queue, accounting)
+        if callback is not None:
+            callback(tracker, events)
+        if once:
+            return
+        await asyncio.sleep(interval)
@@ -0,0 +1,140 @@
+"""
+Read metric values directly from validate_drp's lsst.verify Job JSON output,
+skipping the reportPerformance.py rendering to rst and parsing it back.
+
+validate_drp writes one Job file per filter into ``validate-{source}/<tract>/``.
+Each tract directory is read into one table with the same columns that
+`lsst.jointcal_compare.tables.read_one_table` gives for that tract's .rst file.
+Values are read at full precision; astropy writes the .rst values with
+``repr``, which round-trips exactly, so the design and source exceedances are
+the same whichever is read.
+"""
+import glob
+import json
+import os.path
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+__all__ = ["load_job", "job_rows", "read_tract_dir"]
+
+
+def load_job(path):
+    """Load one Job JSON file, with orjson if it is available.
+
+    orjson rejects the bare ``NaN`` that Python's json module writes for
+    unmeasured values, so such files fall back to the standard parser.
+    """
+    with open(path, 'rb') as infile:
+        text = infile.read()
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+def _matches(query, meta):
+    """Return True if the job metadata satisfies a specification's metadata_query."""
+    for key, value in query.items():
+        if isinstance(value, list):
+            if meta.get(key) not in value:
+                return False
+        elif meta.get(key) != value:
+            return False
+    return True
+
+
+def _specs(job, level):
+    """Return the threshold of the ``level`` specification for each metric that applies to ``job``."""
+    thresholds = {}
+    for spec in job.get('specs', []):
+        if 'threshold' not in spec:
+            continue
+        _, metric, name = spec['name'].split('.', 2)
+        if name != level and not name.startswith(level + '_'):
+            continue
+        if _matches(spec.get('metadata_query') or {}, job.get('meta', {})):
+            thresholds[metric] = spec['threshold']
+    return thresholds
+
+
+def job_rows(job, level='design'):
+    """Return the (Metric, Filter, Value, Unit, Operator, Design) rows of one Job.
+
+    Only metrics with a ``level`` specification that applies to this job are
+    included, as in the reportPerformance table.
+
+    Parameters
+    ----------
+    job : `dict`
+        A deserialized lsst.verify Job.
+    level : `str`, optional
+        The SRD specification level to report the threshold of.
+
+    Returns
+    -------
+    rows : `list` of `tuple`
+        One row per measurement; Value is NaN if the metric was not measured.
+    """
+    filt = job['meta']['filter_name']
+    thresholds = _specs(job, level)
+    rows = []
+    for measurement in job.get('measurements', []):
+        metric = measurement['metric'].split('.', 1)[-1]
+        if metric not in thresholds:
+            continue
+        threshold = thresholds[metric]
+        value = measurement.get('value')
+        rows.append((metric, filt, np.nan if value is None else float(value),
+                     measurement.get('unit') or threshold.get('unit', ''),
+                     threshold['operator'], float(threshold['value'])))
+    return rows
+
+
+def read_tract_dir(tractdir, name, level='design'):
+    """Read every Job JSON file in a validate_drp tract directory into one table.
+
+    Parameters
+    ----------
+    tractdir : `str`
+        The ``validate-{source}/<tract>`` directory.
+    name : `str`
+        Metric name to read in; used to name the ``Value_{name}`` column.
+    level : `str`, optional
+        The SRD specification level to put in the ``Design`` column.
+
+    Returns
+    -------
+    table : `astropy.table.Table`
+        Metric, Filter, Value_{name}, Unit, Operator and Design columns;
+        unmeasured values are masked.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if the directory contains no JSON files.
+    """
+    import astropy.table
+
+    files = sorted(glob.glob(os.path.join(tractdir, '*.json')))
+    if files == []:
+        raise RuntimeError("No JSON files found in: %s" % tractdir)
+    rows = []
+    for path in files:
+        rows.extend(job_rows(load_job(path), level=level))
+    metric, filt, value, unit, operator, design = zip(*rows) if rows else ((),)*6
+    value = np.array(value, dtype=np.float64)
+    missing = np.isnan(value)
+    # Missing values are filled with 0, as the rst readers do for `--`.
+    return astropy.table.Table([np.array(metric, dtype=str), np.array(filt, dtype=str),
+                                astropy.table.MaskedColumn(np.where(missing, 0.0, value), mask=missing),
+                                np.array(unit, dtype=str), np.array(operator, dtype=str),
+                                np.array(design, dtype=np.float64)],
+                               names=('Metric', 'Filter', 'Value_{}'.format(name), 'Unit', 'Operator',
+                                      'Design'))
@@ -0,0 +1,180 @@
+"""
+Look up which visits overlap each tract, from the tract-visit overlap sqlite
+databases used by the slurm script generators.
+
+Each database has a ``calexp(tract, filter, visit)`` table. Rather than
+querying it once per (tract, filter), `load_visits` reads every pair in one
+grouped query, using an index on ``calexp(tract, filter, visit)``.
+
+Visit lists are written in the dataId range syntax (``a..b:step``) wherever
+the visits are evenly spaced, which keeps deep tracts' command lines short;
+a dataId that is still too long is written to an ``@file`` instead, which
+the task's argument parser reads as if it were on the command line.
+"""
+import collections
+import os
+import sqlite3
+import urllib.parse
+import warnings
+
+__all__ = ["INDEX_NAME", "MAX_ID_LENGTH", "ensure_index", "load_visits", "compress_visits", "find_visits",
+           "id_argument"]
+
+INDEX_NAME = "calexp_tract_filter_visit"
+
+# Visit lists longer than this (in characters) are passed in an @file.
+MAX_ID_LENGTH = 4096
+
+
+def ensure_index(conn):
+    """Create the (tract, filter, visit) index on calexp if it does not exist.
+
+    If the database is read-only, check for the index instead and warn if it
+    is missing, since queries will then have to scan the whole table. Any
+    other error is raised.
+
+    Parameters
+    ----------
+    conn : `sqlite3.Connection`
+        Connection to the overlaps database.
+
+    Returns
+    -------
+    indexed : `bool`
+        True if the index exists.
+    """
+    try:
+        with conn:
+            conn.execute("create index if not exists {} on calexp (tract, filter, visit)".format(INDEX_NAME))
+        return True
+    except sqlite3.OperationalError as e:
+        # Anything else, e.g. a locked database or a missing table, is a real error.
+        if "readonly" not in str(e):
+            raise
+        columns = [row[2] for row in conn.execute("pragma index_info({})".format(INDEX_NAME))]
+        if columns != ['tract', 'filter', 'visit']:
+            warnings.warn("Cannot create index {} on read-only calexp table; lookups will scan the"
+                          " whole table.".format(INDEX_NAME))
+            return False
+        return True
+
+
+def load_visits(path, tracts=None):
+    """Return the visits in each (tract, filter) of an overlaps database.
+
+    Parameters
+    ----------
+    path : `str`
+        Path to the overlaps sqlite3 database.
+    tracts : `list` of `int`, optional
+        Only load these tracts; by default load every tract.
+
+    Returns
+    -------
+    visits : `dict` [`tuple` [`int`, `str`], `list` of `int`]
+        The sorted, distinct visits for each (tract, filter).
+
+    Raises
+    ------
+    FileNotFoundError
+        Raised if there is no database at ``path``.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError("No overlaps database at: %s" % path)
+    # mode=rw never creates the file, and opens it read-only if it is write-protected.
+    conn = sqlite3.connect("file:{}?mode=rw".format(urllib.parse.quote(os.path.abspath(path))), uri=True)
+    try:
+        ensure_index(conn)
+        cmd = "select distinct tract, filter, visit from calexp"
+        params = ()
+        if tracts is not None:
+            tracts = list(tracts)
+            cmd += " where tract in ({})".format(','.join('?'*len(tracts)))
+            params = tracts
+        cmd += " order by tract, filter, visit"
+        visits = collections.defaultdict(list)
+        for tract, filt, visit in conn.execute(cmd, params):
+            visits[(tract, filt)].append(visit)
+    finally:
+        conn.close()
+    return dict(visits)
+
+
+def compress_visits(visits):
+    """Return a list of visits as a dataId string, using ``a..b:step`` ranges
+    (inclusive) for every run of three or more evenly spaced visits.
+
+    Parameters
+    ----------
+    visits : `list` of `int`
+        The visits; they are sorted and duplicates removed.
+
+    Returns
+    -------
+    dataId : `str`
+        The `^`-separated visits and ranges, e.g. ``100..120:2^131``.
+    """
+    visits = sorted(set(visits))
+    parts = []
+    i = 0
+    while i < len(visits):
+        j = i
+        if i + 1 < len(visits):
+            step = visits[i + 1] - visits[i]
+            while j + 1 < len(visits) and visits[j + 1] - visits[j] == step:
+                j += 1
+        if j - i >= 2:
+            parts.append("{}..{}".format(visits[i], visits[j]) + (":{}".format(step) if step != 1 else ""))
+            i = j + 1
+        else:
+            parts.append(str(visits[i]))
+            i += 1
+    return '^'.join(parts)
+
+
+def find_visits(visits, tract, filt):
+    """Return the visits in this tract and filter, as a compressed dataId string.
+
+    Parameters
+    ----------
+    visits : `dict` [`tuple` [`int`, `str`], `list` of `int`]
+        The visit lookup table from `load_visits`.
+    tract : `int`
+        Tract to find visits for.
+    filt : `str`
+        Filter to find visits for.
+    """
+    return compress_visits(visits.get((tract, filt), []))
+
+
+def id_argument(ccd, filt, tract, visit, filename, max_length=MAX_ID_LENGTH):
+    """Return the ``--id`` argument for one tract and filter.
+
+    Parameters
+    ----------
+    ccd : `str`
+        The ccd dataId string.
+    filt : `str`
+        The filter.
+    tract : `int`
+        The tract.
+    visit : `str`
+        The visit dataId string, from `find_visits`.
+    filename : `str`
+        File to write the ``--id`` argument to if ``visit`` is longer than
+        ``max_length``.
+    max_length : `int`, optional
+        Longest visit string to put on the command line.
+
+    Returns
+    -------
+    argument : `str`
+        Either the ``--id ...`` argument itself or ``@filename``.
+    """
+    argument = "--id ccd={} filter={} tract={} visit={}".format(ccd, filt, tract, visit)
+    if len(visit) <= max_length:
+        return argument
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'w') as outfile:
+        outfile.write(argument + '\n')
+    return '@' + filename
@@ -0,0 +1,293 @@
+"""
+A sqlite store of every metric measured in every rerun, so that reruns can be
+compared without re-reading their .rst files, and a metric's history across
+reruns can be looked up directly.
+
+Each row of the ``metrics`` table is one measurement: (metric, filter, rerun,
+source, tract) with its value, design requirement, unit and operator. The
+table's primary key starts with the metric and rerun, so that every
+measurement of one metric in one rerun is stored together. Reruns are added
+with `ingest`, which only reads the files that are new or have changed since
+they were last ingested, and replaces those tracts' rows.
+
+The ``summary`` table holds the number of tracts, mean, mean square, minimum
+and maximum of each metric and filter for every rerun and source. It is
+rebuilt for each rerun and source as they are ingested, so that
+`metric_history` is a lookup rather than a scan of the measurements.
+"""
+import collections
+import concurrent.futures
+import math
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from .cache import file_key
+from .tables import read_one_table, tract_from_filename
+
+__all__ = ["HistoryRow", "open_store", "store_table", "ingest", "reruns", "metric_history", "load_frame",
+           "add_store_arguments"]
+
+HistoryRow = collections.namedtuple("HistoryRow", ["rerun", "source", "filter", "ntracts", "mean", "std",
+                                                   "min", "max"])
+HistoryRow.__doc__ = """One metric's statistics over the tracts of one rerun,
+source and filter, from `metric_history`."""
+
+_SCHEMA = """
+create table if not exists metrics (
+    metric text, filter text, rerun text, source text, tract integer,
+    value real, design real, unit text, operator text,
+    primary key (metric, rerun, source, filter, tract)) without rowid;
+create index if not exists metrics_rerun_source_tract on metrics (rerun, source, tract);
+create table if not exists summary (
+    metric text, rerun text, source text, filter text,
+    ntracts integer, mean real, meansq real, min real, max real,
+    primary key (metric, rerun, source, filter)) without rowid;
+create table if not exists reruns (
+    rerun text primary key, added real);
+create table if not exists files (
+    rerun text, source text, path text, key text, tract integer,
+    primary key (rerun, source, path));
+"""
+
+
+def open_store(path):
+    """Open (creating if necessary) a metric store.
+
+    Parameters
+    ----------
+    path : `str`
+        The sqlite database file.
+
+    Returns
+    -------
+    conn : `sqlite3.Connection`
+        Connection to the database, with its tables and indexes created.
+    """
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def store_table(conn, rerun, source, tract, table, name):
+    """Replace the measurements of one rerun, source and tract.
+
+    Parameters
+    ----------
+    conn : `sqlite3.Connection`
+        The open store.
+    rerun, source : `str`
+        The rerun and calibration source the table was measured in.
+    tract : `int`
+        The tract the table was measured in.
+    table : `astropy.table.Table`
+        The table from `lsst.jointcal_compare.tables.read_one_table`.
+    name : `str`
+        The name the table was read as, i.e. of its ``Value_{name}`` column.
+    """
+    value = table['Value_{}'.format(name)]
+    values = np.ma.filled(value.astype(np.float64), np.nan) if np.ma.isMaskedArray(value) else value
+    unit = table['Unit']
+    units = np.ma.filled(unit.astype(object), None) if np.ma.isMaskedArray(unit) else unit
+    columns = zip(table['Metric'], table['Filter'], values, table['Design'], units, table['Operator'])
+    rows = [(str(metric), str(filt), rerun, source, tract, None if math.isnan(x) else float(x),
+             float(design), None if u is None else str(u), str(operator))
+            for metric, filt, x, design, u, operator in columns]
+    conn.execute("delete from metrics where rerun = ? and source = ? and tract = ?", (rerun, source, tract))
+    conn.executemany("insert into metrics values (?,?,?,?,?,?,?,?,?)", rows)
+
+
+def _summarize(conn, rerun, source):
+    """Rebuild the summary rows of one rerun and source."""
+    conn.execute("delete from summary where rerun = ? and source = ?", (rerun, source))
+    conn.execute("insert into summary select metric, rerun, source, filter, count(value), avg(value),"
+                 " avg(value*value), min(value), max(value) from metrics"
+                 " where rerun = ? and source = ? group by metric, filter", (rerun, source))
+
+
+def _read(path, source, reader):
+    """Read one file, returning its path along with the table."""
+    return path, read_one_table(path, source, reader)
+
+
+def ingest(dbpath, paths, rerun, source, reader="astropy", jobs=1, force=False):
+    """Read performance tables into the store, skipping files that have not
+    changed since they were last ingested.
+
+    Parameters
+    ----------
+    dbpath : `str`
+        The sqlite database to write to.
+    paths : `list` of `str`
+        The ``<tract>-<source>.rst`` files, or validate_drp tract directories
+        for the ``json`` reader, to ingest.
+    rerun : `str`
+        The rerun these files belong to, e.g. ``DM-15713``.
+    source : `str`
+        The calibration source they measure, e.g. ``jointcal``.
+    reader : `str`, optional
+        Which reader to use; see `lsst.jointcal_compare.tables.read_one_table`.
+    jobs : `int`, optional
+        Number of processes to read the files with.
+    force : `bool`, optional
+        Re-read every file, even if it is unchanged.
+
+    Returns
+    -------
+    nread : `int`
+        The number of files that were read.
+    """
+    conn = open_store(dbpath)
+    try:
+        known = dict(conn.execute("select path, key from files where rerun = ? and source = ?",
+                                  (rerun, source)))
+        todo = {}
+        for path in (os.path.abspath(path) for path in paths):
+            key = ' '.join(str(x) for x in file_key(path))
+            if force or known.get(path) != key:
+                todo[path] = key
+
+        def store(path, table):
+            tract = tract_from_filename(path)
+            store_table(conn, rerun, source, tract, table, source)
+            conn.execute("insert or replace into files values (?,?,?,?,?)",
+                         (rerun, source, path, todo[path], tract))
+
+        with conn:
+            conn.execute("insert or ignore into reruns values (?,?)", (rerun, time.time()))
+            if jobs > 1 and len(todo) > 1:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+                    # Write each result as it arrives; sqlite writes stay in this process.
+                    for path, table in executor.map(_read, todo, [source]*len(todo), [reader]*len(todo),
+                                                    chunksize=8):
+                        store(path, table)
+            else:
+                for path in todo:
+                    store(*_read(path, source, reader))
+            if todo:
+                _summarize(conn, rerun, source)
+    finally:
+        conn.close()
+    return len(todo)
+
+
+def reruns(dbpath):
+    """Return the reruns in the store, in the order they were first ingested."""
+    conn = open_store(dbpath)
+    try:
+        return [row[0] for row in conn.execute("select rerun from reruns order by added, rerun")]
+    finally:
+        conn.close()
+
+
+def metric_history(dbpath, metric, source=None, filt=None, last=None):
+    """Return a metric's statistics over tracts in each rerun.
+
+    Parameters
+    ----------
+    dbpath : `str`
+        The sqlite database to read.
+    metric : `str`
+        The metric, e.g. ``AM1``.
+    source : `str`, optional
+        Only return this calibration source.
+    filt : `str`, optional
+        Only return this filter.
+    last : `int`, optional
+        Only return the most recently ingested ``last`` reruns.
+
+    Returns
+    -------
+    history : `list` of `HistoryRow`
+        One row per rerun, source and filter, oldest rerun first.
+    """
+    query = ["select summary.rerun, source, filter, ntracts, mean, meansq, min, max from summary"
+             " join (select rerun, added from reruns order by added desc, rerun desc limit ?) as recent"
+             " using (rerun) where metric = ?"]
+    params = [-1 if last is None else last, metric]
+    if source is not None:
+        query.append("and source = ?")
+        params.append(source)
+    if filt is not None:
+        query.append("and filter = ?")
+        params.append(filt)
+    query.append("order by added, summary.rerun, source, filter")
+    conn = open_store(dbpath)
+    try:
+        rows = conn.execute(' '.join(query), params).fetchall()
+    finally:
+        conn.close()
+    history = []
+    for rerun, source, filt, ntracts, mean, meansq, low, high in rows:
+        std = math.sqrt(max(meansq - mean**2, 0.0)) if ntracts else None
+        history.append(HistoryRow(rerun, source, filt, ntracts, mean, std, low, high))
+    return history
+
+
+def load_frame(dbpath, names):
+    """Return measurements from the store as a long-format frame.
+
+    The result can be passed to `lsst.jointcal_compare.merge.merge_frame` in
+    place of the .rst files read with
+    `lsst.jointcal_compare.tables.read_sources`.
+
+    Parameters
+    ----------
+    dbpath : `str`
+        The sqlite database to read.
+    names : `dict` [`str`, `tuple` [`str`, `str`]]
+        The (rerun, source) to read for each name to give it in the frame,
+        e.g. ``{'mosaic': ('DM-11783', 'mosaic')}`` or
+        ``{'DM-15713': ('DM-15713', 'jointcal')}``.
+
+    Returns
+    -------
+    frame : `pandas.DataFrame`
+        The columns returned by `lsst.jointcal_compare.merge.long_frame`,
+        with each name's tracts in increasing order.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if there are no measurements for any of ``names``.
+    """
+    import pandas as pd
+
+    conn = open_store(dbpath)
+    try:
+        frames = []
+        for name, (rerun, source) in names.items():
+            frame = pd.read_sql_query("select tract, ? as source, metric as Metric, filter as Filter,"
+                                      " operator as Operator, design as Design, unit as Unit, value as Value"
+                                      " from metrics where rerun = ? and source = ? order by tract",
+                                      conn, params=(name, rerun, source))
+            if len(frame) == 0:
+                raise RuntimeError("No measurements of %s in rerun %s in %s" % (source, rerun, dbpath))
+            frames.append(frame)
+    finally:
+        conn.close()
+    frame = pd.concat(frames, ignore_index=True)
+    frame['tract'] = frame['tract'].astype(np.int64)
+    frame['Value'] = frame['Value'].astype(np.float64)
+    return frame
+
+
+def add_store_arguments(parser, rerun=False):
+    """Add the options to read tables from a metric store to an `argparse.ArgumentParser`.
+
+    Parameters
+    ----------
+    parser : `argparse.ArgumentParser`
+        The parser to add ``--store`` (and ``--rerun``) to.
+    rerun : `bool`, optional
+        Add the ``--rerun`` option, for scripts that compare the sources of
+        one rerun.
+    """
+    parser.add_argument("--store", metavar="DB",
+                        help="Read the measurements from this metric store, written by ingestMetrics.py,"
+                        " instead of the .rst files.")
+    if rerun:
+        parser.add_argument("--rerun",
+                            help="The rerun to read the sources from, with --store.")
@@ -0,0 +1,265 @@
+"""
+Keep the merged tables of a rerun up to date while its tracts are still being
+processed, re-reading only the files that are new or have changed.
+
+`TractWatcher` polls each source's files for changes to their size or
+modification time, listing each directory once per poll. The tracts
+whose files changed are re-read and merged on their own, and their rows
+replace the old ones in the merged frame, so the cost of an update depends
+on how many tracts changed, not on how many there are. `RunningRms` keeps the
+per-metric RMS that `lsst.jointcal_compare.analysis.source_exceedances`
+compares against up to date in the same way.
+"""
+import concurrent.futures
+import fnmatch
+import glob
+import math
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from .cache import file_key, load_cached, save_cached
+from .merge import merge_sources
+from .tables import _run_inline, read_one_table, tract_from_filename
+
+__all__ = ["TractWatcher", "RunningRms"]
+
+
+class TractWatcher:
+    """The merged tables of several sources, updated as their files change.
+
+    Each `update` leaves every tract's merged rows in ``df``, as the ``df``
+    returned by `lsst.jointcal_compare.merge.merge_sources` (with a
+    ``Value_{source}`` column for every one of ``names``, NaN where that
+    source has no files yet).
+
+    Parameters
+    ----------
+    names : `list` of `str`
+        The sources to read, e.g. ``single``, ``mosaic``, ``jointcal``.
+    inglob : `str`
+        glob pattern for each source's files, formatted with its name.
+    reader : `str`, optional
+        Which reader to use; see `lsst.jointcal_compare.tables.read_one_table`.
+    cache : `bool`, optional
+        Reuse and update the cached tables; see `lsst.jointcal_compare.cache`.
+    jobs : `int`, optional
+        Number of processes to read the files of one update with.
+    """
+    def __init__(self, names, inglob, reader="astropy", cache=False, jobs=1):
+        self.names = list(names)
+        self.inglob = inglob
+        self.reader = reader
+        self.cache = cache
+        self.jobs = jobs
+        self.keys = {}
+        self.tables = {name: {} for name in self.names}
+        self.columns = ['Metric', 'Filter', 'Value_{}'.format(self.names[0]), 'Unit', 'Operator', 'Design']
+        self.columns.extend('Value_{}'.format(name) for name in self.names[1:])
+        self.columns.append('tract')
+        self.df = self._merge(())
+
+        # List each directory once per scan, instead of globbing it for every
+        # source; patterns whose directory has wildcards in it are globbed.
+        self._patterns = {}
+        for name in self.names:
+            dirname, basename = os.path.split(inglob.format(name))
+            if glob.has_magic(dirname):
+                self._patterns.setdefault(None, []).append(name)
+            else:
+                pattern = re.compile(fnmatch.translate(basename))
+                self._patterns.setdefault(dirname or os.curdir, []).append((name, pattern))
+
+    def scan(self):
+        """Return the files that have appeared, changed or disappeared since
+        they were last read.
+
+        Returns
+        -------
+        changed : `dict` [`tuple` [`str`, `str`], `tuple`]
+            The current key of each new or changed (source, path).
+        removed : `list` of `tuple` [`str`, `str`]
+            The (source, path) of each file that no longer exists.
+        """
+        current = {}
+        for dirname, patterns in self._patterns.items():
+            if dirname is None:
+                continue
+            try:
+                entries = list(os.scandir(dirname))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                for name, pattern in patterns:
+                    if not pattern.match(entry.name):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            current[(name, entry.path)] = tuple(file_key(entry.path).tolist())
+                        else:
+                            stat = entry.stat()
+                            current[(name, entry.path)] = (stat.st_size, stat.st_mtime_ns)
+                    except FileNotFoundError:
+                        pass
+        for name in self._patterns.get(None, ()):
+            for path in glob.glob(self.inglob.format(name)):
+                try:
+                    current[(name, path)] = tuple(file_key(path).tolist())
+                except FileNotFoundError:
+                    continue
+        changed = {item: key for item, key in current.items() if self.keys.get(item) != key}
+        removed = [item for item in self.keys if item not in current]
+        return changed, removed
+
+    def _read(self, todo):
+        """Read each (source, path) in ``todo``, returning its table and the
+        exception reading it raised, if any."""
+        results = {}
+        if self.cache:
+            for name, path in todo:
+                table = load_cached(path, name)
+                if table is not None:
+                    results[(name, path)] = (table, None)
+        toParse = [item for item in todo if item not in results]
+        if self.jobs > 1 and len(toParse) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                futures = [executor.submit(read_one_table, path, name, self.reader) for name, path in toParse]
+                concurrent.futures.wait(futures)
+        else:
+            futures = [_run_inline(read_one_table, path, name, self.reader) for name, path in toParse]
+        for (name, path), future in zip(toParse, futures):
+            error = future.exception()
+            if error is None and self.cache:
+                save_cached(path, name, future.result())
+            results[(name, path)] = (None if error is not None else future.result(), error)
+        return results
+
+    def update(self):
+        """Read the files that have changed, and re-merge their tracts.
+
+        A file that cannot be read (e.g. because it is still being written)
+        is left out of this update, and tried again by the next one; its
+        tract keeps its previous table until then.
+
+        Returns
+        -------
+        tracts : `list` of `int`
+            The tracts whose rows changed, in increasing order.
+        part : `pandas.DataFrame`
+            The new rows of those tracts, as in ``df``.
+        failures : `list` of `str`
+            The files that could not be read, and why.
+        """
+        changed, removed = self.scan()
+        tracts = set()
+        for name, path in removed:
+            del self.keys[(name, path)]
+            tract = tract_from_filename(path)
+            self.tables[name].pop(tract, None)
+            tracts.add(tract)
+
+        failures = []
+        for (name, path), (table, error) in self._read(changed).items():
+            if error is not None:
+                failures.append("%s: %s: %s" % (path, type(error).__name__, error))
+                continue
+            tract = tract_from_filename(path)
+            self.tables[name][tract] = table
+            self.keys[(name, path)] = changed[(name, path)]
+            tracts.add(tract)
+
+        part = self._merge(tracts)
+        if len(self.df) == 0:
+            self.df = part
+        elif tracts:
+            self.df = pd.concat([self.df[~self.df['tract'].isin(tracts)], part])
+        return sorted(tracts), part, failures
+
+    def _merge(self, tracts):
+        """Return the merged rows of ``tracts``, with every source's column."""
+        sources = {}
+        for name in self.names:
+            known = self.tables[name]
+            tables = {tract: known[tract] for tract in sorted(tracts) if tract in known}
+            if tables:
+                sources[name] = tables
+        if not sources:
+            empty = pd.DataFrame({column: pd.Series(dtype=object) for column in self.columns})
+            return empty.set_index(pd.MultiIndex.from_arrays([empty.Metric, empty.Filter]))
+        _, df = merge_sources(sources)
+        for name in self.names:
+            if name not in sources:
+                df['Value_{}'.format(name)] = np.nan
+        return df[self.columns]
+
+    def merged(self):
+        """Return every tract's merged rows, as returned by
+        `lsst.jointcal_compare.merge.merge_sources`.
+
+        Returns
+        -------
+        data : `astropy.table.Table`
+            The merged table, in increasing tract order.
+        df : `pandas.DataFrame`
+            The same data, indexed on (Metric, Filter).
+        """
+        import astropy.table
+        df = self.df.sort_values('tract', kind='stable')
+        return astropy.table.Table.from_pandas(df.reset_index(drop=True)), df
+
+
+class RunningRms:
+    """The RMS of one source's value of each metric over every tract, kept
+    up to date one tract at a time.
+
+    This is the ``sigma`` that `lsst.jointcal_compare.analysis.source_exceedances`
+    computes from all of its rows, so that it can be passed the rows of only
+    the tracts that changed.
+
+    Parameters
+    ----------
+    reference : `str`
+        The source whose ``Value_{reference}`` column to take the RMS of.
+    metrics : `tuple` of `str`
+        The metrics to keep the RMS of.
+    exclude_tracts : `tuple` of `int`, optional
+        Tracts to leave out of the RMS.
+    """
+    def __init__(self, reference, metrics, exclude_tracts=()):
+        self.column = 'Value_{}'.format(reference)
+        self.metrics = metrics
+        self.exclude_tracts = exclude_tracts
+        self.tracts = {}
+        self.sums = {metric: 0.0 for metric in metrics}
+        self.counts = {metric: 0 for metric in metrics}
+
+    def update(self, tracts, part):
+        """Replace the contribution of ``tracts`` with their rows in ``part``.
+
+        Parameters
+        ----------
+        tracts : `list` of `int`
+            The tracts that changed, including any that now have no rows.
+        part : `pandas.DataFrame`
+            The new rows of those tracts, from `TractWatcher.update`.
+        """
+        for tract in tracts:
+            for metric, (total, count) in self.tracts.pop(tract, {}).items():
+                self.sums[metric] -= total
+                self.counts[metric] -= count
+        rows = part[part['Metric'].isin(self.metrics) & ~part['tract'].isin(self.exclude_tracts)]
+        squares = pd.DataFrame({'tract': rows['tract'].to_numpy(), 'Metric': rows['Metric'].to_numpy(),
+                                'square': rows[self.column].to_numpy(dtype=np.float64)**2})
+        # sum() and count() skip NaN, i.e. measurements the reference does not have.
+        stats = squares.groupby(['tract', 'Metric'])['square'].agg(['sum', 'count'])
+        for (tract, metric), total, count in zip(stats.index, stats['sum'], stats['count']):
+            self.tracts.setdefault(tract, {})[metric] = (total, count)
+            self.sums[metric] += total
+            self.counts[metric] += count
+
+    def sigma(self):
+        """Return the RMS of each metric, NaN for those with no measurements."""
+        return {metric: math.sqrt(max(self.sums[metric], 0.0)/self.counts[metric]) if self.counts[metric]
+                else math.nan for metric in self.metrics}
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+"""
+Run jointcal, validate_drp, reportPerformance and the performance summary as
+one pipeline: each tract/filter's validation starts as soon as its jointcal
+fit finishes, each tract's report as soon as all of its filters are
+validated, and the summary once every tract is reported.
+
+The stages are either submitted as slurm jobs chained with
+--dependency=afterok, or run on this machine with --local.
+"""
+from __future__ import print_function
+
+import os
+import shlex
+
+try:
+    from lsst.utils import getPackageDir
+except ImportError:
+    getPackageDir = None
+from lsst.jointcal_compare.pipeline import Task, run_graph, submit_graph
+from lsst.jointcal_compare.runner import print_result, write_results
+from lsst.jointcal_compare.visits import find_visits, id_argument, load_visits
+
+base_slurm = """#!/bin/bash -l
+
+#SBATCH -p normal
+#SBATCH --ntasks=1
+#SBATCH --time={time}
+#SBATCH -J {name}
+#SBATCH --output={logfile}
+
+source /software/lsstsw/stack/loadLSST.bash
+{setup}
+
+{cmd}
+"""
+
+jointcal_cmd = ("{command} {datadir} --rerun={rerun} -C={config}"
+                " {dataid} --longlog --no-versions")
+
+validate_cmd = ("{command} {datadir} --output={output} -C={config}"
+                " {dataid} --longlog --no-versions")
+
+# The setup commands and walltime (minutes) of each stage's slurm jobs.
+stage_setup = {'jointcal': "setup -r /project/parejkoj/stack/jointcal/\nsetup -k obs_subaru",
+               'validate': "setup validate_drp\nsetup obs_subaru",
+               'report': "setup validate_drp",
+               'summarize': "setup -k -r {pkgdir}"}
+stage_time = {'jointcal': 1440, 'validate': 1440, 'report': 60, 'summarize': 60}
+
+# The program to run for each stage; override them to test with stubs.
+commands = {'jointcal': 'jointcal.py',
+            'validate': 'matchedVisitMetrics.py',
+            'report': 'reportPerformance.py',
+            'summarize': 'summarizePerformanceRst.py'}
+
+# Without the stack set up (e.g. to run --local with stub commands), use this checkout.
+pkgdir = (getPackageDir('jointcal_compare') if getPackageDir is not None
+          else os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+root = '/project/parejkoj/DM-11783'
+sqlitedir = os.path.join(root, 'tract-visit')
+datadir = '/datasets/hsc/repo'
+rerun_base = 'DM-13666/{field}:'+os.path.join('private/parejkoj/', '{rerun_name}', '{field}')
+validate_datadir = '/datasets/hsc/repo/rerun/private/parejkoj/{rerun_name}/{field}'
+validate_outdir = os.path.join(root, 'validate-jointcal')
+perfdir = os.path.join(root, 'performance')
+
+ccd = "0..8^10..103"
+sbatch = 'sbatch'
+
+
+def build_tasks(fields, filters, ccd, rerun_name):
+    """Return the pipeline tasks for every tract/filter of these fields.
+
+    Parameters
+    ----------
+    fields : `list` of `tuple`
+        The ``(field, tracts, visits)`` to process.
+    filters : `list` of `str`
+        The filters to process in every tract.
+    ccd : `str`
+        The ccd dataId string.
+    rerun_name : `str`
+        Ticket name of the rerun to write the jointcal output to.
+
+    Returns
+    -------
+    tasks : `list` of `lsst.jointcal_compare.pipeline.Task`
+        The jointcal and validate task of each tract/filter, the report task
+        of each tract, and the final summary task.
+    """
+    tasks = []
+    reports = []
+    for field, tracts, visits in fields:
+        rerun = rerun_base.format(field=field, rerun_name=rerun_name)
+        for tract in tracts:
+            validated = []
+            for filt in filters:
+                visit = find_visits(visits, tract, filt)
+                if visit == '':
+                    print('No visits in tract {} {}; skipping it.'.format(tract, filt))
+                    continue
+                fmtstr = dict(field=field, tract=tract, filt=filt)
+                # jointcal and validate share the @file, if the dataId needs one.
+                idfile = os.path.join(root, 'scripts', 'ids',
+                                      'pipeline-{field}_{tract}_{filt}.id'.format(**fmtstr))
+                fmtstr['dataid'] = id_argument(ccd, filt, tract, visit, idfile)
+                name = "jointcal-{field}_{tract}_{filt}".format(**fmtstr)
+                cmd = jointcal_cmd.format(command=commands['jointcal'], datadir=datadir, rerun=rerun,
+                                          config=os.path.join(pkgdir, 'config', 'jointcalConfig.py'),
+                                          **fmtstr)
+                tasks.append(Task(name, 'jointcal', shlex.split(cmd), ()))
+
+                validate = "validate-jointcal-{field}_{tract}_{filt}".format(**fmtstr)
+                cmd = validate_cmd.format(command=commands['validate'],
+                                          datadir=validate_datadir.format(rerun_name=rerun_name, field=field),
+                                          output=os.path.join(validate_outdir, str(tract)),
+                                          config=os.path.join(pkgdir, 'config', 'validate-jointcalConfig.py'),
+                                          **fmtstr)
+                tasks.append(Task(validate, 'validate', shlex.split(cmd), (name,)))
+                validated.append(validate)
+            if not validated:
+                continue
+
+            name = "reportPerformance-{field}_{tract}".format(field=field, tract=tract)
+            output = os.path.join(perfdir, '{}-jointcal.rst'.format(tract))
+            jsonfiles = shlex.quote(os.path.join(validate_outdir, str(tract))) + '/*.json'
+            cmd = '{} --output_file={} {}'.format(commands['report'], shlex.quote(output), jsonfiles)
+            tasks.append(Task(name, 'report', ['bash', '-c', cmd], tuple(validated)))
+            reports.append(name)
+
+    tasks.append(Task('summarize', 'summarize', shlex.split(commands['summarize']) + [perfdir],
+                      tuple(reports)))
+    return tasks
+
+
+def write_scripts(tasks):
+    """Write one slurm script per task.
+
+    Returns
+    -------
+    scripts : `dict` [`str`, `str`]
+        The script written for each named task.
+    sbatch_logs : `dict` [`str`, `str`]
+        The file to record each task's sbatch output in.
+    """
+    scripts = {}
+    sbatch_logs = {}
+    for task in tasks:
+        filename = os.path.join(root, 'scripts/{}.sl'.format(task.name))
+        logfile = os.path.join(root, 'logs/{}-%j.log'.format(task.name))
+        with open(filename, 'w') as outfile:
+            outfile.write(base_slurm.format(name=task.name, time=stage_time[task.stage], logfile=logfile,
+                                            setup=stage_setup[task.stage].format(pkgdir=pkgdir),
+                                            cmd=' '.join(shlex.quote(arg) for arg in task.args)))
+        scripts[task.name] = filename
+        sbatch_logs[task.name] = os.path.join(root, 'slurm-logs/{}.log'.format(task.name))
+    print('Generated {} scripts in {}'.format(len(scripts), os.path.join(root, 'scripts')))
+    return scripts, sbatch_logs
+
+
+def run_local(tasks, jobs=None):
+    """Run the pipeline on this machine, ``jobs`` tasks at a time.
+
+    Each task's output goes to ``logs/{name}-local.log``, and the exit
+    status and runtime of every task that ran are written to
+    ``logs/pipeline-local.txt``.
+
+    Returns
+    -------
+    nfailed : `int`
+        The number of tasks that failed or were skipped.
+    """
+    logfiles = {task.name: os.path.join(root, 'logs', '{}-local.log'.format(task.name)) for task in tasks}
+    os.makedirs(os.path.join(root, 'logs'), exist_ok=True)
+    jobs = jobs if jobs is not None else os.cpu_count()
+    print("Running %d tasks, %d at a time" % (len(tasks), jobs), flush=True)
+    results, skipped = run_graph(tasks, jobs, logfiles=logfiles, callback=print_result)
+    write_results(os.path.join(root, 'logs', 'pipeline-local.txt'), results, logfiles)
+
+    failed = [result.name for result in results if result.returncode != 0]
+    print("%d of %d tasks succeeded" % (len(results) - len(failed), len(tasks)))
+    if skipped:
+        print("Not run, because a task they depend on failed:", ' '.join(skipped))
+    return len(failed) + len(skipped)
+
+
+def process_all(rerun_name, tracts=None, call=False, local=False, jobs=None):
+    """Build the pipeline and either submit it to slurm or run it locally.
+
+    Parameters
+    ----------
+    rerun_name : `str`
+        Ticket name of the rerun to write the jointcal output to.
+    tracts : `list` of `int`, optional
+        Only process these tracts.
+    call : `bool`, optional
+        Submit the generated slurm scripts.
+    local : `bool`, optional
+        Run the pipeline on this machine instead of generating slurm scripts.
+    jobs : `int`, optional
+        Number of tasks to run at once with ``local``.
+
+    Returns
+    -------
+    nfailed : `int`
+        The number of tasks that failed or were skipped, when running locally.
+    """
+    filters = ['HSC-Y', 'HSC-Z', 'HSC-I', 'HSC-R', 'HSC-G']
+    fields = []
+    # deep data
+    fields.append(("UDEEP", [9813], 'overlaps_SSPUDEEP_w15.sqlite3'))
+    # wide data
+    fields.append(("WIDE", [8521, 8522, 8523, 8524, 8525, 9558, 9559, 9560, 9561, 9371, 9372,
+                            9373, 9374, 9693, 9694, 9695, 9697, 9698, 15831, 15832, 16009, 16010],
+                   'overlaps_SSPWIDE_w15.sqlite3'))
+
+    selected = []
+    for field, fieldTracts, sqlitefile in fields:
+        if tracts is not None:
+            fieldTracts = [tract for tract in fieldTracts if tract in tracts]
+        if fieldTracts:
+            visits = load_visits(os.path.join(sqlitedir, sqlitefile), tracts=fieldTracts)
+            selected.append((field, fieldTracts, visits))
+    tasks = build_tasks(selected, filters, ccd, rerun_name)
+
+    if local:
+        return run_local(tasks, jobs=jobs)
+    scripts, sbatch_logs = write_scripts(tasks)
+    if call:
+        jobids = submit_graph(tasks, scripts, sbatch_logs, sbatch=sbatch)
+        print('Submitted {} jobs; the summary is job {}'.format(len(jobids), jobids['summarize']))
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rerun", default="DM-15713",
+                        help="Ticket name of the rerun to write the jointcal output to.")
+    parser.add_argument("--tracts", type=int, nargs='+', default=None,
+                        help="Only process these tracts (default: all of them).")
+    parser.add_argument("-c", "--call", action="store_true",
+                        help="Submit the generated slurm scripts, chained by their dependencies.")
+    parser.add_argument("--sbatch", default=sbatch,
+                        help="Command to submit scripts with, e.g. fakeSbatch.py for testing"
+                        " (default=%(default)s).")
+    parser.add_argument("--local", action="store_true",
+                        help="Run the pipeline on this machine instead of generating slurm scripts.")
+    parser.add_argument("--root", default=root,
+                        help="Directory holding the tract-visit databases, and to write the scripts, logs"
+                        " and validate_drp and report outputs to (default=%(default)s).")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of tasks to run at once with --local (default: number of cores).")
+    for stage, command in commands.items():
+        parser.add_argument("--{}-command".format(stage), default=command,
+                            help="Program to run for the {} stage (default=%(default)s).".format(stage))
+    args = parser.parse_args()
+    sbatch = args.sbatch
+    root = args.root
+    sqlitedir = os.path.join(root, 'tract-visit')
+    validate_outdir = os.path.join(root, 'validate-jointcal')
+    perfdir = os.path.join(root, 'performance')
+    for stage in commands:
+        commands[stage] = getattr(args, "{}_command".format(stage))
+
+    import sys
+    nfailed = process_all(args.rerun, tracts=args.tracts, call=args.call, local=args.local, jobs=args.jobs)
+    # The number of failures could be a multiple of 256, which the shell would see as 0.
+    sys.exit(1 if nfailed else 0)
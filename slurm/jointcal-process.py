@@ -4,17 +4,28 @@ Generate slurm files for multiple jointcal jobs, parallelized across filters.
 """
 from __future__ import print_function
 
+import collections
 import os
-import sqlite3
-import subprocess
+import shlex
 
-import lsst.utils
+try:
+    from lsst.utils import getPackageDir
+except ImportError:
+    getPackageDir = None
+from lsst.jointcal_compare.manifest import MANIFEST_NAME, RECORD_CMD, completed_units, record
+from lsst.jointcal_compare.resources import add_resource_arguments, model_from_args
+from lsst.jointcal_compare.runner import run_all, print_result, write_results
+from lsst.jointcal_compare.scheduling import add_packing_arguments, node_minutes, pack_jobs, packing_from_args
+from lsst.jointcal_compare.slurm import (TASK_READER, add_submit_arguments, array_range, memory_directive,
+                                         submit, write_task_table)
+from lsst.jointcal_compare.tracker import JOBS_NAME, JobUnit, record_jobs
+from lsst.jointcal_compare.visits import find_visits, id_argument, load_visits
 
 base_slurm = """#!/bin/bash -l
 
 #SBATCH -p normal
 #SBATCH -N 1
-#SBATCH --time=1440
+#SBATCH --time={time}{mem}
 #SBATCH -J {name}
 
 source /software/lsstsw/stack/loadLSST.bash
@@ -33,81 +44,384 @@ done
 
 """
 
-base_cmd = ("srun --output=/project/parejkoj/DM-11783/logs/{name}_{filt}-%J.log"
-            " jointcal.py {datadir} --rerun={rerun} -C={config}"
-            " --id ccd={ccd} filter={filt} tract={tract} visit={visit}"
-            " --longlog --no-versions &\n"
-            "pids+=($!)  # Save PID of this background process")
+array_slurm = """#!/bin/bash -l
 
-basename = 'jointcal'
+#SBATCH -p normal
+#SBATCH --ntasks=1
+#SBATCH --time={time}{mem}
+#SBATCH -J {name}
+#SBATCH --array={array}
+#SBATCH --output={root}/slurm-logs/{name}_%A_%a.log
 
-# NOTE: change this to True to execute the generated scripts.
-call = True
+source /software/lsstsw/stack/loadLSST.bash
+setup -r /project/parejkoj/stack/jointcal/
+setup -k obs_subaru
 
-# NOTE: change this to the ticket you're working on.
-rerun_name = "DM-15713"
+{reader}
+name={basename}-${{field}}_${{tract}}
 
-pkgdir = lsst.utils.getPackageDir('jointcal_compare')
+{cmd}
+"""
+
+array_cmd = ("{command} {datadir} --rerun={rerun} -C={config}"
+             " --id ccd={ccd} filter={filt} tract={tract} visit=$visit"
+             " --longlog --no-versions"
+             " > {root}/logs/${{name}}_${{filt}}-${{SLURM_ARRAY_JOB_ID}}_${{SLURM_ARRAY_TASK_ID}}.log 2>&1")
+array_cmd = '; '.join([array_cmd, RECORD_CMD])
+
+task_cmd = ("{command} {datadir} --rerun={rerun} -C={config}"
+            " {dataid} --longlog --no-versions")
+
+# Each step is named for its tract/filter, so that trackJobs.py can follow it with sacct.
+srun_cmd = ("srun --job-name={name}_{filt}"
+            " --output={root}/logs/{name}_{filt}-%J.log " + task_cmd)
+# The subshell records the job in the manifest, and exits with the job's status for `wait`.
+base_cmd = ("(" + '; '.join([srun_cmd, RECORD_CMD]) + ") &\n"
+            "pids+=($!)  # Save PID of this background process")
+
+basename = 'jointcal'
+
+# Without the stack set up (e.g. to run --local with stub commands), use this checkout.
+pkgdir = (getPackageDir('jointcal_compare') if getPackageDir is not None
+          else os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 root = '/project/parejkoj/DM-11783'
 sqlitedir = os.path.join(root, 'tract-visit')
 datadir = '/datasets/hsc/repo'
 outdir = os.path.join(root, basename)
 config = os.path.join(pkgdir, 'config', basename+'Config.py')
-rerun = 'DM-13666/{field}:'+os.path.join('private/parejkoj/', rerun_name, '{field}')
+rerun_base = 'DM-13666/{field}:'+os.path.join('private/parejkoj/', '{rerun_name}', '{field}')
 
 ccd = "0..8^10..103"
+sbatch = 'sbatch'
+command = 'jointcal.py'
 
 
-def find_visits(cursor, tract, filt):
-    cmd = "select distinct visit from calexp where tract=:tract and filter=:filt"
-    cursor.execute(cmd, dict(tract=tract, filt=filt))
-    result = cursor.fetchall()
-    # NOTE: have to flatten the list, as it comes out as [(1,), (2,), (3,), ...]
-    return '^'.join(str(x[0]) for x in result)
+def job_format(field, tract, filt, ccd, visits, rerun):
+    """Return the values to fill in the command templates for one tract and filter."""
+    fmtstr = dict(output=os.path.join(outdir, str(tract)), field=field, tract=tract, ccd=ccd,
+                  rerun=rerun, datadir=datadir, config=config, filt=filt, command=command,
+                  visit=find_visits(visits, tract, filt), stage=basename,
+                  manifest=os.path.join(root, MANIFEST_NAME), root=root)
+    fmtstr['name'] = basename + "-{field}_{tract}".format(**fmtstr)
+    fmtstr['dataid'] = id_argument(ccd, filt, tract, fmtstr['visit'],
+                                   os.path.join(root, 'scripts', 'ids', '{name}_{filt}.id'.format(**fmtstr)))
+    return fmtstr
 
 
-def generate_one(field, tract, filters, ccd, cursor, rerun, call=True):
-    """Generate and execute a slurm script."""
+def job_command(field, tract, filt, ccd, visits, rerun):
+    """Return the srun command to process one tract and filter."""
+    return base_cmd.format(**job_format(field, tract, filt, ccd, visits, rerun))
 
-    output = os.path.join(outdir, str(tract))
-    fmtstr = dict(output=output, field=field, tract=tract, ccd=ccd, rerun=rerun,
-                  datadir=datadir, config=config, ntasks=len(filters))
-    name = basename + "-{field}_{tract}".format(**fmtstr)
-    fmtstr['name'] = name
 
-    cmd_list = []
-    for filt in filters:
-        visit = find_visits(cursor, tract, filt)
-        cmd_list.append(base_cmd.format(**fmtstr, filt=filt, visit=visit))
-    cmd = '\n'.join(cmd_list)
+def record_submission(jobid, units, array=False):
+    """Record the (field, tract, filter) that each srun step, or each array
+    task, of a submitted job runs in the job registry read by trackJobs.py."""
+    if jobid is None:
+        return
+    if array:
+        units = [JobUnit(jobid, i, None, tract, filt) for i, (field, tract, filt) in enumerate(units)]
+    else:
+        units = [JobUnit(jobid, None, "{}-{}_{}_{}".format(basename, field, tract, filt), tract, filt)
+                 for field, tract, filt in units]
+    record_jobs(os.path.join(root, 'slurm-logs', JOBS_NAME), units)
 
-    outlog = open(os.path.join(root, 'slurm-logs/{name}.log'.format(**fmtstr)), 'w')
 
-    filename = os.path.join(root, 'scripts/{name}.sl'.format(**fmtstr))
+def write_script(name, cmd_list, time=1440, memory=None, call=True, units=()):
+    """Write a slurm script that runs these commands concurrently, and optionally submit it.
+
+    The script requests ``time`` minutes, and ``memory`` MB if given (the
+    whole node's memory otherwise). ``units`` are the (field, tract, filter)
+    of each command, recorded with `record_submission` once it is submitted.
+    """
+    filename = os.path.join(root, 'scripts/{name}.sl'.format(name=name))
     with open(filename, 'w') as outfile:
-        outfile.write(base_slurm.format(cmd=cmd, **fmtstr))
+        outfile.write(base_slurm.format(name=name, cmd='\n'.join(cmd_list), time=time,
+                                        mem=memory_directive(memory)))
     print('Generated:', filename)
     if call:
-        cmd = 'sbatch %s'%filename
-        subprocess.check_call(cmd.split(), stdout=outlog, stderr=subprocess.STDOUT)
-        print('Launched job:', cmd)
-
-
-# deep data:
-tract = 9813
-field = "UDEEP"
-filters = ['HSC-Y', 'HSC-Z', 'HSC-I', 'HSC-R', 'HSC-G']
-conn = sqlite3.connect(os.path.join(sqlitedir, 'overlaps_SSPUDEEP_w15.sqlite3'))
-cursor = conn.cursor()
-generate_one(field, tract, filters, ccd, cursor, rerun.format(field=field), call=call)
-
-# wide data:
-tracts = [8521, 8522, 8523, 8524, 8525, 9558, 9559, 9560, 9561, 9371, 9372,
-          9373, 9374, 9693, 9694, 9695, 9697, 9698, 15831, 15832, 16009, 16010]
-field = "WIDE"
-filters = ['HSC-Y', 'HSC-Z', 'HSC-I', 'HSC-R', 'HSC-G']
-conn = sqlite3.connect(os.path.join(sqlitedir, 'overlaps_SSPWIDE_w15.sqlite3'))
-cursor = conn.cursor()
-for tract in tracts:
-    generate_one(field, tract, filters, ccd, cursor, rerun.format(field=field), call=call)
+        jobid = submit(filename, os.path.join(root, 'slurm-logs/{name}.log'.format(name=name)), sbatch=sbatch)
+        record_submission(jobid, units)
+
+
+def generate_one(field, tract, filters, ccd, visits, rerun, call=True, skip=(), model=None, margin=1.5):
+    """Generate and execute a slurm script, for the filters whose (tract, filter)
+    is not in ``skip``.
+
+    If ``model`` is given, request the walltime of the longest predicted job
+    (times ``margin``) and the summed predicted memory of all of them, instead
+    of a whole node for a day.
+    """
+    name = basename + "-{field}_{tract}".format(field=field, tract=tract)
+    filters = [filt for filt in filters if (tract, filt) not in skip]
+    cmd_list = [job_command(field, tract, filt, ccd, visits, rerun) for filt in filters]
+    if not cmd_list:
+        return
+    units = [(field, tract, filt) for filt in filters]
+    if model is None:
+        write_script(name, cmd_list, call=call, units=units)
+        return
+    jobs = [model.job(field, tract, filt, len(visits.get((tract, filt), []))) for filt in filters]
+    write_script(name, cmd_list, time=node_minutes(jobs, margin), memory=sum(job.memory for job in jobs),
+                 call=call, units=units)
+
+
+def generate_packed(field, tracts, filters, ccd, visits, rerun, packing, call=True, skip=(), memory=False):
+    """Generate and execute the fewest slurm scripts that fit every tract/filter
+    job not in ``skip``, packed onto nodes by their estimated cost.
+
+    If ``memory`` is set, each script also requests the summed estimated
+    memory of its jobs, rather than the whole node's.
+    """
+    jobs = []
+    for tract in tracts:
+        for filt in filters:
+            if (tract, filt) in skip:
+                continue
+            nvisits = len(visits.get((tract, filt), []))
+            if nvisits == 0:
+                print('No visits in tract {} {}; skipping it.'.format(tract, filt))
+                continue
+            jobs.append(packing.model.job(field, tract, filt, nvisits))
+    nodes = pack_jobs(jobs, packing.node_cores, packing.node_memory)
+    for i, node in enumerate(nodes):
+        name = basename + "-{field}_node{i:03d}".format(field=field, i=i)
+        cmd_list = [job_command(field, job.tract, job.filt, ccd, visits, rerun) for job in node]
+        node_memory = sum(job.memory for job in node) if memory else None
+        write_script(name, cmd_list, time=node_minutes(node, packing.margin), memory=node_memory, call=call,
+                     units=[(field, job.tract, job.filt) for job in node])
+    print('Packed {} {} jobs onto {} nodes.'.format(len(jobs), field, len(nodes)))
+
+
+def generate_array(fields, filters, ccd, rerun_name, throttle=None, call=True, skip=(), model=None,
+                   margin=1.5):
+    """Generate and execute one slurm job-array script covering every
+    tract/filter job, with one array task per row of a task table.
+
+    Every task of an array gets the same resources, so with a ``model`` the
+    script requests the walltime (times ``margin``) and memory of the most
+    expensive predicted job.
+
+    Parameters
+    ----------
+    fields : `list` of `tuple`
+        The ``(field, tracts, visits)`` to process.
+    filters : `list` of `str`
+        The filters to process in every tract.
+    ccd : `str`
+        The ccd dataId string.
+    rerun_name : `str`
+        Ticket name of the rerun to write to.
+    throttle : `int`, optional
+        Maximum number of array tasks to run at once.
+    call : `bool`, optional
+        Submit the script with sbatch.
+    skip : `set` of `tuple` [`int`, `str`], optional
+        The (tract, filter) jobs to leave out.
+    model : `lsst.jointcal_compare.resources.FittedCostModel`, optional
+        Predicts the walltime and memory of each job.
+    margin : `float`, optional
+        Factor to multiply the predicted walltime by.
+    """
+    tasks = []
+    jobs = []
+    for field, tracts, visits in fields:
+        for tract in tracts:
+            for filt in filters:
+                if (tract, filt) in skip:
+                    continue
+                visit = find_visits(visits, tract, filt)
+                if visit == '':
+                    print('No visits in tract {} {}; skipping it.'.format(tract, filt))
+                    continue
+                tasks.append((field, tract, filt, visit))
+                if model is not None:
+                    jobs.append(model.job(field, tract, filt, len(visits[(tract, filt)])))
+    if not tasks:
+        print('No tract/filter has any visits; not writing a job array.')
+        return
+
+    name = basename + "-array"
+    table = os.path.join(root, 'scripts/{name}.tasks'.format(name=name))
+    write_task_table(table, tasks)
+    # Each task expands $field itself, so one script serves every field's rerun.
+    cmd = array_cmd.format(datadir=datadir, rerun=rerun_base.format(field='${field}', rerun_name=rerun_name),
+                           config=config, ccd=ccd, root=root, command=command, tract='$tract', filt='$filt',
+                           stage=basename, manifest=os.path.join(root, MANIFEST_NAME))
+    time, memory = 1440, None
+    if jobs:
+        time = node_minutes(jobs, margin)
+        memory = max(job.memory for job in jobs)
+    filename = os.path.join(root, 'scripts/{name}.sl'.format(name=name))
+    with open(filename, 'w') as outfile:
+        outfile.write(array_slurm.format(name=name, time=time, mem=memory_directive(memory),
+                                         array=array_range(len(tasks), throttle),
+                                         root=root, reader=TASK_READER.format(table=table),
+                                         basename=basename, cmd=cmd))
+    print('Generated:', filename, 'with', len(tasks), 'tasks in', table)
+    if call:
+        jobid = submit(filename, os.path.join(root, 'slurm-logs/{name}.log'.format(name=name)), sbatch=sbatch)
+        record_submission(jobid, [(field, tract, filt) for field, tract, filt, _ in tasks], array=True)
+
+
+def run_local(fields, filters, ccd, rerun_name, jobs=None, skip=()):
+    """Run every tract/filter job not in ``skip`` on this machine, ``jobs`` at
+    a time.
+
+    Each job's output goes to ``logs/{name}_{filt}-local.log``, the exit
+    status and runtime of every job are written to
+    ``logs/{basename}-local.txt``, and each finished job is recorded in the
+    manifest.
+
+    Returns
+    -------
+    nfailed : `int`
+        The number of jobs that failed.
+    """
+    commands = {}
+    logfiles = {}
+    units = {}
+    for field, tracts, visits in fields:
+        rerun = rerun_base.format(field=field, rerun_name=rerun_name)
+        for tract in tracts:
+            for filt in filters:
+                if (tract, filt) in skip:
+                    continue
+                fmtstr = job_format(field, tract, filt, ccd, visits, rerun)
+                if fmtstr['visit'] == '':
+                    print('No visits in tract {} {}; skipping it.'.format(tract, filt))
+                    continue
+                key = '{name}_{filt}'.format(**fmtstr)
+                commands[key] = shlex.split(task_cmd.format(**fmtstr))
+                logfiles[key] = os.path.join(root, 'logs', '{}-local.log'.format(key))
+                units[key] = (rerun, tract, filt)
+
+    def finished(result):
+        print_result(result)
+        record(os.path.join(root, MANIFEST_NAME), basename, *units[result.name], result.returncode)
+
+    os.makedirs(os.path.join(root, 'logs'), exist_ok=True)
+    jobs = jobs if jobs is not None else os.cpu_count()
+    print("Running %d jobs, %d at a time" % (len(commands), jobs), flush=True)
+    results = run_all(commands, jobs, callback=finished, logfiles=logfiles)
+    write_results(os.path.join(root, 'logs', '{}-local.txt'.format(basename)), results, logfiles)
+    failed = [result.name for result in results if result.returncode != 0]
+    print("%d of %d jobs succeeded" % (len(results) - len(failed), len(results)))
+    return len(failed)
+
+
+def outputs_exist(field, rerun, visits):
+    """Return a function checking whether a tract/filter's jointcal output
+    exists: a wcs and a photoCalib for every one of its visits, in the
+    output rerun.
+    """
+    resultsdir = os.path.join(datadir, 'rerun', rerun.split(':')[-1], 'jointcal-results')
+
+    def check(tract, filt):
+        try:
+            names = os.listdir(os.path.join(resultsdir, '%04d' % tract))
+        except OSError:
+            return False
+        found = collections.defaultdict(set)
+        for name in names:
+            # e.g. jointcal_wcs-0001234-050.fits
+            dataset, _, dataId = name.partition('-')
+            found[dataset].add(dataId.split('-')[0])
+        expected = {'%07d' % visit for visit in visits.get((tract, filt), [])}
+        return expected <= found['jointcal_wcs'] and expected <= found['jointcal_photoCalib']
+    return check
+
+
+def process_all(rerun_name, call=False, packing=None, array=False, throttle=None, local=False, jobs=None,
+                force=False, model=None, margin=1.5):
+    """Generate slurm scripts and optionally execute them.
+
+    Tract/filter jobs that the manifest records as succeeded, and whose output
+    files all exist, are left out unless ``force`` is set.
+
+    If ``packing`` is given, pack the tract/filter jobs onto nodes according
+    to their estimated cost instead of using one node per tract. If ``array``
+    is set, write a single job-array script with one task per tract/filter.
+    If ``local`` is set, run the jobs on this machine instead, ``jobs`` at a
+    time, and return the number that failed.
+
+    If ``model`` (a `~lsst.jointcal_compare.resources.FittedCostModel`) is
+    given, each script requests the walltime (times ``margin``) and memory
+    predicted for its jobs; pass the same model in ``packing`` to pack by it.
+    """
+    filters = ['HSC-Y', 'HSC-Z', 'HSC-I', 'HSC-R', 'HSC-G']
+    # deep data
+    tracts = [9813]
+    deep = ("UDEEP", tracts, load_visits(os.path.join(sqlitedir, 'overlaps_SSPUDEEP_w15.sqlite3'),
+                                         tracts=tracts))
+    # wide data
+    tracts = [8521, 8522, 8523, 8524, 8525, 9558, 9559, 9560, 9561, 9371, 9372,
+              9373, 9374, 9693, 9694, 9695, 9697, 9698, 15831, 15832, 16009, 16010]
+    wide = ("WIDE", tracts, load_visits(os.path.join(sqlitedir, 'overlaps_SSPWIDE_w15.sqlite3'),
+                                        tracts=tracts))
+
+    skip = set()
+    if not force:
+        for field, tracts, visits in (deep, wide):
+            rerun = rerun_base.format(field=field, rerun_name=rerun_name)
+            units = [(tract, filt) for tract in tracts for filt in filters]
+            skip |= completed_units(os.path.join(root, MANIFEST_NAME), basename, rerun, units,
+                                    outputs_exist(field, rerun, visits))
+        if skip:
+            print('Skipping {} tract/filter jobs that already completed; use --force to rerun them.'.format(
+                  len(skip)))
+
+    if local:
+        return run_local([deep, wide], filters, ccd, rerun_name, jobs=jobs, skip=skip)
+    if array:
+        generate_array([deep, wide], filters, ccd, rerun_name, throttle=throttle, call=call, skip=skip,
+                       model=model, margin=margin)
+        return 0
+    for field, tracts, visits in (deep, wide):
+        rerun = rerun_base.format(field=field, rerun_name=rerun_name)
+        if packing is None:
+            for tract in tracts:
+                generate_one(field, tract, filters, ccd, visits, rerun, call=call, skip=skip, model=model,
+                             margin=margin)
+        else:
+            generate_packed(field, tracts, filters, ccd, visits, rerun, packing, call=call, skip=skip,
+                            memory=model is not None)
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rerun", default="DM-15713",
+                        help="Ticket name of the rerun to write the jointcal output to.")
+    parser.add_argument("-c", "--call", action="store_true",
+                        help="Call the generated slurm sbatch scripts to launch the jobs.")
+    layout = parser.add_mutually_exclusive_group()
+    add_packing_arguments(parser, layout)
+    add_resource_arguments(parser)
+    add_submit_arguments(parser, layout)
+    parser.add_argument("--local", action="store_true",
+                        help="Run the jobs on this machine instead of generating slurm scripts.")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of jobs to run at once with --local (default: number of cores).")
+    parser.add_argument("--command", default=command,
+                        help="Program to run for each job, e.g. a stub for testing (default=%(default)s).")
+    parser.add_argument("--root", default=root,
+                        help="Directory holding the tract-visit databases, and to write the scripts, logs"
+                        " and manifest to (default=%(default)s).")
+    parser.add_argument("--force", action="store_true",
+                        help="Rerun every job, including those the manifest records as completed.")
+    args = parser.parse_args()
+    sbatch = args.sbatch
+    command = args.command
+    root = args.root
+    sqlitedir = os.path.join(root, 'tract-visit')
+    outdir = os.path.join(root, basename)
+
+    model = model_from_args(args, config)
+    import sys
+    nfailed = process_all(args.rerun, call=args.call, packing=packing_from_args(args, model),
+                          array=args.array, throttle=args.throttle, local=args.local, jobs=args.jobs,
+                          force=args.force, model=model, margin=args.margin)
+    # The number of failures could be a multiple of 256, which the shell would see as 0.
+    sys.exit(1 if nfailed else 0)
@@ -0,0 +1,85 @@
+"""Tests of the bootstrap comparison of two calibration sources."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from lsst.jointcal_compare.analysis import bootstrap_significance
+
+
+def make_frame(reference, test, metrics=("AM1", "PA1"), filters=("HSC-I", "HSC-R")):
+    """Return a merged frame with one row per metric, filter and tract of the
+    (tract, group) value arrays."""
+    ntracts, ngroups = reference.shape
+    groups = [(metric, filt) for metric in metrics for filt in filters]
+    assert ngroups == len(groups)
+    return pd.DataFrame({'Metric': [metric for metric, _ in groups]*ntracts,
+                         'Filter': [filt for _, filt in groups]*ntracts,
+                         'tract': np.repeat(9000 + np.arange(ntracts), ngroups),
+                         'Value_mosaic': reference.ravel(),
+                         'Value_jointcal': test.ravel()})
+
+
+class BootstrapSignificanceTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.reference = rng.normal(10, 2, size=(20, 4))
+
+    def significance(self, test, **kwargs):
+        df = make_frame(self.reference, test)
+        return bootstrap_significance(df, ["AM1", "PA1"], "mosaic", "jointcal", nresample=2000, seed=3,
+                                      **kwargs)
+
+    def testIdentical(self):
+        """With no difference at all, every permutation is as extreme as the data."""
+        result = self.significance(self.reference.copy())
+        self.assertEqual(list(zip(result['Metric'], result['Filter'])),
+                         [("AM1", "HSC-I"), ("AM1", "HSC-R"), ("PA1", "HSC-I"), ("PA1", "HSC-R")])
+        np.testing.assert_array_equal(result['ntracts'], 20)
+        np.testing.assert_array_equal(result['difference'], 0)
+        np.testing.assert_array_equal(result['low'], 0)
+        np.testing.assert_array_equal(result['high'], 0)
+        np.testing.assert_allclose(result['p_value'], 1)
+
+    def testShift(self):
+        """A constant shift in every tract is as significant as 2000
+        permutations can show, with a zero-width interval."""
+        shift = np.array([0.5, -0.5, 1.0, 2.0])
+        result = self.significance(self.reference + shift)
+        np.testing.assert_allclose(result['difference'], shift)
+        np.testing.assert_allclose(result['low'], shift)
+        np.testing.assert_allclose(result['high'], shift)
+        np.testing.assert_allclose(result['reference'], self.reference.mean(axis=0))
+        np.testing.assert_allclose(result['p_value'], 1/2001)
+
+    def testNoise(self):
+        """A noisy shift is detected, and the same seed gives the same result."""
+        rng = np.random.RandomState(2)
+        test = self.reference + np.array([0, 0, 0, 1.0]) + rng.normal(0, 0.2, size=self.reference.shape)
+        result = self.significance(test)
+        self.assertLess(result['p_value'][3], 0.001)
+        self.assertTrue((result['low'] < result['difference']).all())
+        self.assertTrue((result['difference'] < result['high']).all())
+        pd.testing.assert_frame_equal(result, self.significance(test))
+
+    def testMissing(self):
+        """Tracts missing from either source are left out; a group with fewer
+        than two tracts gets NaN interval and p-value."""
+        test = self.reference + 1
+        test[3:, 0] = np.nan
+        test[:5, 1] = np.nan
+        result = self.significance(test, exclude_tracts=(9019,))
+        np.testing.assert_array_equal(result['ntracts'], [3, 14, 19, 19])
+        np.testing.assert_allclose(result['difference'], 1)
+        np.testing.assert_allclose(result['test'][1], self.reference[5:19, 1].mean() + 1)
+        self.assertFalse(result['p_value'].isna().any())
+
+        test[1:, 0] = np.nan
+        result = self.significance(test)
+        self.assertEqual(result['ntracts'][0], 1)
+        self.assertTrue(np.isnan(result['p_value'][0]))
+        self.assertTrue(np.isnan(result['low'][0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""Tests of the on-disk cache of parsed performance tables."""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from lsst.jointcal_compare.cache import load_cached, save_cached
+from lsst.jointcal_compare.tables import read_one_table
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+class CacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.rstfile = os.path.join(self.outdir, "9813-jointcal.rst")
+        shutil.copy(os.path.join(DATA_DIR, "9813-jointcal.rst"), self.rstfile)
+        self.tractdir = os.path.join(self.outdir, "9813")
+        shutil.copytree(os.path.join(DATA_DIR, "validate-jointcal", "9813"), self.tractdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def assertSameTable(self, expect, actual):
+        self.assertEqual(expect.colnames, actual.colnames)
+        for name in expect.colnames:
+            with self.subTest(column=name):
+                self.assertEqual(expect[name].dtype, actual[name].dtype)
+                self.assertEqual(type(expect[name]), type(actual[name]))
+                np.testing.assert_array_equal(np.ma.getmaskarray(expect[name]),
+                                              np.ma.getmaskarray(actual[name]))
+                np.testing.assert_array_equal(np.ma.getdata(expect[name]), np.ma.getdata(actual[name]))
+
+    def testRoundTrip(self):
+        """A cached table, with masked values, comes back identical."""
+        for infile, reader in ((self.rstfile, "astropy"), (self.rstfile, "fast"), (self.tractdir, "json")):
+            with self.subTest(reader=reader):
+                self.assertIsNone(load_cached(infile, reader))
+                table = read_one_table(infile, reader, reader=reader)
+                save_cached(infile, reader, table)
+                self.assertSameTable(table, load_cached(infile, reader))
+
+    def testTouchFile(self):
+        """Changing a file's modification time invalidates its entry."""
+        save_cached(self.rstfile, "jointcal", read_one_table(self.rstfile, "jointcal"))
+        self.assertIsNotNone(load_cached(self.rstfile, "jointcal"))
+        stat = os.stat(self.rstfile)
+        os.utime(self.rstfile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        self.assertIsNone(load_cached(self.rstfile, "jointcal"))
+
+    def testReplaceInDirectory(self):
+        """Replacing one file of a tract directory with one of the same size
+        but an older modification time than the newest file still
+        invalidates the directory's entry."""
+        older, newer = (os.path.join(self.tractdir, name) for name in ("HSC-I.json", "HSC-R.json"))
+        os.utime(older, ns=(10**18, 10**18))
+        os.utime(newer, ns=(2*10**18, 2*10**18))
+        save_cached(self.tractdir, "jointcal", read_one_table(self.tractdir, "jointcal", reader="json"))
+        self.assertIsNotNone(load_cached(self.tractdir, "jointcal"))
+
+        with open(older) as infile:
+            text = infile.read()
+        with open(older, 'w') as outfile:
+            outfile.write(text.replace('"HSC-I"', '"HSC-X"'))
+        os.utime(older, ns=(10**18 + 1, 10**18 + 1))
+        self.assertEqual(os.path.getsize(older), len(text))
+        self.assertIsNone(load_cached(self.tractdir, "jointcal"))
+
+        shutil.copy(newer, os.path.join(self.tractdir, "HSC-Z.json"))
+        os.utime(older, ns=(10**18, 10**18))
+        self.assertIsNone(load_cached(self.tractdir, "jointcal"))
+
+
+if __name__ == "__main__":
+    unittest.main()
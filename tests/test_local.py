@@ -0,0 +1,102 @@
+"""Tests of running the generated jointcal and validate_drp jobs on this
+machine with --local, with a stub command standing in for the stack."""
+import os
+import shlex
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from lsst.jointcal_compare.manifest import MANIFEST_NAME, load_manifest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Print its arguments, and fail for HSC-R.
+STUB = """
+import sys
+print(' '.join(sys.argv[1:]))
+sys.exit(3 if 'filter=HSC-R' in sys.argv else 0)
+"""
+
+
+class LocalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "tract-visit"))
+        calexps = {"UDEEP": [(9813, "HSC-I", 1228, 0), (9813, "HSC-I", 1230, 0), (9813, "HSC-R", 30, 0)],
+                   "WIDE": [(9697, "HSC-I", 1228, 0)]}
+        for field, rows in calexps.items():
+            path = os.path.join(self.root, "tract-visit", "overlaps_SSP%s_w15.sqlite3" % field)
+            conn = sqlite3.connect(path)
+            with conn:
+                conn.execute("create table calexp (tract int, filter text, visit int, ccd int)")
+                conn.executemany("insert into calexp values (?,?,?,?)", rows)
+            conn.close()
+        self.stub = os.path.join(self.root, "stub.py")
+        with open(self.stub, 'w') as outfile:
+            outfile.write(STUB)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run_local(self, script, *args):
+        """Run a generator with --local and the stub, returning the process."""
+        args = list(args) + ["--local", "-j", "2", "--root", self.root,
+                             "--command", "%s %s" % (shlex.quote(sys.executable), shlex.quote(self.stub))]
+        return subprocess.run([sys.executable, os.path.join(ROOT_DIR, "slurm", script)] + args,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
+                              env=dict(os.environ, PYTHONPATH=os.path.join(ROOT_DIR, "python")))
+
+    def read_results(self, name):
+        with open(os.path.join(self.root, "logs", name)) as infile:
+            self.assertEqual(infile.readline(), "# name returncode duration logfile\n")
+            return {fields[0]: (int(fields[1]), fields[3]) for fields in map(str.split, infile)}
+
+    def check(self, process, results, basename):
+        """Check that the one HSC-R job failed, and the two HSC-I jobs succeeded."""
+        self.assertEqual(process.returncode, 1, process.stdout)
+        self.assertIn("2 of 3 jobs succeeded", process.stdout)
+        expect = {"{}-UDEEP_9813_HSC-I".format(basename): 0, "{}-UDEEP_9813_HSC-R".format(basename): 3,
+                  "{}-WIDE_9697_HSC-I".format(basename): 0}
+        self.assertEqual({name: returncode for name, (returncode, _) in results.items()}, expect)
+        for name, (_, logfile) in results.items():
+            self.assertEqual(logfile, os.path.join(self.root, "logs", name + "-local.log"))
+            with open(logfile) as infile:
+                self.assertIn("tract=%s" % name.split('_')[1], infile.read())
+        manifest = load_manifest(os.path.join(self.root, MANIFEST_NAME))
+        self.assertEqual(sorted(rc for rc in manifest.values()), [0, 0, 3])
+
+    def testJointcal(self):
+        process = self.run_local("jointcal-process.py", "--rerun", "DM-test")
+        results = self.read_results("jointcal-local.txt")
+        self.check(process, results, "jointcal")
+        with open(results["jointcal-UDEEP_9813_HSC-I"][1]) as infile:
+            args = infile.read().split()
+        self.assertEqual(args[:2], ["/datasets/hsc/repo",
+                                    "--rerun=DM-13666/UDEEP:private/parejkoj/DM-test/UDEEP"])
+        self.assertIn("visit=1228^1230", args)
+        self.assertIn("-C=" + os.path.join(ROOT_DIR, "config", "jointcalConfig.py"), args)
+
+    def testValidate(self):
+        process = self.run_local("validate-calibration.py", "jointcal", "--jointcalRerun", "DM-test")
+        results = self.read_results("validate-jointcal-local.txt")
+        self.check(process, results, "validate-jointcal")
+        with open(results["validate-jointcal-WIDE_9697_HSC-I"][1]) as infile:
+            args = infile.read().split()
+        self.assertEqual(args[:2], ["/datasets/hsc/repo/rerun/private/parejkoj/DM-test/WIDE",
+                                    "--output=" + os.path.join(self.root, "validate-jointcal", "9697")])
+
+    def testAllSucceed(self):
+        process = self.run_local("jointcal-process.py", "--rerun", "DM-test", "--force")
+        self.assertEqual(process.returncode, 1)
+        with open(self.stub, 'w') as outfile:
+            outfile.write("import sys\nsys.exit(0)\n")
+        process = self.run_local("jointcal-process.py", "--rerun", "DM-test", "--force")
+        self.assertEqual(process.returncode, 0, process.stdout)
+        self.assertIn("3 of 3 jobs succeeded", process.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
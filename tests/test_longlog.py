@@ -0,0 +1,67 @@
+"""Tests of parsing jointcal --longlog output and ingesting it into sqlite."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from lsst.jointcal_compare.longlog import ingest, open_db, parse_filename, parse_log
+
+LOG = """INFO  2018-09-20T19:30:00.000Z jointcal ({})(jointcal.py:100)- Loading 12 ccdImages
+INFO  2018-09-20T19:31:00.000Z jointcal ({})(jointcal.py:200)- ====== Now processing astrometry...
+INFO  2018-09-20T19:31:30.000Z jointcal ({})(jointcal.py:210)- Initialized: Chi2/ndof : 250.0/100
+INFO  2018-09-20T19:32:00.000Z jointcal ({})(jointcal.py:220)- Fit iteration 1: Chi2/ndof : 120.5/90
+INFO  2018-09-20T19:33:00.000Z jointcal ({})(jointcal.py:300)- Updating WCS for visit: 1228, ccd: 50
+INFO  2018-09-20T19:33:30.000Z jointcal ({})(jointcal.py:310)- done
+"""
+
+
+class LongLogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.dbpath = os.path.join(self.outdir, "logs.sqlite3")
+        self.logs = []
+        for tract in (9697, 9813):
+            path = os.path.join(self.outdir, "jointcal-WIDE_%d_HSC-I-1234.log" % tract)
+            with open(path, 'w') as outfile:
+                outfile.write(LOG)
+            self.logs.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def reruns(self):
+        conn = open_db(self.dbpath)
+        try:
+            return [row[0] for row in conn.execute("select rerun from jobs order by tract")]
+        finally:
+            conn.close()
+
+    def testParse(self):
+        self.assertEqual(parse_filename(self.logs[1]), dict(stage="jointcal", field="WIDE", tract=9813,
+                                                            filt="HSC-I", jobid="1234"))
+        log = parse_log(self.logs[1])
+        self.assertEqual(log.status, "completed")
+        self.assertEqual(log.duration, 210)
+        self.assertEqual(log.counts, dict(ccdImages=12))
+        self.assertEqual([step[:3:2] for step in log.steps], [("load", 60), ("astrometry", 150)])
+        self.assertEqual(log.chi2, [("astrometry", 0, "Initialized", 250.0, 100),
+                                    ("astrometry", 1, "Fit iteration 1", 120.5, 90)])
+
+    def testIngestUnchanged(self):
+        self.assertEqual(ingest(self.dbpath, self.logs, "DM-15617"), 2)
+        self.assertEqual(ingest(self.dbpath, self.logs, "DM-15617"), 0)
+        with open(self.logs[0], 'a') as outfile:
+            outfile.write("FATAL 2018-09-20T19:34:00.000Z jointcal ({})(jointcal.py:400)- Failed\n")
+        self.assertEqual(ingest(self.dbpath, self.logs, "DM-15617"), 1)
+        self.assertEqual(ingest(self.dbpath, self.logs, "DM-15617", force=True), 2)
+
+    def testIngestOtherRerun(self):
+        """Ingesting the same files under another rerun relabels them."""
+        ingest(self.dbpath, self.logs, "DM-15617")
+        with self.assertWarnsRegex(UserWarning, "2 log files were ingested as rerun DM-15617"):
+            self.assertEqual(ingest(self.dbpath, self.logs, "DM-15713"), 2)
+        self.assertEqual(self.reruns(), ["DM-15713", "DM-15713"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""Tests of recording finished units of work, and of deciding which to skip."""
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from lsst.jointcal_compare.manifest import RECORD_CMD, completed_units, load_manifest, record
+
+
+class ManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.outdir, "manifest.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def testLastLineWins(self):
+        record(self.path, "jointcal", "DM-1", 9813, "HSC-I", 1)
+        record(self.path, "jointcal", "DM-1", 9813, "HSC-R", 0)
+        record(self.path, "jointcal", "DM-1", 9813, "HSC-I", 0)
+        record(self.path, "jointcal", "DM-1", 9813, "HSC-R", 137)
+        self.assertEqual(load_manifest(self.path), {("jointcal", "DM-1", 9813, "HSC-I"): 0,
+                                                    ("jointcal", "DM-1", 9813, "HSC-R"): 137})
+
+    def testBadLines(self):
+        """Lines cut short by a killed job are ignored."""
+        record(self.path, "jointcal", "DM-1", 9813, "HSC-I", 0)
+        with open(self.path, 'a') as outfile:
+            outfile.write("jointcal\tDM-1\t9813\tHSC-R\t")
+            outfile.write("\njointcal\tDM-1\t9813\tHSC-R\t\t123\n")
+        self.assertEqual(load_manifest(self.path), {("jointcal", "DM-1", 9813, "HSC-I"): 0})
+
+    def testMissing(self):
+        self.assertEqual(load_manifest(self.path), {})
+        self.assertEqual(completed_units(self.path, "jointcal", "DM-1", [(9813, "HSC-I")],
+                                         lambda tract, filt: True), set())
+
+    def testCompleted(self):
+        """Only units that exited with 0 for this stage and rerun, and whose
+        outputs exist, are complete."""
+        record(self.path, "jointcal", "DM-1", 9813, "HSC-I", 0)
+        record(self.path, "jointcal", "DM-1", 9813, "HSC-R", 1)
+        record(self.path, "jointcal", "DM-1", 9813, "HSC-Z", 0)
+        record(self.path, "jointcal", "DM-2", 9813, "HSC-G", 0)
+        record(self.path, "validate", "DM-1", 9813, "HSC-Y", 0)
+        units = [(9813, filt) for filt in ("HSC-I", "HSC-R", "HSC-Z", "HSC-G", "HSC-Y")]
+        outputs = {(9813, "HSC-I"), (9813, "HSC-R"), (9813, "HSC-G"), (9813, "HSC-Y")}
+
+        def outputs_exist(tract, filt):
+            return (tract, filt) in outputs
+
+        # HSC-R failed, HSC-Z's output is missing, and the others are from
+        # another rerun or stage.
+        self.assertEqual(completed_units(self.path, "jointcal", "DM-1", units, outputs_exist),
+                         {(9813, "HSC-I")})
+        outputs.add((9813, "HSC-Z"))
+        self.assertEqual(completed_units(self.path, "jointcal", "DM-1", units, outputs_exist),
+                         {(9813, "HSC-I"), (9813, "HSC-Z")})
+        # A later failure of a unit that once succeeded means it is rerun.
+        record(self.path, "jointcal", "DM-1", 9813, "HSC-I", 2)
+        self.assertEqual(completed_units(self.path, "jointcal", "DM-1", units, outputs_exist),
+                         {(9813, "HSC-Z")})
+
+    def testRecordCmd(self):
+        """The shell snippet records the previous command's status, and exits with it."""
+        for status in (0, 3):
+            record_cmd = RECORD_CMD.format(stage="validate", rerun="/repo/WIDE", tract=9697, filt="HSC-I",
+                                           manifest=self.path)
+            cmd = "(exit {}); {}".format(status, record_cmd)
+            self.assertEqual(subprocess.call(["bash", "-c", cmd]), status)
+            self.assertEqual(load_manifest(self.path), {("validate", "/repo/WIDE", 9697, "HSC-I"): status})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Tests of merging the per-tract tables of several sources."""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import astropy.table
+
+from lsst.jointcal_compare.merge import JOIN_KEYS, long_frame, merge_frame, merge_sources
+from lsst.jointcal_compare.synthetic import write_reports
+from lsst.jointcal_compare.tables import read_sources
+
+NAMES = ['single', 'mosaic', 'jointcal']
+
+
+def join_sources(single, mosaic, jointcal):
+    """Merge the sources the way summarizePerformanceRst.py used to: join each
+    tract's tables in turn, and stack the results."""
+    per_tract = {}
+    for tract in single:
+        temp = astropy.table.join(single[tract], mosaic[tract], keys=JOIN_KEYS, join_type='outer')
+        temp = astropy.table.join(temp, jointcal[tract], keys=JOIN_KEYS, join_type='outer')
+        temp['tract'] = tract
+        temp.remove_columns(['Unit', 'Unit_2'])
+        temp.rename_column('Unit_1', 'Unit')
+        per_tract[tract] = temp
+    return astropy.table.vstack(list(per_tract.values()))
+
+
+class MergeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        write_reports(self.outdir, 4, NAMES, missing_fraction=0.2, first_tract=9811)
+        self.sources = read_sources(NAMES, os.path.join(self.outdir, "*-{}.rst"))
+        # A measurement that only some sources have, so that the outer join
+        # has rows to fill in.
+        for name in ('mosaic', 'jointcal'):
+            table = self.sources[name][9812]
+            table.remove_row(3)
+            self.sources[name][9812] = table
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def testSameAsJoin(self):
+        """The pivot gives the old join's table, row for row."""
+        expect = join_sources(*(self.sources[name] for name in NAMES))
+        data, df = merge_sources(self.sources)
+        self.assertEqual(expect.colnames, data.colnames)
+        self.assertEqual(len(expect), len(data))
+        for name in expect.colnames:
+            with self.subTest(column=name):
+                np.testing.assert_array_equal(np.ma.getmaskarray(expect[name]),
+                                              np.ma.getmaskarray(data[name]))
+                good = ~np.ma.getmaskarray(expect[name])
+                np.testing.assert_array_equal(np.ma.getdata(expect[name])[good],
+                                              np.ma.getdata(data[name])[good])
+        self.assertTrue(np.ma.getmaskarray(data['Value_jointcal']).any())
+        self.assertEqual(list(df.index.names), ['Metric', 'Filter'])
+        self.assertEqual(list(df['tract'].unique()), list(self.sources['single']))
+
+    def testFrameUnchanged(self):
+        """merge_frame does not modify the frame it is given."""
+        frame = long_frame(self.sources)
+        before = frame.copy()
+        merge_frame(frame, NAMES)
+        self.assertEqual(frame['tract'].dtype, np.int64)
+        self.assertTrue(frame.equals(before))
+
+
+if __name__ == "__main__":
+    unittest.main()
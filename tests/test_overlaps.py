@@ -0,0 +1,156 @@
+"""Tests of finding which ccds of which visits overlap each tract."""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import numpy as np
+
+from lsst.jointcal_compare.overlaps import (Footprints, Tracts, bounding_boxes, polygons_overlap,
+                                            update_overlaps)
+
+
+def square(ra, dec, half):
+    """Return the RA and Dec of the corners of a square about a point."""
+    return (np.array([ra - half, ra + half, ra + half, ra - half]) % 360,
+            np.array([dec - half, dec - half, dec + half, dec + half]))
+
+
+def make_tracts(*tracts):
+    """Return `Tracts` from ``(tract, ra, dec, half)`` squares."""
+    corners = [square(ra, dec, half) for _, ra, dec, half in tracts]
+    return Tracts(np.array([tract[0] for tract in tracts]), np.array([c[0] for c in corners]),
+                  np.array([c[1] for c in corners]))
+
+
+def make_footprints(*ccds):
+    """Return `Footprints` from ``(visit, ccd, filter, ra, dec)`` ccds, each 0.2 degrees square."""
+    corners = [square(ra, dec, 0.1) for _, _, _, ra, dec in ccds]
+    return Footprints(np.array([ccd[0] for ccd in ccds]), np.array([ccd[1] for ccd in ccds]),
+                      np.array([ccd[2] for ccd in ccds], dtype=object), np.array([c[0] for c in corners]),
+                      np.array([c[1] for c in corners]))
+
+
+class BoundingBoxesTestCase(unittest.TestCase):
+    def testSimple(self):
+        index, ramin, ramax, decmin, decmax = bounding_boxes(*[np.array([x]) for x in square(150, 2, 1)])
+        np.testing.assert_array_equal(index, [0])
+        np.testing.assert_allclose(np.stack([ramin, ramax]).ravel(), [149, 151])
+        # The Dec=3 edge's great circle bulges away from the equator; the
+        # Dec=1 edge's bulges towards it, and so stays within the vertices.
+        self.assertEqual(decmin, 1)
+        self.assertGreater(decmax, 3)
+        self.assertLess(decmax, 3.001)
+
+    def testCrossRaZero(self):
+        """A polygon across RA=0 gets a box on each side of it."""
+        index, ramin, ramax, decmin, decmax = bounding_boxes(*[np.array([x]) for x in square(0, 0, 1)])
+        np.testing.assert_array_equal(index, [0, 0])
+        order = np.argsort(ramin)
+        np.testing.assert_allclose(ramin[order], [0, 359], atol=1e-10)
+        np.testing.assert_allclose(ramax[order], [1, 360], atol=1e-10)
+        np.testing.assert_array_equal(decmin, decmin[0])
+        self.assertLess(decmin[0], -1)
+        self.assertGreater(decmax[0], 1)
+
+    def testPole(self):
+        """A polygon around a pole gets every RA, up to the pole; one next to
+        it includes the bulge of its poleward edge."""
+        ra = np.array([[0, 90, 180, 270], [0, 10, 10, 0.0]])
+        dec = np.array([[89, 89, 89, 89], [-88, -88, -89, -89.0]])
+        index, ramin, ramax, decmin, decmax = bounding_boxes(ra, dec)
+        np.testing.assert_array_equal(index, [0, 1])
+        self.assertEqual((ramin[0], ramax[0], decmax[0]), (0, 360, 90))
+        self.assertAlmostEqual(decmin[0], 89)
+        np.testing.assert_allclose([ramin[1], ramax[1], decmax[1]], [0, 10, -88])
+        self.assertLess(decmin[1], -89.001)
+        self.assertGreater(decmin[1], -90)
+
+
+class PolygonsOverlapTestCase(unittest.TestCase):
+    def testOverlap(self):
+        ra, dec = square(150, 2, 1)
+        ccds = [square(150, 2, 0.1),      # inside
+                square(151, 3, 0.1),      # across a corner
+                square(151.25, 2, 0.26),  # just across an edge
+                square(151.25, 2, 0.24),  # just short of it
+                square(152, 4, 0.5),      # diagonal, disjoint
+                square(330, -2, 1)]       # on the other side of the sky
+        overlap = polygons_overlap(ra, dec, np.array([c[0] for c in ccds]), np.array([c[1] for c in ccds]))
+        np.testing.assert_array_equal(overlap, [True, True, True, False, False, False])
+
+    def testCrossRaZero(self):
+        ra, dec = square(0, 0, 1)
+        ccds = [square(359.5, 0.5, 0.1), square(0.5, -0.5, 0.1), square(358.5, 0, 0.1)]
+        overlap = polygons_overlap(ra, dec, np.array([c[0] for c in ccds]), np.array([c[1] for c in ccds]))
+        np.testing.assert_array_equal(overlap, [True, True, False])
+
+    def testPole(self):
+        ra, dec = np.array([0, 90, 180, 270.0]), np.full(4, 89.0)
+        ccds = [square(45, 89.9, 0.05), square(200, 89.5, 0.1), square(200, 88, 0.1)]
+        overlap = polygons_overlap(ra, dec, np.array([c[0] for c in ccds]), np.array([c[1] for c in ccds]))
+        np.testing.assert_array_equal(overlap, [True, True, False])
+
+
+class UpdateOverlapsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.dbpath = os.path.join(self.outdir, "overlaps.sqlite3")
+        self.tracts = make_tracts((9813, 150, 2, 1), (0, 0, 0, 1))
+        self.footprints = [(1, 0, "HSC-I", 150.5, 2.5), (1, 1, "HSC-I", 152.5, 2),
+                           (2, 0, "HSC-R", 359.8, 0.1), (2, 1, "HSC-R", 0.5, -0.5), (2, 2, "HSC-R", 150, 2)]
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def calexps(self):
+        conn = sqlite3.connect(self.dbpath)
+        try:
+            return conn.execute("select tract, filter, visit, ccd from calexp"
+                                " order by tract, visit, ccd").fetchall()
+        finally:
+            conn.close()
+
+    def testUpdate(self):
+        self.assertEqual(update_overlaps(self.dbpath, self.tracts, make_footprints(*self.footprints)),
+                         (2, 2, 4))
+        first = [(0, "HSC-R", 2, 0), (0, "HSC-R", 2, 1), (9813, "HSC-I", 1, 0), (9813, "HSC-R", 2, 2)]
+        self.assertEqual(self.calexps(), first)
+
+        # Nothing is new.
+        self.assertEqual(update_overlaps(self.dbpath, self.tracts, make_footprints(*self.footprints)),
+                         (0, 0, 0))
+        self.assertEqual(self.calexps(), first)
+
+        # Only the new visit's footprints are added, in batches of one visit.
+        self.footprints += [(3, 0, "HSC-Z", 149.5, 1.5), (3, 1, "HSC-Z", 0.1, 0.1)]
+        self.assertEqual(update_overlaps(self.dbpath, self.tracts, make_footprints(*self.footprints),
+                                         batch_size=1), (1, 0, 2))
+        second = sorted(first + [(0, "HSC-Z", 3, 1), (9813, "HSC-Z", 3, 0)])
+        self.assertEqual(self.calexps(), second)
+
+        # A new tract is tested against every visit.
+        tracts = make_tracts((9813, 150, 2, 1), (0, 0, 0, 1), (9814, 152.5, 2, 0.5))
+        self.assertEqual(update_overlaps(self.dbpath, tracts, make_footprints(*self.footprints)), (0, 1, 1))
+        self.assertEqual(self.calexps(), second + [(9814, "HSC-I", 1, 1)])
+
+    def testNoCcdColumn(self):
+        """A database without a ccd column gets one row per tract and visit."""
+        conn = sqlite3.connect(self.dbpath)
+        with conn:
+            conn.execute("create table calexp (tract integer, filter text, visit integer)")
+        conn.close()
+        self.footprints.append((2, 3, "HSC-R", 150.2, 2))
+        self.assertEqual(update_overlaps(self.dbpath, self.tracts, make_footprints(*self.footprints)),
+                         (2, 2, 5))
+        conn = sqlite3.connect(self.dbpath)
+        try:
+            rows = conn.execute("select tract, filter, visit from calexp order by tract, visit").fetchall()
+        finally:
+            conn.close()
+        self.assertEqual(rows, [(0, "HSC-R", 2), (9813, "HSC-I", 1), (9813, "HSC-R", 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
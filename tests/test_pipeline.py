@@ -0,0 +1,234 @@
+"""Tests of running a graph of dependent commands, locally and as chained
+slurm jobs with fakeSbatch.py standing in for sbatch."""
+import json
+import os
+import shlex
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+import unittest.mock
+from contextlib import redirect_stdout
+
+from lsst.jointcal_compare.pipeline import Task, run_graph, submit_graph, topological_order
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_SBATCH = "%s %s" % (shlex.quote(sys.executable), os.path.join(ROOT_DIR, "bin", "fakeSbatch.py"))
+
+
+def names(tasks):
+    return [task.name for task in tasks]
+
+
+class TopologicalOrderTestCase(unittest.TestCase):
+    def testOrder(self):
+        """Every task comes after its dependencies; independent tasks keep
+        their order."""
+        tasks = [Task("summary", "s", ["true"], ("report1", "report2")),
+                 Task("report1", "r", ["true"], ("fit1",)),
+                 Task("fit1", "f", ["true"], ()),
+                 Task("fit2", "f", ["true"], ()),
+                 Task("report2", "r", ["true"], ("fit2",))]
+        self.assertEqual(names(topological_order(tasks)), ["fit1", "fit2", "report1", "report2", "summary"])
+        self.assertEqual(topological_order([]), [])
+
+    def testUnknown(self):
+        tasks = [Task("a", "s", ["true"], ()), Task("b", "s", ["true"], ("a", "missing"))]
+        with self.assertRaisesRegex(ValueError, "b depends on unknown task missing"):
+            topological_order(tasks)
+
+    def testCycle(self):
+        tasks = [Task("a", "s", ["true"], ()), Task("b", "s", ["true"], ("a", "d")),
+                 Task("c", "s", ["true"], ("b",)), Task("d", "s", ["true"], ("c",))]
+        with self.assertRaisesRegex(ValueError, "cycle among tasks: b, c, d"):
+            topological_order(tasks)
+        with self.assertRaises(ValueError):
+            run_graph(tasks, 2)
+
+
+class RunGraphTestCase(unittest.TestCase):
+    def testSkipDownstream(self):
+        """Everything downstream of a failed task is skipped; the rest runs."""
+        tasks = [Task("fit1", "f", ["true"], ()),
+                 Task("fit2", "f", ["false"], ()),
+                 Task("validate1", "v", ["true"], ("fit1",)),
+                 Task("validate2", "v", ["true"], ("fit2",)),
+                 Task("report2", "r", ["true"], ("validate2",)),
+                 Task("summary", "s", ["true"], ("validate1", "report2"))]
+        finished = []
+        results, skipped = run_graph(tasks, 2, callback=lambda result: finished.append(result.name))
+        self.assertEqual(names(results), ["fit1", "fit2", "validate1"])
+        self.assertEqual([result.returncode for result in results], [0, 1, 0])
+        self.assertEqual(sorted(skipped), ["report2", "summary", "validate2"])
+        self.assertEqual(sorted(finished), ["fit1", "fit2", "validate1"])
+
+    def testNoBarrier(self):
+        """A task starts as soon as its dependencies succeed, without waiting
+        for unrelated tasks of the same stage."""
+        sleep = [sys.executable, "-c", "import time; time.sleep(1)"]
+        tasks = [Task("fit-slow", "f", sleep, ()),
+                 Task("fit-fast", "f", ["true"], ()),
+                 Task("validate-fast", "v", ["true"], ("fit-fast",)),
+                 Task("validate-slow", "v", ["true"], ("fit-slow",))]
+        finished = []
+        results, skipped = run_graph(tasks, 2, callback=lambda result: finished.append(result.name))
+        self.assertEqual(finished, ["fit-fast", "validate-fast", "fit-slow", "validate-slow"])
+        self.assertEqual(skipped, [])
+        # Results are in dependency order, whatever order they finished in.
+        self.assertEqual(names(results), names(topological_order(tasks)))
+
+    def testLogfiles(self):
+        outdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outdir)
+        logfile = os.path.join(outdir, "a.log")
+        results, _ = run_graph([Task("a", "s", ["echo", "hello"], ()), Task("b", "s", ["echo", "b"], ())], 1,
+                               logfiles={"a": logfile})
+        with open(logfile) as infile:
+            self.assertEqual(infile.read(), "hello\n")
+        self.assertEqual([result.stdout for result in results], ["", "b\n"])
+
+
+class SubmitGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.state = os.path.join(self.outdir, "fake-slurm")
+        env = unittest.mock.patch.dict(os.environ, {"FAKE_SBATCH_DIR": self.state})
+        env.start()
+        self.addCleanup(env.stop)
+        self.tasks = [Task("summary", "s", [], ("report1", "report2")),
+                      Task("report1", "r", [], ("fit1",)),
+                      Task("fit1", "f", [], ()),
+                      Task("fit2", "f", [], ()),
+                      Task("report2", "r", [], ("fit2",))]
+        self.scripts = {}
+        self.logfiles = {}
+        for task in self.tasks:
+            self.scripts[task.name] = os.path.join(self.outdir, task.name + ".sl")
+            self.logfiles[task.name] = os.path.join(self.outdir, task.name + ".log")
+            with open(self.scripts[task.name], 'w') as outfile:
+                outfile.write("#!/bin/bash\n#SBATCH -J {}\nexit {}\n".format(task.name,
+                                                                             int(task.name == "fit2")))
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def submit(self, sbatch):
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            return submit_graph(self.tasks, self.scripts, self.logfiles, sbatch=sbatch)
+
+    def records(self):
+        with open(os.path.join(self.state, "jobs.jsonl")) as infile:
+            return {record["name"]: record for record in map(json.loads, infile)}
+
+    def testDependencies(self):
+        """Each job depends on its tasks' jobs with afterok."""
+        jobids = self.submit(FAKE_SBATCH)
+        self.assertEqual(jobids, {"fit1": "1000", "fit2": "1001", "report1": "1002", "report2": "1003",
+                                  "summary": "1004"})
+        records = self.records()
+        for name in ("fit1", "fit2"):
+            self.assertNotIn("dependency", records[name]["options"])
+        self.assertEqual(records["report1"]["options"]["dependency"], "afterok:1000")
+        self.assertEqual(records["report2"]["options"]["dependency"], "afterok:1001")
+        self.assertEqual(records["summary"]["options"]["dependency"], "afterok:1002:1003")
+        self.assertEqual(records["summary"]["options"]["kill-on-invalid-dep"], "yes")
+
+    def testRun(self):
+        """Jobs downstream of a failed job are cancelled, as slurm would."""
+        self.submit(FAKE_SBATCH + " --run")
+        states = {name: record["state"] for name, record in self.records().items()}
+        self.assertEqual(states, {"fit1": "COMPLETED", "fit2": "FAILED", "report1": "COMPLETED",
+                                  "report2": "CANCELLED", "summary": "CANCELLED"})
+
+    def testNoJobid(self):
+        with self.assertRaisesRegex(RuntimeError, "did not report a job id for fit1"):
+            self.submit("true")
+
+
+# Stands in for every stage: prints its arguments, fails for HSC-R, and
+# writes the files that validate_drp and reportPerformance would.
+STUB = """
+import os, sys
+print(' '.join(sys.argv[1:]))
+if 'filter=HSC-R' in sys.argv:
+    sys.exit(3)
+for arg in sys.argv[1:]:
+    if arg.startswith('--output='):
+        os.makedirs(arg[9:], exist_ok=True)
+        filt = [a for a in sys.argv if a.startswith('filter=')][0][7:]
+        open(os.path.join(arg[9:], filt + '.json'), 'w').close()
+    if arg.startswith('--output_file='):
+        os.makedirs(os.path.dirname(arg[14:]), exist_ok=True)
+        with open(arg[14:], 'w') as outfile:
+            outfile.write(' '.join(sorted(os.path.basename(a) for a in sys.argv[2:])))
+"""
+
+
+class PipelineScriptTestCase(unittest.TestCase):
+    """Run jointcal-pipeline.py --local with the stub for every stage."""
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "tract-visit"))
+        calexps = {"UDEEP": [(9813, "HSC-I", 1228, 0), (9813, "HSC-R", 30, 0)],
+                   "WIDE": [(9697, "HSC-I", 1228, 0), (9697, "HSC-Z", 1300, 0)]}
+        for field, rows in calexps.items():
+            path = os.path.join(self.root, "tract-visit", "overlaps_SSP%s_w15.sqlite3" % field)
+            conn = sqlite3.connect(path)
+            with conn:
+                conn.execute("create table calexp (tract int, filter text, visit int, ccd int)")
+                conn.executemany("insert into calexp values (?,?,?,?)", rows)
+            conn.close()
+        self.stub = os.path.join(self.root, "stub.py")
+        with open(self.stub, 'w') as outfile:
+            outfile.write(STUB)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run_pipeline(self, *args):
+        command = "%s %s" % (shlex.quote(sys.executable), shlex.quote(self.stub))
+        args = list(args) + ["--local", "-j", "2", "--root", self.root]
+        for stage in ("jointcal", "validate", "report", "summarize"):
+            args += ["--{}-command".format(stage), command]
+        script = os.path.join(ROOT_DIR, "slurm", "jointcal-pipeline.py")
+        return subprocess.run([sys.executable, script] + args,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
+                              env=dict(os.environ, PYTHONPATH=os.path.join(ROOT_DIR, "python")))
+
+    def read_results(self):
+        with open(os.path.join(self.root, "logs", "pipeline-local.txt")) as infile:
+            self.assertEqual(infile.readline(), "# name returncode duration logfile\n")
+            return {fields[0]: int(fields[1]) for fields in map(str.split, infile)}
+
+    def testFailure(self):
+        """A failed jointcal fit stops its tract's validation and report, and
+        the summary, but not the other tract."""
+        process = self.run_pipeline()
+        self.assertEqual(process.returncode, 1, process.stdout)
+        self.assertEqual(self.read_results(), {"jointcal-UDEEP_9813_HSC-I": 0, "jointcal-UDEEP_9813_HSC-R": 3,
+                                               "jointcal-WIDE_9697_HSC-I": 0, "jointcal-WIDE_9697_HSC-Z": 0,
+                                               "validate-jointcal-UDEEP_9813_HSC-I": 0,
+                                               "validate-jointcal-WIDE_9697_HSC-I": 0,
+                                               "validate-jointcal-WIDE_9697_HSC-Z": 0,
+                                               "reportPerformance-WIDE_9697": 0})
+        self.assertIn("7 of 11 tasks succeeded", process.stdout)
+        self.assertIn("Not run, because a task they depend on failed: validate-jointcal-UDEEP_9813_HSC-R"
+                      " reportPerformance-UDEEP_9813 summarize", process.stdout)
+        with open(os.path.join(self.root, "performance", "9697-jointcal.rst")) as infile:
+            self.assertEqual(infile.read(), "HSC-I.json HSC-Z.json")
+        self.assertFalse(os.path.exists(os.path.join(self.root, "performance", "9813-jointcal.rst")))
+
+    def testSucceed(self):
+        process = self.run_pipeline("--tracts", "9697")
+        self.assertEqual(process.returncode, 0, process.stdout)
+        results = self.read_results()
+        self.assertEqual(len(results), 6)
+        self.assertEqual(set(results.values()), {0})
+        with open(os.path.join(self.root, "logs", "summarize-local.log")) as infile:
+            self.assertEqual(infile.read().split(), [os.path.join(self.root, "performance")])
+
+
+if __name__ == "__main__":
+    unittest.main()
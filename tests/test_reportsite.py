@@ -0,0 +1,64 @@
+"""Tests of building the HTML report site."""
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+try:
+    import docutils
+except ImportError:
+    docutils = None
+
+from lsst.jointcal_compare.reportsite import build_site, html_path, index_html
+from lsst.jointcal_compare.synthetic import write_reports
+
+
+class ReportSiteTestCase(unittest.TestCase):
+    """Two reruns with reports of the same names, as summarizeJointcal.py
+    reads them."""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.outdir = os.path.join(self.directory, "html")
+        self.reports = []
+        for rerun in ("DM-15617", "DM-15713"):
+            self.reports.extend(write_reports(self.directory, 2, ["jointcal"],
+                                              pattern=rerun + "/performance/{tract}-{source}.rst"))
+        self.reports.sort()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testHtmlPath(self):
+        targets = [html_path(rstfile, self.directory, self.outdir) for rstfile in self.reports]
+        self.assertEqual(len(set(targets)), len(self.reports))
+        self.assertEqual(targets[0],
+                         os.path.join(self.outdir, "DM-15617", "performance", "9000-jointcal.html"))
+
+    def testIndex(self):
+        page = index_html(self.reports, [], self.directory, self.outdir)
+        for rerun in ("DM-15617", "DM-15713"):
+            self.assertIn('<td>%s/performance</td><td>9000</td>' % rerun, page)
+            self.assertIn('<a href="%s/performance/9001-jointcal.html">jointcal</a>' % rerun, page)
+        # With one folder, there is no folder column.
+        page = index_html(self.reports[:2], [], self.directory, self.outdir)
+        self.assertIn('<tr><td>9000</td><td><a href=', page)
+
+    @unittest.skipIf(docutils is None, "docutils is not installed")
+    def testBuildSite(self):
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs), warnings.catch_warnings():
+                # docutils deprecates some of publish_file's arguments.
+                warnings.simplefilter('error', PendingDeprecationWarning)
+                nconverted, nreports, index = build_site(self.directory, jobs=jobs, force=True)
+                self.assertEqual((nconverted, nreports), (4, 4))
+                for rstfile in self.reports:
+                    self.assertTrue(os.path.exists(html_path(rstfile, self.directory, self.outdir)))
+                with open(index) as infile:
+                    self.assertEqual(infile.read().count('jointcal</a>'), 4)
+        # Nothing has changed, so nothing is converted again.
+        self.assertEqual(build_site(self.directory)[:2], (0, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Tests of fitting job walltime and memory to past jobs."""
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from lsst.jointcal_compare.resources import ORDER_DEFAULTS, FittedCostModel, features, load_sacct
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FittedCostModelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def testExactFit(self):
+        """Recover the coefficients of noiseless data; the orders that do
+        not vary get zero coefficients."""
+        orders = [dict(ORDER_DEFAULTS, astrometryVisitOrder=order) for order in (5, 7)]
+        X = np.array([features(nvisits, orders[i % 2]) for i, nvisits in enumerate(range(2, 300, 7))])
+        minutes = np.exp(0.5 + 1.3*X[:, 1] + 0.1*X[:, 2])
+        memory = np.exp(6.0 + 0.8*X[:, 1])
+        model = FittedCostModel.fit(X, minutes, memory)
+        np.testing.assert_allclose(model.time_coeffs, [0.5, 1.3, 0.1, 0, 0], atol=1e-9)
+        np.testing.assert_allclose(model.memory_coeffs, [6.0, 0.8, 0, 0, 0], atol=1e-9)
+        self.assertAlmostEqual(model.time_offset, 0.0)
+        minutes, memory = model.predict(100)
+        self.assertAlmostEqual(minutes, math.exp(0.5 + 1.3*math.log(100) + 0.1*5))
+        self.assertAlmostEqual(memory, math.exp(6.0 + 0.8*math.log(100)))
+
+    def testLoadSacct(self):
+        """Walltimes are in minutes and memory in MB; steps with no MaxRSS
+        yet have no memory."""
+        path = os.path.join(self.outdir, "sacct.txt")
+        with open(path, 'w') as outfile:
+            outfile.write("JobID|Elapsed|MaxRSS|State\n"
+                          "1234|1-00:01:30||COMPLETED\n"
+                          "1234.0|01:00:00|2097152K|COMPLETED\n"
+                          "1235|00:00:00||PENDING\n"
+                          "1236|truncated\n")
+        self.assertEqual(load_sacct(path), {"1234": (1441.5, None, "COMPLETED"),
+                                            "1234.0": (60, 2048, "COMPLETED"),
+                                            "1235": (0, None, "PENDING")})
+
+    def testLoadWithCcdFeature(self):
+        """Models saved with the constant log_nccd feature still load."""
+        path = os.path.join(self.outdir, "model.json")
+        with open(path, 'w') as outfile:
+            names = ["const", "log_nvisits", "log_nccd"] + list(ORDER_DEFAULTS)
+            json.dump(dict(time_coeffs=[1, 2, 0, 3, 4, 5], memory_coeffs=[6, 7, 0, 8, 9, 10], time_offset=0.1,
+                           memory_offset=0.2, features=names), outfile)
+        model = FittedCostModel.load(path)
+        np.testing.assert_array_equal(model.time_coeffs, [1, 2, 3, 4, 5])
+        np.testing.assert_array_equal(model.memory_coeffs, [6, 7, 8, 9, 10])
+        model.save(path)
+        self.assertEqual(FittedCostModel.load(path).time_coeffs.tolist(), [1, 2, 3, 4, 5])
+
+    def testSynthetic(self):
+        """Fit the synthetic jobs written by fitJobResources.py, whose
+        walltime goes as ``5*(nvisits/10)**1.3*(1 + 0.1*(order - 5))`` and
+        memory as ``1500 + 60*nvisits``, with lognormal scatter."""
+        output = os.path.join(self.outdir, "model.json")
+        process = subprocess.run([sys.executable, os.path.join(ROOT_DIR, "bin", "fitJobResources.py"),
+                                  "--synthetic", os.path.join(self.outdir, "synthetic"), "-o", output],
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
+                                 env=dict(os.environ, PYTHONPATH=os.path.join(ROOT_DIR, "python")))
+        self.assertEqual(process.returncode, 0, process.stdout)
+
+        model = FittedCostModel.load(output)
+        const, nvisits, visitOrder, chipOrder, photometryOrder = model.time_coeffs
+        self.assertAlmostEqual(nvisits, 1.3, delta=0.05)
+        self.assertAlmostEqual(visitOrder, math.log(1.2)/2, delta=0.03)
+        self.assertEqual((chipOrder, photometryOrder), (0, 0))
+        # The residual quantile covers the 0.15 scatter at about 95%.
+        self.assertAlmostEqual(model.time_offset, 1.645*0.15, delta=0.08)
+
+        for visits in (20, 100, 300):
+            with self.subTest(nvisits=visits):
+                minutes, memory = model.predict(visits)
+                self.assertGreater(minutes, 5*(visits/10)**1.3)
+                self.assertLess(minutes, 1.6*5*(visits/10)**1.3)
+                self.assertGreater(memory, 1500 + 60*visits)
+                self.assertLess(memory, 1.6*(1500 + 60*visits))
+
+        fits = process.stdout.splitlines()[-2]
+        self.assertRegex(fits, r"^(28[0-9]|29[0-9]|300) of 300 jobs fit in their predicted walltime")
+
+
+if __name__ == "__main__":
+    unittest.main()
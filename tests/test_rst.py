@@ -0,0 +1,59 @@
+"""Tests of the fast reportPerformance .rst reader against astropy's."""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from lsst.jointcal_compare.synthetic import write_reports
+from lsst.jointcal_compare.tables import read_one_table
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+class ReadRstTestCase(unittest.TestCase):
+    """Check that `read_rst` gives the same tables as astropy.io.ascii."""
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def assertSameTable(self, infile):
+        expect = read_one_table(infile, 'check', reader='astropy')
+        actual = read_one_table(infile, 'check', reader='fast')
+        self.assertEqual(expect.colnames, actual.colnames)
+        for name in expect.colnames:
+            with self.subTest(infile=infile, column=name):
+                self.assertEqual(expect[name].dtype, actual[name].dtype)
+                np.testing.assert_array_equal(np.ma.getmaskarray(expect[name]),
+                                              np.ma.getmaskarray(actual[name]))
+                np.testing.assert_array_equal(np.ma.getdata(expect[name]), np.ma.getdata(actual[name]))
+
+    def testReport(self):
+        """A report as written by reportPerformance, with comments, an empty
+        unit and both kinds of missing value."""
+        infile = os.path.join(DATA_DIR, "9813-jointcal.rst")
+        self.assertSameTable(infile)
+        table = read_one_table(infile, 'jointcal', reader='fast')
+        self.assertNotIn('Comments', table.colnames)
+        self.assertEqual(list(np.ma.getmaskarray(table['Value_jointcal']).nonzero()[0]), [2, 7])
+
+    def testSynthetic(self):
+        """Synthetic reports with many missing values, so that every column
+        of some files is masked somewhere."""
+        filenames = write_reports(self.outdir, 5, ["single", "jointcal"], missing_fraction=0.2)
+        for infile in filenames:
+            self.assertSameTable(infile)
+
+    def testNotRst(self):
+        infile = os.path.join(self.outdir, "9000-bad.rst")
+        with open(infile, 'w') as outfile:
+            outfile.write("Metric Value\nAM1 1.0\n")
+        with self.assertRaises(ValueError):
+            read_one_table(infile, 'check', reader='fast')
+
+
+if __name__ == "__main__":
+    unittest.main()
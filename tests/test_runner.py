@@ -0,0 +1,111 @@
+"""Tests of running commands with a bounded worker pool, with stub commands
+standing in for reportPerformance.py."""
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from lsst.jointcal_compare.runner import print_result, run_all
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Record when it started and finished in the file named by its first argument,
+# taking a while in between, and exit with the status given by its second.
+STUB = """
+import os, sys, time
+def record(what):
+    with open(sys.argv[1], 'a') as outfile:
+        outfile.write('%s %r\\n' % (what, time.time()))
+record('start')
+time.sleep(0.2)
+record('end')
+if sys.argv[2] != '0':
+    sys.stderr.write('stub failed\\n')
+sys.exit(int(sys.argv[2]))
+"""
+
+
+class RunAllTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.events = os.path.join(self.outdir, "events.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def maxConcurrent(self):
+        """Return the most stubs that were running at the same time."""
+        with open(self.events) as infile:
+            events = sorted((float(t), what == 'start') for what, t in (line.split() for line in infile))
+        running = most = 0
+        for _, start in events:
+            running += 1 if start else -1
+            most = max(most, running)
+        return most
+
+    def testBounded(self):
+        commands = {str(i): [sys.executable, '-c', STUB, self.events, '0'] for i in range(6)}
+        finished = []
+        results = run_all(commands, 2, callback=finished.append)
+        self.assertEqual([result.name for result in results], list(commands))
+        self.assertEqual(sorted(result.name for result in finished), sorted(commands))
+        self.assertTrue(all(result.returncode == 0 for result in results))
+        self.assertEqual(self.maxConcurrent(), 2)
+
+    def testFailures(self):
+        commands = {"ok": [sys.executable, '-c', STUB, self.events, '0'],
+                    "failed": [sys.executable, '-c', STUB, self.events, '3'],
+                    "missing": [os.path.join(self.outdir, "no-such-command")]}
+        logfiles = {"ok": os.path.join(self.outdir, "ok.log")}
+        results = {result.name: result for result in run_all(commands, 4, logfiles=logfiles)}
+        self.assertEqual(results["ok"].returncode, 0)
+        self.assertEqual(results["failed"].returncode, 3)
+        self.assertEqual(results["failed"].stderr, "stub failed\n")
+        self.assertEqual(results["missing"].returncode, 127)
+        self.assertTrue(os.path.exists(logfiles["ok"]))
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            print_result(results["failed"])
+        self.assertIn("FAILED  failed (exit status 3", output.getvalue())
+        self.assertIn("        stub failed", output.getvalue())
+
+
+class ReportAllPerformanceTestCase(unittest.TestCase):
+    """Run bin/reportAllPerformance.py with a stub command."""
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.env = dict(os.environ, PYTHONPATH=os.path.join(ROOT_DIR, "python"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run_script(self, *args):
+        return subprocess.run([sys.executable, os.path.join(ROOT_DIR, "bin", "reportAllPerformance.py"),
+                               "jointcal", "--root", self.root] + list(args),
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
+                              env=self.env)
+
+    def testFailedTract(self):
+        for tract in ("9697", "9813"):
+            os.makedirs(os.path.join(self.root, "validate-jointcal", tract))
+        # Fails for the tract whose output file name contains 9813.
+        stub = "%s -c 'import sys; sys.exit(\"9813\" in sys.argv[1])'" % sys.executable
+        process = self.run_script("--command", stub, "-j", "2")
+        self.assertEqual(process.returncode, 1, process.stdout)
+        self.assertIn("1 of 2 tracts succeeded", process.stdout)
+        self.assertIn("Failed tracts: 9813", process.stdout)
+
+    def testNoTracts(self):
+        process = self.run_script("--command", "true")
+        self.assertEqual(process.returncode, 1)
+        self.assertIn("No tract directories found in", process.stdout)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "performance")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""Tests of estimating the cost of tract/filter jobs and packing them onto nodes."""
+import argparse
+import unittest
+
+from lsst.jointcal_compare.scheduling import (VALIDATE_COST_MODEL, CostModel, Job, add_packing_arguments,
+                                              node_minutes, pack_jobs, packing_from_args)
+
+
+def job(tract, minutes, memory):
+    return Job("WIDE", tract, "HSC-I", 10, minutes, memory)
+
+
+class PackJobsTestCase(unittest.TestCase):
+    def testCores(self):
+        """No node runs more jobs than it has cores for."""
+        jobs = [job(tract, 100 - tract, 1000) for tract in range(10)]
+        nodes = pack_jobs(jobs, cores_per_node=4, memory_per_node=100000)
+        self.assertEqual([len(node) for node in nodes], [4, 4, 2])
+        # Longest first, so each node holds jobs of similar length.
+        self.assertEqual([[j.tract for j in node] for node in nodes], [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+        nodes = pack_jobs(jobs, cores_per_node=4, memory_per_node=100000, cores_per_job=2)
+        self.assertEqual([len(node) for node in nodes], [2]*5)
+
+    def testMemory(self):
+        """No node is given more memory than it has; a later, smaller job
+        goes onto the first node it fits on."""
+        jobs = [job(0, 50, 6000), job(1, 40, 6000), job(2, 30, 3000), job(3, 20, 4000)]
+        nodes = pack_jobs(jobs, cores_per_node=24, memory_per_node=10000)
+        self.assertEqual([[j.tract for j in node] for node in nodes], [[0, 2], [1, 3]])
+        for node in nodes:
+            self.assertLessEqual(sum(j.memory for j in node), 10000)
+
+    def testTooLarge(self):
+        """A job that needs more memory than a node has gets a node of its own."""
+        jobs = [job(0, 50, 1000), job(1, 40, 20000), job(2, 30, 1000)]
+        with self.assertWarnsRegex(UserWarning, "tract 1 HSC-I needs an estimated 20000 MB"):
+            nodes = pack_jobs(jobs, cores_per_node=24, memory_per_node=10000)
+        self.assertEqual([[j.tract for j in node] for node in nodes], [[0, 2], [1]])
+
+    def testNodeMinutes(self):
+        """A node asks for its longest job's estimate, times the margin,
+        rounded up, and at least the minimum."""
+        node = [job(0, 100, 1000), job(1, 41, 1000)]
+        self.assertEqual(node_minutes(node, margin=1.5), 150)
+        self.assertEqual(node_minutes(node, margin=1.234), 124)
+        self.assertEqual(node_minutes(node, margin=1), 100)
+        self.assertEqual(node_minutes([job(0, 10, 1000)], margin=1.5), 30)
+        self.assertEqual(node_minutes([job(0, 10, 1000)], margin=1.5, minimum=5), 15)
+
+
+class CostModelTestCase(unittest.TestCase):
+    def testDefaults(self):
+        """The documented jointcal and validate_drp estimates."""
+        cost = CostModel().job("WIDE", 9813, "HSC-I", 100)
+        self.assertAlmostEqual(cost.minutes, 10 + 0.5*100**1.2)
+        self.assertAlmostEqual(cost.minutes/60, 2.3, places=1)
+        self.assertEqual(cost.memory, 7000)
+        cost = VALIDATE_COST_MODEL.job("WIDE", 9813, "HSC-I", 100)
+        self.assertAlmostEqual(cost.minutes, 40)
+        self.assertEqual(cost.memory, 12000)
+
+    def testPackingFromArgs(self):
+        parser = argparse.ArgumentParser()
+        add_packing_arguments(parser)
+        self.assertIsNone(packing_from_args(parser.parse_args([])))
+        packing = packing_from_args(parser.parse_args(["--pack", "--node-cores", "8", "--margin", "2"]))
+        self.assertIsInstance(packing.model, CostModel)
+        self.assertEqual((packing.node_cores, packing.node_memory, packing.margin), (8, 128000, 2))
+        packing = packing_from_args(parser.parse_args(["--pack"]), VALIDATE_COST_MODEL)
+        self.assertIs(packing.model, VALIDATE_COST_MODEL)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""Tests of writing and submitting slurm scripts, with fakeSbatch.py standing
+in for sbatch."""
+import argparse
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import unittest.mock
+from contextlib import redirect_stdout
+
+from lsst.jointcal_compare.scheduling import add_packing_arguments
+from lsst.jointcal_compare.slurm import (add_submit_arguments, array_range, parse_elapsed, parse_memory,
+                                         read_task_table, submit, write_task_table)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_SBATCH = "%s %s" % (shlex.quote(sys.executable), os.path.join(ROOT_DIR, "bin", "fakeSbatch.py"))
+
+SCRIPT = """#!/bin/bash -l
+#SBATCH -p normal
+#SBATCH --job-name=jointcal-9813
+#SBATCH --time=60
+srun --job-name=9813_HSC-I echo HSC-I
+"""
+
+
+class SubmitTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.state = os.path.join(self.outdir, "fake-slurm")
+        self.oldState = os.environ.get("FAKE_SBATCH_DIR")
+        os.environ["FAKE_SBATCH_DIR"] = self.state
+        self.script = os.path.join(self.outdir, "jointcal-9813.sl")
+        with open(self.script, 'w') as outfile:
+            outfile.write(SCRIPT)
+        self.logfile = os.path.join(self.outdir, "sbatch.log")
+
+    def tearDown(self):
+        if self.oldState is None:
+            del os.environ["FAKE_SBATCH_DIR"]
+        else:
+            os.environ["FAKE_SBATCH_DIR"] = self.oldState
+        shutil.rmtree(self.outdir)
+
+    def submit(self, *args, **kwargs):
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            return submit(*args, **kwargs)
+
+    def records(self):
+        with open(os.path.join(self.state, "jobs.jsonl")) as infile:
+            return [json.loads(line) for line in infile]
+
+    def testArrayRange(self):
+        self.assertEqual(array_range(1), "0-0")
+        self.assertEqual(array_range(10), "0-9")
+        self.assertEqual(array_range(250, throttle=20), "0-249%20")
+
+    def testSubmit(self):
+        self.assertEqual(self.submit(self.script, self.logfile, sbatch=FAKE_SBATCH), "1000")
+        options = ["--array=" + array_range(10, throttle=4), "--dependency=afterok:1000"]
+        self.assertEqual(self.submit(self.script, self.logfile, sbatch=FAKE_SBATCH, options=options), "1001")
+        with open(self.logfile) as infile:
+            self.assertEqual(infile.read(), "Submitted batch job 1001\n")
+
+        single, array = self.records()
+        self.assertEqual(single["name"], "jointcal-9813")
+        self.assertIsNone(single["tasks"])
+        self.assertEqual(single["options"]["time"], "60")
+        self.assertEqual(single["steps"], ["9813_HSC-I"])
+        self.assertEqual(array["options"]["array"], "0-9%4")
+        self.assertEqual(array["options"]["dependency"], "afterok:1000")
+        self.assertEqual(array["tasks"], list(range(10)))
+
+    def testNoJobId(self):
+        self.assertIsNone(self.submit(self.script, self.logfile, sbatch="echo"))
+
+    def testFailed(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.submit(self.script, self.logfile, sbatch="false")
+
+    def testTaskTable(self):
+        tasks = [("WIDE", 9813, "HSC-I", "100..120:2^131"), ("UDEEP", 9697, "HSC-R", "7")]
+        filename = os.path.join(self.outdir, "tasks.txt")
+        write_task_table(filename, tasks)
+        self.assertEqual(read_task_table(filename), [tuple(str(value) for value in task) for task in tasks])
+
+
+class ParseTestCase(unittest.TestCase):
+    def testElapsed(self):
+        self.assertEqual(parse_elapsed("1-02:03:04"), 93784)
+        self.assertEqual(parse_elapsed("02:03:04"), 7384)
+        self.assertEqual(parse_elapsed("3:04"), 184)
+        self.assertAlmostEqual(parse_elapsed("03:04.567"), 184.567)
+        for text in ("", " ", "INVALID", "UNLIMITED", "1-2:xx"):
+            self.assertIsNone(parse_elapsed(text), text)
+
+    def testMemory(self):
+        self.assertEqual(parse_memory("2048K"), 2)
+        self.assertEqual(parse_memory("300M"), 300)
+        self.assertEqual(parse_memory("1.5G"), 1536)
+        self.assertEqual(parse_memory("1.5g"), 1536)
+        self.assertEqual(parse_memory("2T"), 2*1024**2)
+        self.assertEqual(parse_memory("3145728"), 3)
+        for text in ("", " ", "16Gn", "K"):
+            self.assertIsNone(parse_memory(text), text)
+
+
+class ArgumentsTestCase(unittest.TestCase):
+    def testArrayOrPack(self):
+        parser = argparse.ArgumentParser()
+        layout = parser.add_mutually_exclusive_group()
+        add_packing_arguments(parser, layout)
+        add_submit_arguments(parser, layout)
+        self.assertTrue(parser.parse_args(["--array", "--throttle", "4"]).array)
+        self.assertTrue(parser.parse_args(["--pack"]).pack)
+        with open(os.devnull, 'w') as devnull, unittest.mock.patch("sys.stderr", devnull):
+            with self.assertRaises(SystemExit):
+                parser.parse_args(["--array", "--pack"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Tests of reading the per-tract tables of a source."""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from lsst.jointcal_compare.synthetic import write_reports
+from lsst.jointcal_compare.tables import read_tables
+
+
+class ReadTablesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        write_reports(self.outdir, 6, ["jointcal"], missing_fraction=0.2)
+        self.inglob = os.path.join(self.outdir, "*-{}.rst")
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def assertSameTables(self, expect, actual):
+        self.assertEqual(list(expect), list(actual))
+        for tract in expect:
+            self.assertEqual(expect[tract].colnames, actual[tract].colnames)
+            for name in expect[tract].colnames:
+                with self.subTest(tract=tract, column=name):
+                    self.assertEqual(expect[tract][name].dtype, actual[tract][name].dtype)
+                    np.testing.assert_array_equal(np.ma.getmaskarray(expect[tract][name]),
+                                                  np.ma.getmaskarray(actual[tract][name]))
+                    np.testing.assert_array_equal(np.ma.getdata(expect[tract][name]),
+                                                  np.ma.getdata(actual[tract][name]))
+
+    def testParallel(self):
+        """Reading with worker processes gives the same tables, in the same
+        order, as reading serially."""
+        for reader in ("astropy", "fast"):
+            with self.subTest(reader=reader):
+                serial = read_tables("jointcal", self.inglob, jobs=1, reader=reader)
+                self.assertEqual(len(serial), 6)
+                self.assertSameTables(serial, read_tables("jointcal", self.inglob, jobs=3, reader=reader))
+
+    def testFailures(self):
+        """Every file that cannot be read is reported, serially or not."""
+        for tract in (9001, 9004):
+            with open(os.path.join(self.outdir, "%d-jointcal.rst" % tract), 'w') as outfile:
+                outfile.write("Metric Value\nAM1 1.0\n")
+        for jobs in (1, 3):
+            with self.subTest(jobs=jobs):
+                with self.assertRaisesRegex(RuntimeError, "Failed to read 2 of 6") as cm:
+                    read_tables("jointcal", self.inglob, jobs=jobs, reader="fast")
+                self.assertIn("9001-jointcal.rst", str(cm.exception))
+                self.assertIn("9004-jointcal.rst", str(cm.exception))
+
+    def testNoFiles(self):
+        with self.assertRaisesRegex(RuntimeError, "No files found"):
+            read_tables("mosaic", self.inglob)
+
+
+if __name__ == "__main__":
+    unittest.main()
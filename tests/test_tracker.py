@@ -0,0 +1,161 @@
+"""Tests of following submitted jobs, with fakeSbatch.py and fakeSlurmQuery.py
+standing in for sbatch, squeue and sacct."""
+import asyncio
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import unittest.mock
+
+from lsst.jointcal_compare.tracker import JobTracker, JobUnit, load_jobs, record_jobs, track
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fake(name, *args):
+    """Return the command line running one of the fake slurm scripts in bin/."""
+    command = [sys.executable, os.path.join(ROOT_DIR, "bin", name)] + list(args)
+    return ' '.join(shlex.quote(arg) for arg in command)
+
+
+# An array job with one tract/filter per task, and a per-tract job with one
+# named srun step per filter.
+ARRAY_SCRIPT = """#!/bin/bash -l
+#SBATCH --job-name=jointcal-array
+#SBATCH --array=0-19
+"""
+STEPS_SCRIPT = """#!/bin/bash -l
+#SBATCH --job-name=jointcal-9813
+""" + ''.join("srun --job-name=9813_HSC-{0} echo HSC-{0} &\n".format(band) for band in "GRIZY")
+
+FILTERS = ["HSC-" + band for band in "GRIZY"]
+
+
+class TrackTestCase(unittest.TestCase):
+    """Follow two jobs that fakeSlurmQuery.py simulates, with runs of around
+    100 seconds and 30% failures; what becomes of each task and step depends
+    only on its job id, so the failures and stragglers are known:
+
+    - array tasks 1, 11 and 18 run out of memory, and task 2 fails;
+    - array task 12 is still running 600 seconds after submission, when every
+      other task has finished in at most 502 seconds;
+    - step 9813_HSC-G of the per-tract job fails, and 9813_HSC-Z runs out of memory.
+    """
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.state = os.path.join(self.outdir, "fake-slurm")
+        env = unittest.mock.patch.dict(os.environ, {"FAKE_SBATCH_DIR": self.state,
+                                                    "FAKE_SLURM_SECONDS": "100",
+                                                    "FAKE_SLURM_FAILURES": "0.3"})
+        env.start()
+        self.addCleanup(env.stop)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.registry = os.path.join(self.outdir, "jobs.txt")
+
+        units = []
+        for name, script in (("array.sl", ARRAY_SCRIPT), ("9813.sl", STEPS_SCRIPT)):
+            path = os.path.join(self.outdir, name)
+            with open(path, 'w') as outfile:
+                outfile.write(script)
+            output = subprocess.check_output(shlex.split(fake("fakeSbatch.py", path)),
+                                             universal_newlines=True)
+            jobid = output.split()[-1]
+            if name == "array.sl":
+                units.extend(JobUnit(jobid, str(task), None, str(9000 + task//5), FILTERS[task % 5])
+                             for task in range(20))
+            else:
+                units.extend(JobUnit(jobid, None, "9813_" + filt, "9813", filt) for filt in FILTERS)
+        self.assertEqual([unit.jobid for unit in units[::5]], ["1000"]*4 + ["1001"])
+        record_jobs(self.registry, units)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        shutil.rmtree(self.outdir)
+
+    def submittedAgo(self, seconds):
+        """Pretend that every job was submitted ``seconds`` ago."""
+        path = os.path.join(self.state, "jobs.jsonl")
+        with open(path) as infile:
+            records = [json.loads(line) for line in infile]
+        with open(path, 'w') as outfile:
+            for record in records:
+                outfile.write(json.dumps(dict(record, submitted=time.time() - seconds)) + '\n')
+
+    def track(self, tracker, **kwargs):
+        """Run `track` against the fakes, returning the events of each poll."""
+        polls = []
+        self.loop.run_until_complete(track(tracker, squeue=fake("fakeSlurmQuery.py", "squeue"),
+                                           sacct=fake("fakeSlurmQuery.py", "sacct"), interval=0,
+                                           callback=lambda tracker, events: polls.append(events),
+                                           **kwargs))
+        return polls
+
+    def states(self, tracker):
+        return {(unit.tract, unit.filt): tracker.status[unit].state for unit in tracker.units}
+
+    def testTrack(self):
+        units = load_jobs(self.registry)
+        self.assertEqual(len(units), 25)
+        tracker = JobTracker(units)
+
+        self.submittedAgo(600)
+        polls = self.track(tracker, once=True)
+        self.assertEqual(len(polls), 1)
+        events = polls[0]
+        failed = sorted(event.split(':')[0] for event in events if event.startswith("FAILED"))
+        self.assertEqual(failed, ["FAILED 9000 HSC-I (job 1000_2)", "FAILED 9000 HSC-R (job 1000_1)",
+                                  "FAILED 9002 HSC-R (job 1000_11)", "FAILED 9003 HSC-Z (job 1000_18)",
+                                  "FAILED 9813 HSC-G (job 1001 step 9813_HSC-G)",
+                                  "FAILED 9813 HSC-Z (job 1001 step 9813_HSC-Z)"])
+        self.assertIn("FAILED 9002 HSC-R (job 1000_11): OUT_OF_MEMORY after 00:06:00, MaxRSS 4047 MB,"
+                      " exit code 0:125", events)
+        self.assertIn("FAILED 9813 HSC-G (job 1001 step 9813_HSC-G): FAILED after 00:01:43, MaxRSS 4128 MB,"
+                      " exit code 1:0", events)
+        stragglers = [event for event in events if event.startswith("STRAGGLER")]
+        self.assertEqual(len(stragglers), 1)
+        self.assertTrue(stragglers[0].startswith("STRAGGLER 9002 HSC-I (job 1000_12): running for 00:09:"))
+        states = self.states(tracker)
+        self.assertEqual(states.pop(("9002", "HSC-I")), "RUNNING")
+        self.assertEqual(sorted(state for state in states.values() if state != "COMPLETED"),
+                         ["FAILED"]*2 + ["OUT_OF_MEMORY"]*4)
+        self.assertEqual(tracker.active_jobs(), ["1000"])
+
+        # Once the straggler has finished, the failures are not reported again.
+        self.submittedAgo(2000)
+        polls = self.track(tracker)
+        self.assertEqual(polls, [[]])
+        self.assertTrue(tracker.finished())
+        self.assertEqual(tracker.counts(), "19 COMPLETED, 2 FAILED, 4 OUT_OF_MEMORY")
+
+        table = tracker.table()
+        self.assertEqual(table[0].split(), ["tract", "filter", "job", "state", "elapsed", "MaxRSS"])
+        self.assertEqual(len(table), 26)
+        rows = {tuple(line.split()[:2]): line.split()[2:] for line in table[1:]}
+        self.assertEqual(rows[("9002", "HSC-I")], ["1000_12", "COMPLETED", "00:11:00", "3943M"])
+        self.assertEqual(rows[("9002", "HSC-R")], ["1000_11", "OUT_OF_MEMORY", "00:06:00", "4047M"])
+        self.assertEqual(rows[("9813", "HSC-G")], ["1001", "9813_HSC-G", "FAILED", "00:01:43", "4128M"])
+        self.assertEqual({row[-3] for row in rows.values()}, {"COMPLETED", "FAILED", "OUT_OF_MEMORY"})
+
+    def testTrackJobs(self):
+        """trackJobs.py exits with 1 when some tract/filters failed."""
+        self.submittedAgo(2000)
+        process = subprocess.run([sys.executable, os.path.join(ROOT_DIR, "bin", "trackJobs.py"),
+                                  self.registry, "--squeue", fake("fakeSlurmQuery.py", "squeue"),
+                                  "--sacct", fake("fakeSlurmQuery.py", "sacct"), "--interval", "0"],
+                                 stdout=subprocess.PIPE, universal_newlines=True,
+                                 env=dict(os.environ, PYTHONPATH=os.path.join(ROOT_DIR, "python")))
+        self.assertEqual(process.returncode, 1)
+        self.assertEqual(process.stdout.count("FAILED 9"), 6)
+        self.assertNotIn("STRAGGLER", process.stdout)
+        self.assertIn("19 COMPLETED, 2 FAILED, 4 OUT_OF_MEMORY", process.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
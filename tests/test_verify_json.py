@@ -0,0 +1,59 @@
+"""Tests that reading validate_drp JSON gives the same summaries as reading
+the reportPerformance .rst files made from it."""
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from lsst.jointcal_compare.analysis import design_exceedances, source_exceedances
+from lsst.jointcal_compare.merge import merge_sources
+from lsst.jointcal_compare.tables import read_sources
+from lsst.jointcal_compare.verify_json import load_job, job_rows
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+NAMES = ("mosaic", "jointcal")
+METRICS = ("AM1", "AF1", "PA1", "PF1")
+
+
+def read_merged(reader):
+    """Return the merged frame of the test data, read with ``reader``."""
+    if reader == "json":
+        inglob = os.path.join(DATA_DIR, "validate-{}", "*")
+    else:
+        inglob = os.path.join(DATA_DIR, "performance", "*-{}.rst")
+    _, df = merge_sources(read_sources(NAMES, inglob, reader=reader))
+    df = df.reset_index(drop=True)
+    return df.sort_values(['tract', 'Metric', 'Filter']).reset_index(drop=True)
+
+
+class VerifyJsonTestCase(unittest.TestCase):
+    """The test data has values on and within 1e-5 of the design
+    thresholds, which would cross them if the .rst files were rounded."""
+    def testJobRows(self):
+        job = load_job(os.path.join(DATA_DIR, "validate-jointcal", "9813", "HSC-R.json"))
+        rows = job_rows(job)
+        # AD1 has no design specification, so it is not reported.
+        self.assertEqual([row[0] for row in rows], list(METRICS))
+        self.assertEqual(rows[0], ("AM1", "HSC-R", 10.0, "marcsec", "<=", 10.0))
+
+    def testSameAsRst(self):
+        expect = read_merged("fast")
+        actual = read_merged("json")
+        pd.testing.assert_frame_equal(expect[list(actual.columns)], actual, check_dtype=False)
+        self.assertTrue(np.isnan(actual['Value_jointcal']).any())
+
+        for source in NAMES:
+            with self.subTest(source=source):
+                pd.testing.assert_frame_equal(design_exceedances(expect, METRICS, source),
+                                              design_exceedances(actual, METRICS, source))
+        self.assertEqual(len(design_exceedances(actual, ("AM1",), "jointcal")), 1)
+
+        expect = source_exceedances(expect, METRICS, "mosaic", "jointcal")
+        actual = source_exceedances(actual, METRICS, "mosaic", "jointcal")
+        pd.testing.assert_frame_equal(expect, actual)
+        self.assertTrue(actual['exceeds'].any())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Tests of loading and compressing the visits in the overlaps databases."""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from lsst.jointcal_compare.visits import (MAX_ID_LENGTH, compress_visits, ensure_index, find_visits,
+                                          id_argument, load_visits)
+
+
+class VisitsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.outdir, "overlaps test.sqlite3")
+        conn = sqlite3.connect(self.path)
+        with conn:
+            conn.execute("create table calexp (tract int, filter text, visit int, ccd int)")
+            conn.executemany("insert into calexp values (?,?,?,?)",
+                             [(9813, "HSC-I", 1230, 0), (9813, "HSC-I", 1228, 1), (9813, "HSC-I", 1228, 2),
+                              (9813, "HSC-R", 30, 0), (9697, "HSC-I", 1228, 0)])
+        conn.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def testLoadVisits(self):
+        self.assertEqual(load_visits(self.path), {(9697, "HSC-I"): [1228], (9813, "HSC-I"): [1228, 1230],
+                                                  (9813, "HSC-R"): [30]})
+        self.assertEqual(load_visits(self.path, tracts=[9697]), {(9697, "HSC-I"): [1228]})
+
+    def testMissingDatabase(self):
+        path = os.path.join(self.outdir, "missing.sqlite3")
+        with self.assertRaises(FileNotFoundError):
+            load_visits(path)
+        self.assertFalse(os.path.exists(path))
+
+    def testMissingTable(self):
+        conn = sqlite3.connect(self.path)
+        with conn:
+            conn.execute("drop table calexp")
+        conn.close()
+        with self.assertRaisesRegex(sqlite3.OperationalError, "no such table"):
+            load_visits(self.path)
+
+    def testReadOnly(self):
+        conn = sqlite3.connect("file:{}?mode=ro".format(self.path.replace(' ', '%20')), uri=True)
+        try:
+            with self.assertWarns(UserWarning):
+                self.assertFalse(ensure_index(conn))
+        finally:
+            conn.close()
+        load_visits(self.path)
+        conn = sqlite3.connect("file:{}?mode=ro".format(self.path.replace(' ', '%20')), uri=True)
+        try:
+            self.assertTrue(ensure_index(conn))
+        finally:
+            conn.close()
+
+
+class DataIdTestCase(unittest.TestCase):
+    def testCompressVisits(self):
+        self.assertEqual(compress_visits([]), "")
+        self.assertEqual(compress_visits([5, 1, 2, 3, 3]), "1..3^5")
+        self.assertEqual(compress_visits([100, 102, 104, 106, 131, 140]), "100..106:2^131^140")
+        self.assertEqual(compress_visits([1, 3]), "1^3")
+
+    def testFindVisits(self):
+        visits = {(9813, "HSC-I"): [1228, 1230, 1232]}
+        self.assertEqual(find_visits(visits, 9813, "HSC-I"), "1228..1232:2")
+        self.assertEqual(find_visits(visits, 9813, "HSC-R"), "")
+
+    def testIdArgument(self):
+        """A visit string up to the limit goes on the command line; a longer
+        one is written to an @file, in a directory created for it."""
+        outdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outdir)
+        filename = os.path.join(outdir, "ids", "9813_HSC-I.id")
+        argument = "--id ccd=0..8 filter=HSC-I tract=9813 visit=1^3"
+        self.assertEqual(id_argument("0..8", "HSC-I", 9813, "1^3", filename, max_length=3), argument)
+        self.assertFalse(os.path.exists(filename))
+
+        self.assertEqual(id_argument("0..8", "HSC-I", 9813, "1^3", filename, max_length=2), "@" + filename)
+        with open(filename) as infile:
+            self.assertEqual(infile.read(), argument + "\n")
+
+        # No three visits are evenly spaced, so nothing is compressed.
+        visit = compress_visits([i*i for i in range(1000)])
+        self.assertGreater(len(visit), MAX_ID_LENGTH)
+        self.assertEqual(id_argument("0..8", "HSC-I", 9813, visit, filename), "@" + filename)
+        with open(filename) as infile:
+            self.assertEqual(infile.read().split(), ["--id", "ccd=0..8", "filter=HSC-I", "tract=9813",
+                                                     "visit=" + visit])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Tests of ingesting performance tables into the metric store, and reading them back."""
+import glob
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from lsst.jointcal_compare.merge import long_frame
+from lsst.jointcal_compare.tables import read_sources
+from lsst.jointcal_compare.warehouse import ingest, load_frame, metric_history, reruns
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "performance")
+SOURCES = ["mosaic", "jointcal"]
+
+
+class WarehouseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.dbpath = os.path.join(self.outdir, "metrics.sqlite3")
+        # Copies, so that they can be rewritten.
+        self.datadir = os.path.join(self.outdir, "performance")
+        shutil.copytree(DATA_DIR, self.datadir)
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def files(self, source):
+        return sorted(glob.glob(os.path.join(self.datadir, "*-{}.rst".format(source))))
+
+    def ingest_all(self, rerun="DM-15713", **kwargs):
+        return [ingest(self.dbpath, self.files(source), rerun, source, **kwargs) for source in SOURCES]
+
+    def rows(self):
+        conn = sqlite3.connect(self.dbpath)
+        try:
+            query = "select * from metrics order by rerun, source, tract, metric, filter"
+            return conn.execute(query).fetchall()
+        finally:
+            conn.close()
+
+    def testIngest(self):
+        self.assertEqual(self.ingest_all(), [2, 2])
+        self.assertEqual(reruns(self.dbpath), ["DM-15713"])
+        rows = self.rows()
+        self.assertEqual(len(rows), 4*8)
+        # The masked PF1 value in 9697-jointcal.rst is stored as NULL.
+        self.assertIn(("PF1", "HSC-R", "DM-15713", "jointcal", 9697, None, 10.0, "%", "<="), rows)
+        self.assertIn(("AM1", "HSC-I", "DM-15713", "jointcal", 9697, 6.588821, 10.0, "marcsec", "<="), rows)
+
+    def testReingest(self):
+        """Unchanged files are not read again; a rewritten one replaces its tract's rows."""
+        self.ingest_all()
+        rows = self.rows()
+        self.assertEqual(self.ingest_all(), [0, 0])
+        self.assertEqual(self.rows(), rows)
+        self.assertEqual(self.ingest_all(force=True), [2, 2])
+        self.assertEqual(self.rows(), rows)
+
+        path = os.path.join(self.datadir, "9697-jointcal.rst")
+        with open(path) as infile:
+            text = infile.read()
+        with open(path, 'w') as outfile:
+            outfile.write(text.replace("6.588821", "7.123456"))
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+        self.assertEqual(self.ingest_all(), [0, 1])
+        changed = self.rows()
+        self.assertEqual(len(changed), len(rows))
+        self.assertEqual(set(rows) - set(changed),
+                         {("AM1", "HSC-I", "DM-15713", "jointcal", 9697, 6.588821, 10.0, "marcsec", "<=")})
+        self.assertIn(("AM1", "HSC-I", "DM-15713", "jointcal", 9697, 7.123456, 10.0, "marcsec", "<="),
+                      changed)
+
+    def testLoadFrame(self):
+        """The stored measurements are the frame merge.long_frame builds from the files."""
+        self.ingest_all()
+        frame = load_frame(self.dbpath, {source: ("DM-15713", source) for source in SOURCES})
+        expect = long_frame(read_sources(SOURCES, os.path.join(self.datadir, "*-{}.rst")))
+        # Within each tract, the store orders rows by its key rather than as in the files.
+        keys = ['source', 'tract', 'Metric', 'Filter']
+        frame = frame.sort_values(keys, kind='stable').reset_index(drop=True)
+        expect = expect.sort_values(keys, kind='stable').reset_index(drop=True)
+        pd.testing.assert_frame_equal(frame, expect, check_dtype=False)
+        self.assertEqual(frame['tract'].dtype, np.int64)
+        self.assertEqual(frame['Value'].dtype, np.float64)
+
+        frame = load_frame(self.dbpath, {"DM-15713": ("DM-15713", "jointcal")})
+        self.assertEqual(set(frame['source']), {"DM-15713"})
+        with self.assertRaisesRegex(RuntimeError, "No measurements of jointcal in rerun DM-1"):
+            load_frame(self.dbpath, {"DM-1": ("DM-1", "jointcal")})
+
+    def testMetricHistory(self):
+        self.ingest_all("DM-15617")
+        self.ingest_all("DM-15713")
+        frame = load_frame(self.dbpath, {"jointcal": ("DM-15713", "jointcal")})
+        values = frame['Value'][(frame['Metric'] == "AM1") & (frame['Filter'] == "HSC-I")].to_numpy()
+
+        history = metric_history(self.dbpath, "AM1", source="jointcal", filt="HSC-I")
+        self.assertEqual([row.rerun for row in history], ["DM-15617", "DM-15713"])
+        row = history[-1]
+        self.assertEqual((row.source, row.filter, row.ntracts), ("jointcal", "HSC-I", 2))
+        self.assertAlmostEqual(row.mean, values.mean())
+        self.assertAlmostEqual(row.std, values.std())
+        self.assertEqual((row.min, row.max), (values.min(), values.max()))
+
+        self.assertEqual(len(metric_history(self.dbpath, "AM1")), 2*2*2)
+        self.assertEqual([row.rerun for row in metric_history(self.dbpath, "AM1", last=1)], ["DM-15713"]*4)
+        # The masked value is left out of the count.
+        self.assertEqual(metric_history(self.dbpath, "PF1", "jointcal", "HSC-R", last=1)[0].ntracts, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+"""Tests of keeping the merged tables and per-metric RMS up to date as files change."""
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+import numpy as np
+import pandas as pd
+
+from lsst.jointcal_compare import watch
+from lsst.jointcal_compare.analysis import source_exceedances
+from lsst.jointcal_compare.merge import merge_sources
+from lsst.jointcal_compare.synthetic import write_reports
+from lsst.jointcal_compare.tables import read_sources
+from lsst.jointcal_compare.watch import RunningRms, TractWatcher
+
+NAMES = ["mosaic", "jointcal"]
+METRICS = ("AM1", "PA1")
+
+
+def sort_frame(df):
+    df = df.reset_index(drop=True)
+    return df.sort_values(['tract', 'Metric', 'Filter'], kind='stable').reset_index(drop=True)
+
+
+class TractWatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.inglob = os.path.join(self.outdir, "*-{}.rst")
+        write_reports(self.outdir, 3, NAMES, missing_fraction=0.1)
+        self.watcher = TractWatcher(NAMES, self.inglob)
+        self.rms = RunningRms("mosaic", METRICS, exclude_tracts=(9001,))
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def update(self):
+        """Update the watcher and RMS, returning the tracts that were re-merged
+        along with the update's results."""
+        with unittest.mock.patch.object(watch, "merge_sources", wraps=merge_sources) as merge:
+            tracts, part, failures = self.watcher.update()
+        self.rms.update(tracts, part)
+        merged = sorted({tract for call in merge.call_args_list for tables in call[0][0].values()
+                         for tract in tables})
+        return merged, tracts, part, failures
+
+    def check(self):
+        """Check the watcher and RMS against reading and merging every file."""
+        _, expect = merge_sources(read_sources(NAMES, self.inglob))
+        _, df = self.watcher.merged()
+        pd.testing.assert_frame_equal(sort_frame(df), sort_frame(expect), check_dtype=False)
+
+        rows = expect[expect['Metric'].isin(METRICS).to_numpy() & (expect['tract'] != 9001).to_numpy()]
+        values = rows['Value_mosaic'].to_numpy(dtype=np.float64)
+        sigma = self.rms.sigma()
+        for metric in METRICS:
+            value = values[(rows['Metric'] == metric).to_numpy()]
+            self.assertAlmostEqual(sigma[metric], np.sqrt(np.nanmean(value**2)))
+        comparison = source_exceedances(expect, list(METRICS), "mosaic", "jointcal", nsigma=(1,),
+                                        exclude_tracts=(9001,))
+        for metric, expected in comparison.groupby('Metric')['sigma'].first().items():
+            self.assertAlmostEqual(sigma[metric], expected)
+
+    def testUpdate(self):
+        merged, tracts, part, failures = self.update()
+        self.assertEqual((merged, tracts, failures), ([9000, 9001, 9002], [9000, 9001, 9002], []))
+        self.check()
+
+        # Nothing has changed.
+        merged, tracts, part, failures = self.update()
+        self.assertEqual((merged, tracts, len(part), failures), ([], [], 0, []))
+
+        # Only a new tract is read and merged.
+        write_reports(self.outdir, 1, NAMES, first_tract=9003, seed=1)
+        merged, tracts, part, failures = self.update()
+        self.assertEqual((merged, tracts, failures), ([9003], [9003], []))
+        self.assertEqual(set(part['tract']), {9003})
+        self.check()
+
+        # Only a rewritten one.
+        path = write_reports(self.outdir, 1, ["mosaic"], first_tract=9002, seed=2)[0]
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+        merged, tracts, part, failures = self.update()
+        self.assertEqual((merged, tracts, failures), ([9002], [9002], []))
+        self.check()
+
+    def testRemoved(self):
+        self.update()
+        os.remove(os.path.join(self.outdir, "9000-jointcal.rst"))
+        os.remove(os.path.join(self.outdir, "9002-mosaic.rst"))
+        os.remove(os.path.join(self.outdir, "9002-jointcal.rst"))
+        merged, tracts, part, failures = self.update()
+        self.assertEqual((merged, tracts, failures), ([9000], [9000, 9002], []))
+        self.assertEqual(set(part['tract']), {9000})
+        self.assertTrue(np.isnan(part['Value_jointcal']).all())
+        self.check()
+
+    def testUnreadable(self):
+        """A file that cannot be read is tried again by the next update."""
+        self.update()
+        path = os.path.join(self.outdir, "9003-jointcal.rst")
+        with open(path, 'w') as outfile:
+            outfile.write("=== ===\nhalf a\n")
+        merged, tracts, part, failures = self.update()
+        self.assertEqual((merged, tracts), ([], []))
+        self.assertEqual(len(failures), 1)
+        self.assertTrue(failures[0].startswith(path + ": "))
+
+        write_reports(self.outdir, 1, ["jointcal"], first_tract=9003)
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+        merged, tracts, part, failures = self.update()
+        self.assertEqual((merged, tracts, failures), ([9003], [9003], []))
+        self.assertTrue(np.isnan(part['Value_mosaic']).all())
+
+
+class RunningRmsTestCase(unittest.TestCase):
+    def testReplace(self):
+        """Replacing a tract's rows gives the RMS of the rows now present."""
+        rng = np.random.RandomState(0)
+        rms = RunningRms("mosaic", ("AM1", "PA1"))
+        self.assertTrue(np.isnan(rms.sigma()["AM1"]))
+
+        def part(tract, n):
+            return pd.DataFrame({'tract': [tract]*2*n, 'Metric': ["AM1", "PA1"]*n,
+                                 'Value_mosaic': rng.normal(0, 3, size=2*n)})
+
+        parts = {tract: part(tract, 5) for tract in range(4)}
+        rms.update(list(parts), pd.concat(parts.values()))
+        parts[2] = part(2, 7)
+        parts[2].loc[3, 'Value_mosaic'] = np.nan
+        rms.update([2], parts[2])
+        rms.update([3], part(3, 0))
+        del parts[3]
+        frame = pd.concat(parts.values())
+        for metric, sigma in rms.sigma().items():
+            values = frame['Value_mosaic'][frame['Metric'] == metric].dropna().to_numpy()
+            # The RMS about zero is the standard deviation of the values and their negatives.
+            self.assertAlmostEqual(sigma, np.std(np.concatenate([values, -values])))
+
+
+if __name__ == "__main__":
+    unittest.main()